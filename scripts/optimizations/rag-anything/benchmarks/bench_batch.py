@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /convert/batch vs one /convert/to-pdf call per document
+
+The documents given on the command line are cycled up to --count (200 by
+default) and sent to the app in-process (Starlette TestClient, full HTTP
+stack without the network):
+- single: one /convert/to-pdf request per document, one after the other,
+  as the RAG pipeline does today
+- batch: the same documents in /convert/batch requests of --batch-size
+
+The PDF cache is disabled so both runs convert every document.
+
+Usage:
+    python bench_batch.py corpus/* --count 200 --output batch.json
+"""
+import argparse
+import io
+import time
+import zipfile
+from pathlib import Path
+
+from bench_common import DEFAULT_SERVICE, latency_summary, load_service, percentile, write_results
+
+
+def build_corpus(documents, count):
+    corpus = []
+    for index in range(count):
+        path = Path(documents[index % len(documents)])
+        corpus.append((f"{index:04d}-{path.name}", path.read_bytes()))
+    return corpus
+
+
+def run_single(client, corpus):
+    latencies, failures = [], 0
+    started = time.perf_counter()
+    for name, content in corpus:
+        submitted = time.perf_counter()
+        response = client.post("/convert/to-pdf", files={"file": (name, content, "application/octet-stream")})
+        if response.status_code != 200:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - submitted)
+    wall = time.perf_counter() - started
+    return dict(latency_summary(latencies, wall), failures=failures)
+
+
+def run_batch(client, corpus, batch_size):
+    request_latencies, converted, failures = [], 0, 0
+    started = time.perf_counter()
+    for start in range(0, len(corpus), batch_size):
+        files = [("files", (name, content, "application/octet-stream"))
+                 for name, content in corpus[start:start + batch_size]]
+        submitted = time.perf_counter()
+        response = client.post("/convert/batch", files=files)
+        request_latencies.append(time.perf_counter() - submitted)
+        if response.status_code != 200:
+            failures += len(files)
+            continue
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            converted += sum(1 for name in archive.namelist() if name.endswith(".pdf"))
+        failures += int(response.headers.get("X-Batch-Failed", 0))
+    wall = time.perf_counter() - started
+    return {
+        "documents": converted,
+        "failures": failures,
+        "requests": len(request_latencies),
+        "wall_seconds": round(wall, 2),
+        "docs_per_minute": round(60 * converted / wall, 1) if wall else None,
+        "request_latency_p50_s": round(percentile(request_latencies, 0.50), 3) if request_latencies else None,
+        "request_latency_max_s": round(max(request_latencies), 3) if request_latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("documents", nargs="+", help="Office documents (cycled up to --count)")
+    parser.add_argument("--service", default=str(DEFAULT_SERVICE), help="converter_service.py to evaluate")
+    parser.add_argument("--count", type=int, default=200, help="Documents per run")
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents per /convert/batch request")
+    parser.add_argument("--pool-size", type=int, help="CONVERTER_POOL_SIZE override")
+    parser.add_argument("--output", help="JSON output file")
+    args = parser.parse_args()
+
+    env = {"CONVERTER_CACHE_MAX_MB": 0, "CONVERTER_MAX_BATCH_FILES": max(args.batch_size, 1)}
+    if args.pool_size:
+        env["CONVERTER_POOL_SIZE"] = args.pool_size
+    service = load_service(args.service, **env)
+    from fastapi.testclient import TestClient
+
+    corpus = build_corpus(args.documents, args.count)
+    results = {"documents": len(corpus), "batch_size": args.batch_size}
+    with TestClient(service.app) as client:
+        results["pool"] = service.pool.stats()
+        results["single"] = run_single(client, corpus)
+        results["batch"] = run_batch(client, corpus, args.batch_size)
+    if results["single"]["docs_per_minute"] and results["batch"]["docs_per_minute"]:
+        results["throughput_ratio"] = round(
+            results["batch"]["docs_per_minute"] / results["single"]["docs_per_minute"], 2
+        )
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Shared helpers for the document converter benchmarks
+"""
+import importlib.util
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+DEFAULT_SERVICE = Path(__file__).resolve().parent.parent / "converter_service.py"
+
+
+def load_service(path=DEFAULT_SERVICE, **env):
+    """
+    Import converter_service.py as a module, after applying `env` overrides
+    (its configuration is read from the environment at import time)
+    """
+    for key, value in env.items():
+        os.environ[key] = str(value)
+    path = Path(path).resolve()
+    if str(path.parent) not in sys.path:
+        sys.path.insert(0, str(path.parent))  # sibling modules (text_extraction)
+    spec = importlib.util.spec_from_file_location("converter_service", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["converter_service"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def stage_copies(files):
+    """
+    Copy the input documents into a scratch directory (conversions write next to them)
+    Returns: (scratch directory, list of copies)
+    """
+    temp_dir = tempfile.mkdtemp(prefix="bench-convert-")
+    copies = []
+    for index, source in enumerate(files):
+        job_dir = Path(temp_dir) / f"{index:04d}"
+        job_dir.mkdir()
+        copies.append(Path(shutil.copy(source, job_dir)))
+    return temp_dir, copies
+
+
+def cleanup_copies(temp_dir):
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile (fraction in [0, 1]), None for an empty list
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def latency_summary(latencies, wall):
+    """
+    Throughput and latency percentiles of a run
+    """
+    return {
+        "documents": len(latencies),
+        "wall_seconds": round(wall, 2),
+        "docs_per_minute": round(60 * len(latencies) / wall, 1) if wall else None,
+        "latency_p50_s": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "latency_p95_s": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "latency_max_s": round(max(latencies), 3) if latencies else None,
+    }
+
+
+def latency_histogram(latencies, buckets):
+    """
+    Cumulative histogram in Prometheus style: requests at or under each
+    bucket bound in seconds (a list, so the order survives sort_keys)
+    """
+    histogram = [{"le": bound, "count": sum(1 for latency in latencies if latency <= bound)} for bound in buckets]
+    histogram.append({"le": "+Inf", "count": len(latencies)})
+    return histogram
+
+
+def write_results(results, output):
+    """
+    Write the results as JSON (stdout when output is None)
+    """
+    payload = json.dumps(results, indent=2, ensure_ascii=False, sort_keys=True)
+    if output:
+        Path(output).write_text(payload + "\n", encoding="utf-8")
+        print(f"✅ Results written to {output}")
+    else:
+        print(payload)
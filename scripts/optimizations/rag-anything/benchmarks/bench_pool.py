@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: soffice pool vs one LibreOffice launch per request
+
+Converts the same documents to PDF twice:
+- spawn: the previous endpoint, a blocking `libreoffice --headless` run per
+  document with the default profile. It blocked the event loop, so requests
+  were effectively handled one at a time.
+- pool: SofficePool from converter_service.py (CONVERTER_BACKEND,
+  CONVERTER_POOL_SIZE), with --concurrency requests in flight.
+
+Latency is measured from submission to PDF written, queueing included.
+
+Usage:
+    python bench_pool.py corpus/*.docx --concurrency 8 --output pool.json
+    CONVERTER_BACKEND=subprocess python bench_pool.py corpus/* --pool-size 4
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import time
+
+from bench_common import (
+    DEFAULT_SERVICE, cleanup_copies, latency_summary, load_service, stage_copies, write_results
+)
+
+
+def run_spawn(files, soffice_bin):
+    temp_dir, copies = stage_copies(files)
+    latencies, failures = [], 0
+    try:
+        started = time.perf_counter()
+        for copy in copies:
+            submitted = time.perf_counter()
+            try:
+                subprocess.run([
+                    soffice_bin, "--headless", "--convert-to", "pdf", "--outdir", str(copy.parent), str(copy)
+                ], check=True, capture_output=True, timeout=60)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                failures += 1
+                continue
+            latencies.append(time.perf_counter() - submitted)
+        wall = time.perf_counter() - started
+    finally:
+        cleanup_copies(temp_dir)
+    return dict(latency_summary(latencies, wall), failures=failures)
+
+
+async def run_pool(service, files, concurrency):
+    pool = service.SofficePool()
+    started = time.perf_counter()
+    await pool.start()
+    startup = time.perf_counter() - started
+
+    temp_dir, copies = stage_copies(files)
+    limit = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def convert(copy):
+        nonlocal failures
+        async with limit:
+            submitted = time.perf_counter()
+            try:
+                await pool.convert(copy, copy.parent)
+            except (service.ConversionError, service.ConversionTimeout, service.PoolFull):
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - submitted)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(convert(copy) for copy in copies))
+        wall = time.perf_counter() - started
+    finally:
+        await pool.stop()
+        cleanup_copies(temp_dir)
+    return dict(latency_summary(latencies, wall), failures=failures,
+                startup_seconds=round(startup, 2), backend=pool.backend, slots=len(pool.slots))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("documents", nargs="+", help="Office documents to convert")
+    parser.add_argument("--service", default=str(DEFAULT_SERVICE), help="converter_service.py to evaluate")
+    parser.add_argument("--pool-size", type=int, help="CONVERTER_POOL_SIZE override")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight against the pool")
+    parser.add_argument("--skip-spawn", action="store_true", help="Only measure the pool")
+    parser.add_argument("--output", help="JSON output file")
+    args = parser.parse_args()
+
+    env = {"CONVERTER_QUEUE_MAX": max(args.concurrency, 1)}
+    if args.pool_size:
+        env["CONVERTER_POOL_SIZE"] = args.pool_size
+    service = load_service(args.service, **env)
+
+    results = {"documents": len(args.documents), "concurrency": args.concurrency, "cores": os.cpu_count()}
+    if not args.skip_spawn:
+        results["spawn"] = run_spawn(args.documents, service.SOFFICE_BIN)
+    results["pool"] = asyncio.run(run_pool(service, args.documents, args.concurrency))
+    if "spawn" in results and results["spawn"]["docs_per_minute"] and results["pool"]["docs_per_minute"]:
+        results["throughput_ratio"] = round(
+            results["pool"]["docs_per_minute"] / results["spawn"]["docs_per_minute"], 2
+        )
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: direct text extraction vs PDF conversion then text parsing
+
+For each document:
+- native: text_extraction.extract (the /convert/to-text path for
+  docx/pptx/xlsx/odt/ods/odp; legacy formats go through LibreOffice first)
+- pdf: PDF conversion on the soffice pool, then text extraction from the
+  PDF with PyMuPDF (or pypdf), as the RAG ingestion does today
+
+Both produce text; the character counts are reported so a missing part
+(e.g. unsupported tables) shows up next to the timings.
+
+Usage:
+    python bench_text.py corpus/* --output text.json
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from bench_common import (
+    DEFAULT_SERVICE, cleanup_copies, latency_summary, load_service, stage_copies, write_results
+)
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+
+def pdf_text(path):
+    if fitz is not None:
+        with fitz.open(path) as document:
+            return "\n".join(page.get_text() for page in document)
+    reader = pypdf.PdfReader(path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+async def run(service, documents):
+    text_extraction = service.text_extraction
+    pool = service.pool
+    await pool.start()
+    temp_dir, copies = stage_copies(documents)
+    native_times, pdf_times, files = [], [], {}
+    try:
+        for copy in copies:
+            file_ext = copy.suffix.lower()
+            measure = {}
+
+            started = time.perf_counter()
+            if file_ext in text_extraction.NATIVE_FORMATS:
+                text = text_extraction.extract(copy, file_ext)
+            else:
+                out_dir = copy.parent / "ooxml"
+                out_dir.mkdir(exist_ok=True)
+                target = service.OOXML_TARGETS[file_ext]
+                ooxml = await pool.convert(copy, out_dir, target=target)
+                text = text_extraction.extract(ooxml, f".{target}")
+            native_times.append(time.perf_counter() - started)
+            measure.update(native_seconds=round(native_times[-1], 3), native_chars=len(text))
+
+            started = time.perf_counter()
+            pdf_path = await pool.convert(copy, copy.parent)
+            text = await asyncio.to_thread(pdf_text, pdf_path)
+            pdf_times.append(time.perf_counter() - started)
+            measure.update(pdf_seconds=round(pdf_times[-1], 3), pdf_chars=len(text))
+            files[Path(copy).name] = measure
+    finally:
+        await pool.stop()
+        cleanup_copies(temp_dir)
+
+    results = {
+        "native": latency_summary(native_times, sum(native_times)),
+        "pdf_then_parse": latency_summary(pdf_times, sum(pdf_times)),
+        "files": files,
+    }
+    if sum(native_times):
+        results["speedup"] = round(sum(pdf_times) / sum(native_times), 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("documents", nargs="+", help="Office documents")
+    parser.add_argument("--service", default=str(DEFAULT_SERVICE), help="converter_service.py to evaluate")
+    parser.add_argument("--output", help="JSON output file")
+    args = parser.parse_args()
+
+    if fitz is None and pypdf is None:
+        parser.error("PyMuPDF or pypdf is required to parse the PDFs")
+    service = load_service(args.service, CONVERTER_POOL_SIZE=1)
+    results = {"documents": len(args.documents), "pdf_parser": "pymupdf" if fitz is not None else "pypdf"}
+    results.update(asyncio.run(run(service, args.documents)))
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Generate the load-test corpus described in fixtures/manifest.json
+
+docx (headings, paragraphs, tables), xlsx (sheets of mixed text/numbers)
+and pptx (bullet slides, table slides) in small/medium/large sizes. The
+text comes from a seeded generator: the same manifest always gives the
+same documents, so runs on different machines convert the same input.
+
+Needs python-docx, openpyxl and python-pptx (benchmark only, not used by
+the service).
+
+Usage:
+    python generate_corpus.py
+    python generate_corpus.py --force --corpus-dir /tmp/corpus
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_MANIFEST = FIXTURES_DIR / "manifest.json"
+DEFAULT_CORPUS_DIR = FIXTURES_DIR / "corpus"
+
+WORDS = (
+    "document conversion service pipeline latency throughput index page table slide "
+    "report quarter revenue budget forecast customer contract delivery invoice project "
+    "meeting summary decision action owner deadline review analysis result metric "
+    "network storage cluster memory process request response archive version draft"
+).split()
+
+
+def sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + "."
+
+
+def make_docx(path, spec, rng):
+    from docx import Document
+
+    document = Document()
+    document.add_heading(f"Benchmark document {spec['id']}", level=0)
+    tables_left = spec["tables"]
+    for section in range(spec["sections"]):
+        document.add_heading(f"Section {section + 1}: {sentence(rng, 4)[:-1]}", level=1)
+        for _ in range(spec["paragraphs"]):
+            document.add_paragraph(" ".join(sentence(rng) for _ in range(rng.randint(2, 5))))
+        document.add_paragraph(sentence(rng, 6), style="List Bullet")
+        document.add_paragraph(sentence(rng, 6), style="List Bullet")
+        if tables_left and section % max(1, spec["sections"] // spec["tables"]) == 0:
+            tables_left -= 1
+            table = document.add_table(rows=spec["table_rows"] + 1, cols=4)
+            for column, title in enumerate(("Item", "Owner", "Amount", "Status")):
+                table.cell(0, column).text = title
+            for row in range(1, spec["table_rows"] + 1):
+                cells = table.rows[row].cells
+                cells[0].text = sentence(rng, 3)
+                cells[1].text = rng.choice(WORDS)
+                cells[2].text = f"{rng.uniform(10, 10000):.2f}"
+                cells[3].text = rng.choice(("open", "done", "late"))
+    document.save(path)
+
+
+def make_xlsx(path, spec, rng):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for index in range(spec["sheets"]):
+        sheet = workbook.create_sheet(f"Sheet{index + 1}")
+        sheet.append([f"Column {column + 1}" for column in range(spec["columns"])])
+        for _ in range(spec["rows"]):
+            sheet.append([
+                rng.choice(WORDS) if column % 3 == 0 else round(rng.uniform(0, 100000), 2)
+                for column in range(spec["columns"])
+            ])
+    workbook.save(path)
+
+
+def make_pptx(path, spec, rng):
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    tables_every = max(1, spec["slides"] // spec["tables"]) if spec["tables"] else 0
+    for index in range(spec["slides"]):
+        if tables_every and index % tables_every == tables_every - 1:
+            slide = presentation.slides.add_slide(presentation.slide_layouts[5])  # title only
+            slide.shapes.title.text = f"Table {index + 1}"
+            table = slide.shapes.add_table(6, 4, Inches(0.5), Inches(1.5), Inches(9), Inches(4)).table
+            for row in range(6):
+                for column in range(4):
+                    table.cell(row, column).text = rng.choice(WORDS) if row else f"Header {column + 1}"
+            continue
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])  # title and content
+        slide.shapes.title.text = f"Slide {index + 1}: {sentence(rng, 3)[:-1]}"
+        body = slide.placeholders[1].text_frame
+        body.text = sentence(rng, 8)
+        for _ in range(spec["bullets"] - 1):
+            body.add_paragraph().text = sentence(rng, 8)
+    presentation.save(path)
+
+
+MAKERS = {"docx": make_docx, "xlsx": make_xlsx, "pptx": make_pptx}
+
+
+def corpus_path(corpus_dir, spec):
+    return Path(corpus_dir) / f"{spec['id']}.{spec['kind']}"
+
+
+def ensure_corpus(manifest_path=DEFAULT_MANIFEST, corpus_dir=DEFAULT_CORPUS_DIR, force=False):
+    """
+    Generate the documents of the manifest that are missing (all with force)
+    Returns: list of (spec, path)
+    """
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    Path(corpus_dir).mkdir(parents=True, exist_ok=True)
+    documents = []
+    for index, spec in enumerate(manifest["documents"]):
+        path = corpus_path(corpus_dir, spec)
+        if force or not path.exists():
+            # One generator per document: adding a document does not change the others
+            MAKERS[spec["kind"]](path, spec, random.Random(manifest["seed"] + index))
+            print(f"📄 Generated {path.name} ({path.stat().st_size / 1024:.0f} KB)")
+        documents.append((spec, path))
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Corpus manifest")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="Where the documents are written")
+    parser.add_argument("--force", action="store_true", help="Regenerate existing documents")
+    args = parser.parse_args()
+    ensure_corpus(args.manifest, args.corpus_dir, args.force)
+
+
+if __name__ == "__main__":
+    main()
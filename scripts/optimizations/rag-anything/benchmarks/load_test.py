@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Load test: /convert/to-pdf under concurrency, on the generated corpus
+
+Sends the documents of fixtures/manifest.json (generated on first use,
+see generate_corpus.py) to /convert/to-pdf with --concurrency requests in
+flight, for each concurrency level given. The target is either:
+- the app in-process (Starlette TestClient, full HTTP stack, no network),
+  configured with --env overrides (CONVERTER_BACKEND, CONVERTER_POOL_SIZE...)
+- a running service (--url), e.g. the container on localhost:9511
+
+Per level: throughput, latency percentiles and histogram (overall and per
+document), status codes and failure rate (429, 504, errors), and, sampled
+from /proc while requests are in flight, the number of LibreOffice
+subprocesses and the peak memory of the service's process tree.
+
+In-process, the PDF cache is disabled unless --cache is given, so every
+request converts. Against --url, start the service with
+CONVERTER_CACHE_MAX_MB=0 for the same reason (cache hits are reported).
+Without --server-pid, only the host's soffice processes are sampled.
+
+Results are JSON (sorted keys) so runs of different modes can be diffed.
+
+Usage:
+    python load_test.py --concurrency 1,4,8 --requests 90 --output inprocess.json
+    python load_test.py --env CONVERTER_BACKEND=subprocess --env CONVERTER_POOL_SIZE=4 --label subprocess-4
+    python load_test.py --url http://localhost:9511 --server-pid "$(pgrep -f uvicorn)" --concurrency 16
+    python load_test.py --size small --kind docx --kind pptx
+"""
+import argparse
+import itertools
+import os
+import platform
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bench_common import DEFAULT_SERVICE, latency_histogram, load_service, percentile, write_results
+from generate_corpus import DEFAULT_CORPUS_DIR, DEFAULT_MANIFEST, ensure_corpus
+
+# Histogram bounds (seconds)
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+# Process names counted as LibreOffice (comm, truncated to 15 characters by the kernel)
+SOFFICE_NAMES = {"soffice", "soffice.bin", "oosplash", "libreoffice"}
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# ===================================================================
+# Process sampling (/proc, Linux)
+# ===================================================================
+def process_table():
+    """pid -> (ppid, name, rss bytes) of the running processes"""
+    table = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            statm = (entry / "statm").read_text().split()
+        except OSError:  # exited meanwhile
+            continue
+        # comm may contain spaces or parentheses: it ends at the last ")"
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        table[int(entry.name)] = (ppid, name, int(statm[1]) * PAGE_SIZE)
+    return table
+
+
+def process_tree(table, root_pid):
+    """root_pid and all its descendants"""
+    children = defaultdict(list)
+    for pid, (ppid, _, _) in table.items():
+        children[ppid].append(pid)
+    tree, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in table:
+            tree.append(pid)
+            stack.extend(children[pid])
+    return tree
+
+
+class ProcessSampler(threading.Thread):
+    """
+    Samples the service's process tree while a run is in flight: number of
+    subprocesses and LibreOffice processes, memory (RSS) of the tree
+    root_pid None: only the soffice processes of the host
+    """
+
+    def __init__(self, root_pid=None, interval=0.1):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = []  # (subprocesses, soffice processes, tree rss, soffice rss)
+
+    def run(self):
+        if not Path("/proc").is_dir():
+            return
+        while not self.stopped.is_set():
+            table = process_table()
+            pids = process_tree(table, self.root_pid) if self.root_pid else list(table)
+            soffice = [pid for pid in pids if table[pid][1] in SOFFICE_NAMES]
+            tree_rss = sum(table[pid][2] for pid in pids) if self.root_pid else None
+            self.samples.append((
+                len(pids) - 1 if self.root_pid else None,
+                len(soffice),
+                tree_rss,
+                sum(table[pid][2] for pid in soffice),
+            ))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        if not self.samples:
+            return {"sampled": False}
+        subprocesses, soffice, tree_rss, soffice_rss = zip(*self.samples)
+        summary = {
+            "sampled": True,
+            "samples": len(self.samples),
+            "soffice_processes_peak": max(soffice),
+            "soffice_processes_mean": round(sum(soffice) / len(soffice), 1),
+            "soffice_peak_memory_mb": round(max(soffice_rss) / 1024 ** 2, 1),
+        }
+        if self.root_pid:
+            summary.update(
+                subprocesses_peak=max(subprocesses),
+                subprocesses_mean=round(sum(subprocesses) / len(subprocesses), 1),
+                peak_memory_mb=round(max(tree_rss) / 1024 ** 2, 1),
+            )
+        return summary
+
+
+# ===================================================================
+# Load generation
+# ===================================================================
+def run_level(post, corpus, concurrency, requests, root_pid):
+    """
+    `requests` conversions (corpus cycled) with `concurrency` in flight
+    post(name, content) -> (status code, X-Cache header)
+    """
+    plan = list(itertools.islice(itertools.cycle(corpus), requests))
+    outcomes = []  # (document id, status, latency, cache)
+
+    def send(item):
+        spec, name, content = item
+        submitted = time.perf_counter()
+        try:
+            status, cache = post(name, content)
+        except Exception as e:  # connection reset, client timeout...
+            status, cache = type(e).__name__, None
+        outcomes.append((spec["id"], status, time.perf_counter() - submitted, cache))
+
+    sampler = ProcessSampler(root_pid)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(send, plan))
+    wall = time.perf_counter() - started
+    processes = sampler.stop()
+
+    latencies = [latency for _, status, latency, _ in outcomes if status == 200]
+    per_document = defaultdict(list)
+    for document_id, status, latency, _ in outcomes:
+        if status == 200:
+            per_document[document_id].append(latency)
+    failures = len(outcomes) - len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "succeeded": len(latencies),
+        "failures": failures,
+        "failure_rate": round(failures / len(outcomes), 4) if outcomes else 0.0,
+        "status_codes": {str(status): count for status, count in Counter(o[1] for o in outcomes).items()},
+        "cache_hits": sum(1 for o in outcomes if o[3] == "HIT"),
+        "wall_seconds": round(wall, 2),
+        "requests_per_second": round(len(latencies) / wall, 2) if wall else None,
+        "docs_per_minute": round(60 * len(latencies) / wall, 1) if wall else None,
+        "latency_s": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            **{name: round(percentile(latencies, fraction), 3) if latencies else None
+               for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        },
+        "latency_histogram": latency_histogram(latencies, LATENCY_BUCKETS),
+        "latency_p50_by_document_s": {
+            document_id: round(percentile(values, 0.50), 3) for document_id, values in sorted(per_document.items())
+        },
+        "processes": processes,
+    }
+
+
+def in_process_target(args):
+    """post() against the app in-process, its pid, the service module"""
+    env = dict(item.split("=", 1) for item in args.env)
+    if not args.cache:
+        env.setdefault("CONVERTER_CACHE_MAX_MB", "0")
+    service = load_service(args.service, **env)
+    from fastapi.testclient import TestClient
+
+    client = TestClient(service.app)
+
+    def post(name, content):
+        response = client.post("/convert/to-pdf", files={"file": (name, content, "application/octet-stream")})
+        return response.status_code, response.headers.get("X-Cache")
+
+    return client, post, os.getpid(), service
+
+
+def http_target(args):
+    """post() against a running service"""
+    import httpx
+
+    client = httpx.Client(base_url=args.url, timeout=args.timeout)
+
+    def post(name, content):
+        response = client.post("/convert/to-pdf", files={"file": (name, content, "application/octet-stream")})
+        return response.status_code, response.headers.get("X-Cache")
+
+    return client, post, args.server_pid, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=90, help="Requests per level (corpus cycled)")
+    parser.add_argument("--size", action="append", choices=("small", "medium", "large"), help="Only these sizes")
+    parser.add_argument("--kind", action="append", choices=("docx", "xlsx", "pptx"), help="Only these formats")
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Corpus manifest")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="Generated documents")
+    parser.add_argument("--service", default=str(DEFAULT_SERVICE), help="converter_service.py to run in-process")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Service configuration for the in-process run (repeatable)")
+    parser.add_argument("--cache", action="store_true", help="Keep the PDF cache enabled in-process")
+    parser.add_argument("--url", help="Running service to test instead, e.g. http://localhost:9511")
+    parser.add_argument("--server-pid", type=int, help="With --url: pid of the service, for process sampling")
+    parser.add_argument("--timeout", type=float, default=300, help="Client timeout per request with --url")
+    parser.add_argument("--label", help="Name of this run in the results (e.g. the converter mode)")
+    parser.add_argument("--output", help="JSON output file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    documents = [
+        (spec, path) for spec, path in ensure_corpus(args.manifest, args.corpus_dir)
+        if (not args.size or spec["size"] in args.size) and (not args.kind or spec["kind"] in args.kind)
+    ]
+    if not documents:
+        parser.error("No document matches --size/--kind")
+    corpus = [(spec, path.name, path.read_bytes()) for spec, path in documents]
+
+    client, post, root_pid, service = http_target(args) if args.url else in_process_target(args)
+    results = {
+        "label": args.label,
+        "target": args.url or "in-process",
+        "env": dict(item.split("=", 1) for item in args.env) if not args.url else None,
+        "host": {"cores": os.cpu_count(), "platform": platform.platform()},
+        "corpus": [
+            {"id": spec["id"], "kind": spec["kind"], "size": spec["size"], "bytes": path.stat().st_size}
+            for spec, path in documents
+        ],
+        "levels": [],
+    }
+    with client:
+        pool = service.pool.stats() if service is not None else client.get("/health").json().get("pool", {})
+        results["pool"] = {"backend": pool.get("backend"), "slots": pool.get("slots")}
+        for concurrency in levels:
+            print(f"⏱️  Concurrency {concurrency}: {args.requests} requests")
+            results["levels"].append(run_level(post, corpus, concurrency, args.requests, root_pid))
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
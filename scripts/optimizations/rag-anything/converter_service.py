@@ -1,72 +1,1122 @@
 """
 Document Converter Microservice
 Converts Office documents using LibreOffice
+
+Conversions go through a pool of soffice slots, each with its own user
+profile (LibreOffice locks a profile to a single running instance):
+
+- unoserver backend: one long-lived `unoserver` (soffice + XML-RPC) per
+  slot, no start-up cost per document. Needs the unoserver package and
+  python3-uno (see Dockerfile.converter).
+- subprocess backend: one `soffice --convert-to` per document, started
+  asynchronously with the slot's already initialised profile.
+
+Requests wait for a free slot in a bounded queue without blocking the
+event loop.
 """
 
-from fastapi import FastAPI, UploadFile, HTTPException
-from fastapi.responses import FileResponse
-import subprocess
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, HTTPException, Header, Query
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.background import BackgroundTask
+import asyncio
+import hashlib
+import json
+import logging
+import math
 import os
+import shutil
+import signal
 import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 
-app = FastAPI(title="Document Converter Service")
+import text_extraction
+import thumbnails
+
+try:
+    from unoserver.client import UnoClient
+except ImportError:  # subprocess backend only
+    UnoClient = None
+
+logger = logging.getLogger("converter")
 
 SUPPORTED_FORMATS = {'.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp'}
 
-@app.get("/health")
-async def health():
-    """Health check endpoint"""
-    return {"status": "healthy", "service": "document-converter"}
+SOFFICE_BIN = os.getenv("SOFFICE_BIN", "libreoffice")
+CONVERTER_BACKEND = os.getenv("CONVERTER_BACKEND", "auto")  # auto | unoserver | subprocess
+POOL_SIZE = int(os.getenv("CONVERTER_POOL_SIZE", "0"))  # 0 = sized from cores and memory
+SOFFICE_MEMORY_BYTES = int(float(os.getenv("SOFFICE_MEMORY_MB", "350")) * 1024 * 1024)  # per instance
+QUEUE_MAX = int(os.getenv("CONVERTER_QUEUE_MAX", "32"))  # requests waiting for a slot
+QUEUE_TIMEOUT = float(os.getenv("CONVERTER_QUEUE_TIMEOUT", "30"))  # max wait for a slot
+CONVERSION_TIMEOUT = float(os.getenv("CONVERSION_TIMEOUT", "60"))
+# Async jobs (POST /jobs): queued + running jobs, and how long finished jobs are kept
+JOBS_MAX = int(os.getenv("CONVERTER_JOBS_MAX", "100"))
+JOB_TTL = float(os.getenv("CONVERTER_JOB_TTL", "3600"))
+PROFILE_ROOT = Path(os.getenv("CONVERTER_PROFILE_ROOT", "/app/temp/profiles"))
+# unoserver: slot i listens on UNOSERVER_PORT + 2i (XML-RPC) and UNOSERVER_PORT + 2i + 1 (UNO)
+UNOSERVER_PORT = int(os.getenv("UNOSERVER_PORT", "2003"))
+# unoserver runs under the interpreter that ships the `uno` module (python3-uno)
+UNOSERVER_PYTHON = os.getenv("UNOSERVER_PYTHON", "/usr/bin/python3")
+UNOSERVER_START_TIMEOUT = float(os.getenv("UNOSERVER_START_TIMEOUT", "30"))
+MAX_UPLOAD_BYTES = int(float(os.getenv("CONVERTER_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+# /convert/batch: whole request (or unpacked zip) and number of documents
+BATCH_MAX_BYTES = int(float(os.getenv("CONVERTER_MAX_BATCH_MB", "500")) * 1024 * 1024)
+BATCH_MAX_FILES = int(os.getenv("CONVERTER_MAX_BATCH_FILES", "200"))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Content-addressed PDF cache (SHA-256 of the upload + extension), 0 disables it
+CACHE_DIR = Path(os.getenv("CONVERTER_CACHE_DIR", "/app/temp/cache"))
+CACHE_MAX_BYTES = int(float(os.getenv("CONVERTER_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+TEXT_CACHE_MAX_BYTES = int(float(os.getenv("CONVERTER_TEXT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+# Processes for the native text extraction and page rendering (0 = one per core)
+EXTRACT_WORKERS = int(os.getenv("CONVERTER_EXTRACT_WORKERS", "0"))
+# Fallback for text extraction: LibreOffice rewrites the document as OOXML
+OOXML_TARGETS = {
+    '.doc': "docx", '.docx': "docx", '.odt': "docx",
+    '.xls': "xlsx", '.xlsx': "xlsx", '.ods': "xlsx",
+    '.ppt': "pptx", '.pptx': "pptx", '.odp': "pptx",
+}
+TEXT_MEDIA_TYPES = {"text": "text/plain", "markdown": "text/markdown"}  # charset added by Starlette
+# Page previews (/convert/thumbnails): cache size per image format, pages per request
+THUMBNAIL_CACHE_MAX_BYTES = int(float(os.getenv("CONVERTER_THUMBNAIL_CACHE_MAX_MB", "256")) * 1024 * 1024)
+THUMBNAIL_MAX_PAGES = int(os.getenv("CONVERTER_THUMBNAIL_MAX_PAGES", "20"))
+PAGE_COUNTS_MAX = 10000  # page counts remembered, so "first N" of a shorter document stays a cache hit
 
-@app.post("/convert/to-pdf")
-async def convert_to_pdf(file: UploadFile):
-    """Convert Office document to PDF"""
 
-    # Validate file extension
-    file_ext = Path(file.filename).suffix.lower()
+def available_cores():
+    """CPUs usable by this container (affinity and cgroup quota)"""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def memory_limit_bytes():
+    """Memory limit of this container (cgroup), or the host memory, None if unknown"""
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            value = Path(path).read_text().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            limits.append(int(value))
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemTotal:"):
+                    limits.append(int(line.split()[1]) * 1024)
+                    break
+    except OSError:
+        pass
+    return min(limits) if limits else None
+
+
+def default_pool_size():
+    """One soffice per core, as many as SOFFICE_MEMORY_MB each fits in the memory limit"""
+    cores = available_cores()
+    memory = memory_limit_bytes()
+    by_memory = max(1, memory // SOFFICE_MEMORY_BYTES) if memory else cores
+    return max(1, min(cores, by_memory))
+
+
+class PoolFull(Exception):
+    """Raised when a request cannot get a slot: queue full or QUEUE_TIMEOUT reached"""
+
+    def __init__(self, retry_after=1):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+class ConversionError(Exception):
+    pass
+
+
+class SofficeSlot:
+    """One LibreOffice instance (or profile) used by one conversion at a time"""
+
+    def __init__(self, index, backend):
+        self.index = index
+        self.backend = backend
+        self.profile = PROFILE_ROOT / f"slot-{index}"
+        self.port = UNOSERVER_PORT + 2 * index
+        self.process = None
+        self.conversions = 0
+
+    @property
+    def profile_url(self):
+        return self.profile.resolve().as_uri()
+
+    def soffice_args(self):
+        return [SOFFICE_BIN, f"-env:UserInstallation={self.profile_url}",
+                "--headless", "--norestore", "--nologo", "--nodefault"]
+
+    async def start(self):
+        self.profile.mkdir(parents=True, exist_ok=True)
+        if self.backend == "unoserver":
+            await self._start_unoserver()
+        else:
+            # First launch creates the profile (several seconds); done once here
+            process = await asyncio.create_subprocess_exec(
+                *self.soffice_args(), "--terminate_after_init",
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            await process.wait()
+
+    async def _start_unoserver(self):
+        self.process = await asyncio.create_subprocess_exec(
+            UNOSERVER_PYTHON, "-m", "unoserver.server",
+            "--executable", shutil.which(SOFFICE_BIN) or SOFFICE_BIN,
+            "--interface", "127.0.0.1",
+            "--port", str(self.port),
+            "--uno-port", str(self.port + 1),
+            "--user-installation", self.profile_url,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True
+        )
+        deadline = time.monotonic() + UNOSERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"unoserver slot {self.index} exited with {self.process.returncode}")
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return
+            except OSError:
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"unoserver slot {self.index} not ready after {UNOSERVER_START_TIMEOUT:.0f}s")
+
+    async def stop(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        # unoserver starts soffice as a child: stop the whole process group
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            await asyncio.wait_for(self.process.wait(), 10)
+        except (ProcessLookupError, asyncio.TimeoutError):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+
+    async def restart(self):
+        logger.warning(f"Restarting soffice slot {self.index}")
+        await self.stop()
+        await self.start()
+
+    async def convert(self, input_path, out_dir, target="pdf", timeout=CONVERSION_TIMEOUT):
+        """Convert `input_path` into `out_dir`, returns the output path"""
+        output_path = Path(out_dir) / f"{Path(input_path).stem}.{target}"
+        if self.backend == "unoserver":
+            if self.process is None or self.process.returncode is not None:
+                await self.restart()
+            client = UnoClient(server="127.0.0.1", port=str(self.port))
+            try:
+                await asyncio.wait_for(asyncio.to_thread(
+                    client.convert, inpath=str(input_path), outpath=str(output_path), convert_to=target
+                ), timeout)
+            except asyncio.TimeoutError:
+                # Killing the instance also unblocks the XML-RPC call
+                await self.restart()
+                raise ConversionTimeout()
+            except Exception as e:
+                raise ConversionError(str(e))
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *self.soffice_args(), "--convert-to", target, "--outdir", str(out_dir), str(input_path),
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise ConversionTimeout()
+            if process.returncode != 0:
+                raise ConversionError(stderr.decode(errors="replace"))
+
+        self.conversions += 1
+        if not output_path.exists():
+            raise ConversionError("Conversion failed")
+        return output_path
+
+
+class SofficePool:
+    """Fixed set of slots handed out to requests through an asyncio queue"""
+
+    def __init__(self, size=POOL_SIZE, backend=CONVERTER_BACKEND, queue_max=QUEUE_MAX):
+        if backend == "auto":
+            backend = "unoserver" if UnoClient is not None and os.path.exists(UNOSERVER_PYTHON) else "subprocess"
+        self.backend = backend
+        self.queue_max = queue_max
+        self.slots = [SofficeSlot(index, backend) for index in range(size or default_pool_size())]
+        self.idle = asyncio.Queue()
+        self.waiting = 0
+        self.rejected = 0
+        self.timeouts = 0
+        # Moving average of the conversion time, for Retry-After
+        self.average_seconds = 5.0
+
+    async def start(self):
+        await asyncio.gather(*(slot.start() for slot in self.slots))
+        for slot in self.slots:
+            self.idle.put_nowait(slot)
+        logger.info(f"soffice pool ready: {len(self.slots)} slots ({self.backend})")
+
+    async def stop(self):
+        await asyncio.gather(*(slot.stop() for slot in self.slots))
+
+    def retry_after(self, backlog=None):
+        """Seconds until a slot is likely free for a new request"""
+        backlog = self.waiting if backlog is None else backlog
+        return max(1, math.ceil((backlog + 1) * self.average_seconds / len(self.slots)))
+
+    async def convert(self, input_path, out_dir, target="pdf", timeout=None,
+                      queue_timeout=QUEUE_TIMEOUT, bounded=True, on_start=None):
+        """
+        Convert on the next free slot. `bounded`: reject with PoolFull when
+        QUEUE_MAX requests are already waiting (jobs are admitted beforehand);
+        `queue_timeout` None waits for a slot indefinitely; `timeout` is
+        capped by CONVERSION_TIMEOUT
+        """
+        if bounded and self.idle.empty() and self.waiting >= self.queue_max:
+            self.rejected += 1
+            raise PoolFull(self.retry_after())
+        self.waiting += 1
+        try:
+            slot = await asyncio.wait_for(self.idle.get(), queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolFull(self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        if on_start is not None:
+            on_start()
+        timeout = min(timeout, CONVERSION_TIMEOUT) if timeout else CONVERSION_TIMEOUT
+        started = time.monotonic()
+        try:
+            output = await slot.convert(input_path, out_dir, target, timeout)
+        except ConversionTimeout:
+            self.timeouts += 1
+            raise
+        finally:
+            self.idle.put_nowait(slot)
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * (time.monotonic() - started)
+        return output
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "slots": len(self.slots),
+            "busy": len(self.slots) - self.idle.qsize(),
+            "waiting": self.waiting,
+            "conversions": sum(slot.conversions for slot in self.slots),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "average_seconds": round(self.average_seconds, 2),
+        }
+
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies over MAX_UPLOAD_BYTES with 413: up front from
+    Content-Length, or as soon as a chunked body goes past the limit
+    (before the multipart parser has spooled the whole upload)
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES, batch_max_bytes=BATCH_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.batch_max_bytes = batch_max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+
+        max_bytes = self.batch_max_bytes if scope["path"] == "/convert/batch" else self.max_bytes
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse({"detail": upload_too_large(max_bytes)}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised while FastAPI parses the form: answered as a 413
+                    raise HTTPException(status_code=413, detail=upload_too_large(max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def upload_too_large(max_bytes=MAX_UPLOAD_BYTES):
+    return f"Upload too large (max {max_bytes // (1024 * 1024)} MB)"
+
+
+async def save_upload(file, destination, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Copy an upload to disk chunk by chunk, enforcing `max_bytes`
+    Returns: (size, SHA-256 hex digest of the content)
+    """
+    size = 0
+    digest = hashlib.sha256()
+    with open(destination, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=upload_too_large(max_bytes))
+            digest.update(chunk)
+            f.write(chunk)
+    return size, digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    On-disk cache of converted files keyed by content hash, size-bounded
+    with LRU eviction (recency kept in file mtimes across restarts)
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, suffix=".pdf"):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.entries = OrderedDict()  # key -> size, least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0  # 304 answers to If-None-Match
+        # Concurrent requests for the same key wait for a single conversion
+        self.inflight = {}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path(self, key):
+        return self.root / key[:2] / f"{key}{self.suffix}"
+
+    def load(self):
+        """Index the files left by a previous run (blocking, run at startup)"""
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        found = []
+        for path in self.root.glob(f"*/*{self.suffix}*"):
+            if path.name.endswith(".tmp"):
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            found.append((stat.st_mtime, path.name[:-len(self.suffix)], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.bytes += size
+        self._evict()
+
+    def get(self, key):
+        """Cached file for `key` (marked as recently used), or None"""
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        if key in self.entries and path.exists():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            os.utime(path)
+            return path
+        self.entries.pop(key, None)
+        self.misses += 1
+        return None
+
+    async def put(self, key, source):
+        """Store a copy of `source` under `key`, then evict down to max_bytes"""
+        if not self.enabled:
+            return
+        size = await asyncio.to_thread(self._write, key, source)
+        self.bytes += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+        self._evict()
+
+    def _write(self, key, source):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+        return path.stat().st_size
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            self.path(key).unlink(missing_ok=True)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "size_mb": round(self.bytes / 1024 ** 2, 1),
+            "max_mb": round(self.max_bytes / 1024 ** 2, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def serve_copy(cached_path, temp_dir):
+    """
+    Hard link a cached file into the request directory, so an eviction
+    during the response cannot remove it (falls back to the cache path)
+    """
+    link = Path(temp_dir) / cached_path.name
+    try:
+        os.link(cached_path, link)
+        return link
+    except OSError:
+        return cached_path
+
+
+async def convert_cached(input_path, key, out_dir, **convert_options):
+    """
+    PDF for `input_path`: from the cache, or converted on the pool and cached
+    (`convert_options`: see SofficePool.convert)
+    Returns: (PDF path inside out_dir, cache hit)
+    """
+    if not pdf_cache.enabled:
+        return await pool.convert(input_path, out_dir, **convert_options), False
+
+    # Same document being converted for another request: wait for it (a
+    # failed conversion leaves the cache empty, the next waiter takes over)
+    while key in pdf_cache.inflight:
+        await asyncio.shield(pdf_cache.inflight[key])
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        return serve_copy(cached, out_dir), True
+
+    # Convert to PDF on a pooled LibreOffice instance (this request alone
+    # owns, and resolves, the inflight future)
+    done = pdf_cache.inflight[key] = asyncio.get_running_loop().create_future()
+    try:
+        pdf_path = await pool.convert(input_path, out_dir, **convert_options)
+        await pdf_cache.put(key, pdf_path)
+    finally:
+        del pdf_cache.inflight[key]
+        done.set_result(None)
+    return pdf_path, False
+
+
+def cache_key(digest, file_ext):
+    return f"{digest}-{file_ext[1:]}"
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def extract_archive(archive_path, dest_dir, max_bytes=BATCH_MAX_BYTES):
+    """
+    Unpack the supported documents of a zip, one directory per document
+    Returns: list of (name, path, SHA-256 digest)
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and Path(info.filename).suffix.lower() in SUPPORTED_FORMATS]
+        if sum(info.file_size for info in members) > max_bytes:
+            raise HTTPException(status_code=413, detail=upload_too_large(max_bytes))
+        documents = []
+        for index, info in enumerate(members):
+            name = Path(info.filename).name
+            target = Path(dest_dir) / f"zip-{index:04d}" / name
+            target.parent.mkdir(parents=True)
+            digest = hashlib.sha256()
+            with archive.open(info) as source, open(target, "wb") as f:
+                while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+            documents.append((name, target, digest.hexdigest()))
+    return documents
+
+
+async def collect_batch(files, dest_dir):
+    """
+    Save the uploaded files (and unpack zips) under dest_dir
+    Returns: list of documents (name, path, cache key, or error)
+    """
+    documents = []
+    for index, file in enumerate(files):
+        name = Path(file.filename or f"file-{index}").name
+        file_ext = Path(name).suffix.lower()
+        if file_ext != ".zip" and file_ext not in SUPPORTED_FORMATS:
+            documents.append({"file": name, "status": "error", "error": f"Unsupported format: {file_ext}"})
+            continue
+        target = Path(dest_dir) / f"{index:04d}" / name
+        target.parent.mkdir(parents=True)
+        _, digest = await save_upload(file, target, BATCH_MAX_BYTES)
+        if file_ext == ".zip":
+            try:
+                members = await asyncio.to_thread(extract_archive, target, dest_dir)
+            except zipfile.BadZipFile:
+                documents.append({"file": name, "status": "error", "error": "Invalid zip archive"})
+                continue
+            finally:
+                target.unlink()
+            documents.extend(
+                {"file": member, "path": path, "key": cache_key(member_digest, Path(member).suffix.lower())}
+                for member, path, member_digest in members
+            )
+        else:
+            documents.append({"file": name, "path": target, "key": cache_key(digest, file_ext)})
+    return documents
+
+
+async def convert_batch_item(document, slots):
+    if "error" in document:
+        return document
+    async with slots:
+        try:
+            pdf_path, hit = await convert_cached(document["path"], document["key"], document["path"].parent)
+        except ConversionTimeout:
+            return dict(document, status="error", error="Conversion timeout")
+        except ConversionError as e:
+            return dict(document, status="error", error=f"Conversion error: {e}")
+        except PoolFull:
+            return dict(document, status="error", error="Converter busy, retry later")
+    return dict(document, status="ok", pdf_path=pdf_path, cached=hit)
+
+
+def write_batch_archive(archive_path, documents):
+    """
+    Zip of the PDFs (stored: PDFs are already compressed) + manifest.json
+    with the status of every input document
+    """
+    manifest, used_names = [], set()
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for document in documents:
+            entry = {"file": document["file"], "status": document["status"]}
+            if document["status"] == "ok":
+                stem = Path(document["file"]).stem
+                pdf_name, counter = f"{stem}.pdf", 1
+                while pdf_name in used_names:  # a.docx, a.xlsx, a-1.doc...
+                    pdf_name = f"{stem}-{counter}.pdf"
+                    counter += 1
+                used_names.add(pdf_name)
+                archive.write(document["pdf_path"], pdf_name)
+                entry.update(pdf=pdf_name, etag=document["key"], cached=document["cached"])
+            else:
+                entry["error"] = document["error"]
+            manifest.append(entry)
+        archive.writestr("manifest.json", json.dumps({"documents": manifest}, indent=2, ensure_ascii=False))
+    return manifest
+
+
+
+class ConversionJob:
+    """Conversion accepted by POST /jobs, polled with GET /jobs/{id}"""
+
+    def __init__(self, filename, temp_dir):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.temp_dir = temp_dir
+        self.status = "queued"  # queued | running | completed | failed
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.pdf_path = None
+        self.key = None
+        self.cached = None
+        self.error = None
+        self.task = None
+
+    @property
+    def pending(self):
+        return self.status in ("queued", "running")
+
+    def mark_running(self):
+        self.status = "running"
+        self.started = time.time()
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "file": self.filename,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "cached": self.cached,
+            "error": self.error,
+        }
+
+
+jobs = {}
+
+
+def pending_jobs():
+    return sum(job.pending for job in jobs.values())
+
+
+async def run_job(job, input_path, timeout):
+    # Admitted jobs wait for a slot as long as needed: backpressure is the
+    # 429 of POST /jobs, not a failure after the 202
+    try:
+        job.pdf_path, job.cached = await convert_cached(
+            input_path, job.key, job.temp_dir, timeout=timeout, queue_timeout=None, bounded=False,
+            on_start=job.mark_running
+        )
+        job.status = "completed"
+    except ConversionTimeout:
+        job.status, job.error = "failed", "Conversion timeout"
+    except Exception as e:
+        job.status, job.error = "failed", f"Conversion error: {e}"
+    finally:
+        job.finished = time.time()
+
+
+async def reap_jobs(interval=60):
+    """Forget finished jobs (and their files) JOB_TTL seconds after completion"""
+    while True:
+        await asyncio.sleep(interval)
+        limit = time.time() - JOB_TTL
+        for job in [job for job in jobs.values() if not job.pending and job.finished < limit]:
+            del jobs[job.id]
+            await asyncio.to_thread(shutil.rmtree, job.temp_dir, True)
+
+
+def too_busy(retry_after):
+    return HTTPException(
+        status_code=429, detail="Converter busy, retry later", headers={"Retry-After": str(retry_after)}
+    )
+
+
+def check_format(filename):
+    """Extension of a supported upload, 400 otherwise"""
+    file_ext = Path(filename or "").suffix.lower()
     if file_ext not in SUPPORTED_FORMATS:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported format: {file_ext}. Supported: {SUPPORTED_FORMATS}"
         )
+    return file_ext
 
-    # Create temp directory
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Save uploaded file
-        input_path = Path(temp_dir) / file.filename
-        with open(input_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
 
-        # Convert to PDF using LibreOffice
+async def extract_blocks(input_path, file_ext, temp_dir):
+    """
+    Text blocks of a document (see text_extraction): parsed natively in
+    the extraction processes, or rewritten as OOXML by LibreOffice first
+    (legacy doc/xls/ppt, or a file the native parser rejects)
+    Returns: (blocks, "native" | "libreoffice")
+    """
+    loop = asyncio.get_running_loop()
+    if file_ext in text_extraction.NATIVE_FORMATS:
         try:
-            subprocess.run([
-                "libreoffice",
-                "--headless",
-                "--convert-to", "pdf",
-                "--outdir", temp_dir,
-                str(input_path)
-            ], check=True, capture_output=True, timeout=60)
-
-            # Get output PDF path
-            pdf_filename = input_path.stem + ".pdf"
-            pdf_path = Path(temp_dir) / pdf_filename
-
-            if not pdf_path.exists():
-                raise HTTPException(status_code=500, detail="Conversion failed")
-
-            # Return PDF file
+            blocks = await loop.run_in_executor(
+                worker_executor, text_extraction.extract_blocks, str(input_path), file_ext
+            )
+            return blocks, "native"
+        except text_extraction.ExtractionError as e:
+            logger.warning(f"Native extraction failed for {input_path.name} ({e}), using LibreOffice")
+
+    target = OOXML_TARGETS[file_ext]
+    out_dir = Path(temp_dir) / "ooxml"
+    out_dir.mkdir(exist_ok=True)
+    ooxml_path = await pool.convert(input_path, out_dir, target=target)
+    try:
+        blocks = await loop.run_in_executor(
+            worker_executor, text_extraction.extract_blocks, str(ooxml_path), f".{target}"
+        )
+    except text_extraction.ExtractionError as e:
+        raise ConversionError(f"Text extraction failed: {e}")
+    return blocks, "libreoffice"
+
+
+async def extract_document(file, output, if_none_match=None):
+    """Response of /convert/to-text and /convert/to-markdown"""
+    file_ext = check_format(file.filename)
+    temp_dir = tempfile.mkdtemp(prefix="extract-")
+    try:
+        input_path = Path(temp_dir) / Path(file.filename).name
+        _, digest = await save_upload(file, input_path)
+        key = cache_key(digest, file_ext)
+        etag = f'"{key}-{output}"'
+        if etag_matches(if_none_match, etag):
+            text_cache.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+
+        # Blocks are cached (JSON), both renderings come from them
+        cached = text_cache.get(key)
+        if cached is not None:
+            blocks = json.loads(await asyncio.to_thread(cached.read_text, encoding="utf-8"))
+            method = "cache"
+        else:
+            blocks, method = await extract_blocks(input_path, file_ext, temp_dir)
+            if text_cache.enabled:
+                blocks_path = Path(temp_dir) / "blocks.json"
+                blocks_path.write_text(json.dumps(blocks, ensure_ascii=False), encoding="utf-8")
+                await text_cache.put(key, blocks_path)
+
+        render = text_extraction.render_markdown if output == "markdown" else text_extraction.render_text
+        return PlainTextResponse(
+            render(blocks),
+            media_type=TEXT_MEDIA_TYPES[output],
+            headers={"ETag": etag, "X-Extraction": method}
+        )
+
+    except PoolFull as e:
+        raise too_busy(e.retry_after)
+    except ConversionTimeout:
+        raise HTTPException(status_code=504, detail="Conversion timeout")
+    except ConversionError as e:
+        raise HTTPException(status_code=500, detail=f"Conversion error: {e}")
+    finally:
+        await asyncio.to_thread(shutil.rmtree, temp_dir, True)
+
+
+def remember_page_count(key, page_count):
+    page_counts[key] = page_count
+    page_counts.move_to_end(key)
+    while len(page_counts) > PAGE_COUNTS_MAX:
+        page_counts.popitem(last=False)
+
+
+async def thumbnail_images(input_path, key, temp_dir, pages, image_format, width):
+    """
+    Images of `pages` of a document: from the cache, or rendered from its
+    (cached) PDF in the worker processes and cached. Pages past the end of
+    the document are left out.
+    Returns: ({page: image path}, "HIT" | "PARTIAL" | "MISS")
+    """
+    cache = thumbnail_caches[image_format]
+    if key in page_counts:
+        pages = [page for page in pages if page <= page_counts[key]]
+    images = {}
+    for page in pages:
+        cached = cache.get(f"{key}-w{width}-p{page}")
+        if cached is not None:
+            images[page] = serve_copy(cached, temp_dir)
+    missing = [page for page in pages if page not in images]
+    if not missing:
+        return images, "HIT"
+
+    pdf_path, _ = await convert_cached(input_path, key, temp_dir)
+    out_dir = Path(temp_dir) / "pages"
+    out_dir.mkdir(exist_ok=True)
+    try:
+        page_count, rendered = await asyncio.get_running_loop().run_in_executor(
+            worker_executor, thumbnails.render_pages, str(pdf_path), str(out_dir), missing, image_format, width
+        )
+    except thumbnails.RenderError as e:
+        raise ConversionError(f"Rendering failed: {e}")
+    remember_page_count(key, page_count)
+    for page, path in rendered.items():
+        await cache.put(f"{key}-w{width}-p{page}", path)
+        images[page] = Path(path)
+    return dict(sorted(images.items())), "PARTIAL" if len(images) > len(rendered) else "MISS"
+
+
+def write_thumbnail_archive(archive_path, images, stem, image_format):
+    """Zip of the page images (stored: PNG/WebP are already compressed)"""
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for page, path in images.items():
+            archive.write(path, f"{stem}-page-{page:04d}.{image_format}")
+
+
+pool = SofficePool()
+pdf_cache = ConversionCache()
+text_cache = ConversionCache(CACHE_DIR / "text", TEXT_CACHE_MAX_BYTES, suffix=".json")
+thumbnail_caches = {
+    image_format: ConversionCache(CACHE_DIR / "thumbnails", THUMBNAIL_CACHE_MAX_BYTES, suffix=f".{image_format}")
+    for image_format in thumbnails.IMAGE_FORMATS
+}
+page_counts = OrderedDict()  # cache key -> pages of the PDF, least recently used first
+worker_executor = None  # text extraction and page rendering (CPU-bound, off the event loop)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global worker_executor
+    for cache in (pdf_cache, text_cache, *thumbnail_caches.values()):
+        await asyncio.to_thread(cache.load)
+    # spawn: no fork of a process already running the event loop and threads
+    worker_executor = ProcessPoolExecutor(EXTRACT_WORKERS or available_cores(), mp_context=get_context("spawn"))
+    await pool.start()
+    reaper = asyncio.create_task(reap_jobs())
+    yield
+    reaper.cancel()
+    await pool.stop()
+    worker_executor.shutdown(cancel_futures=True)
+
+app = FastAPI(title="Document Converter Service", lifespan=lifespan)
+app.add_middleware(UploadLimitMiddleware)
+
+@app.get("/health")
+async def health():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "service": "document-converter",
+        "pool": pool.stats(),
+        "cache": pdf_cache.stats(),
+        "text_cache": text_cache.stats(),
+        "thumbnail_cache": {image_format: cache.stats() for image_format, cache in thumbnail_caches.items()},
+        "jobs": {"pending": pending_jobs(), "total": len(jobs), "max": JOBS_MAX},
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: queue depth, in-flight conversions, cache and jobs"""
+    stats, cache = pool.stats(), pdf_cache.stats()
+    job_counts = {status: 0 for status in ("queued", "running", "completed", "failed")}
+    for job in jobs.values():
+        job_counts[job.status] += 1
+    lines = [
+        "# TYPE converter_queue_depth gauge",
+        f"converter_queue_depth {stats['waiting']}",
+        "# TYPE converter_inflight gauge",
+        f"converter_inflight {stats['busy']}",
+        "# TYPE converter_slots gauge",
+        f"converter_slots {stats['slots']}",
+        "# TYPE converter_conversions_total counter",
+        f"converter_conversions_total {stats['conversions']}",
+        "# TYPE converter_rejected_total counter",
+        f"converter_rejected_total {stats['rejected']}",
+        "# TYPE converter_timeouts_total counter",
+        f"converter_timeouts_total {stats['timeouts']}",
+        "# TYPE converter_jobs gauge",
+        *(f'converter_jobs{{status="{status}"}} {count}' for status, count in job_counts.items()),
+        "# TYPE converter_cache_events_total counter",
+        *(f'converter_cache_events_total{{event="{event}"}} {cache[event]}'
+          for event in ("hits", "misses", "evictions", "not_modified")),
+        "# TYPE converter_cache_bytes gauge",
+        f"converter_cache_bytes {pdf_cache.bytes}",
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.post("/convert/to-pdf")
+async def convert_to_pdf(file: UploadFile, if_none_match: Optional[str] = Header(None),
+                         timeout: Optional[float] = Query(None, gt=0)):
+    """Convert Office document to PDF (cached by content hash, ETag = hash)"""
+
+    # Validate file extension
+    file_ext = check_format(file.filename)
+
+    # Temp directory removed once the response is sent
+    temp_dir = tempfile.mkdtemp(prefix="convert-")
+    cleanup = BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+    try:
+        # Save uploaded file (streamed, never held in memory)
+        input_path = Path(temp_dir) / Path(file.filename).name
+        _, digest = await save_upload(file, input_path)
+        key = cache_key(digest, file_ext)
+        etag = f'"{key}"'
+
+        # Same content as the client's copy: nothing to convert or send
+        if etag_matches(if_none_match, etag):
+            pdf_cache.not_modified += 1
+            await cleanup()
+            return Response(status_code=304, headers={"ETag": etag})
+
+        pdf_path, hit = await convert_cached(input_path, key, temp_dir, timeout=timeout)
+
+        # Return PDF file (streamed from disk in chunks)
+        return FileResponse(
+            path=str(pdf_path),
+            media_type="application/pdf",
+            filename=f"{input_path.stem}.pdf",
+            headers={"ETag": etag, "X-Cache": "HIT" if hit else "MISS"},
+            background=cleanup
+        )
+
+    except PoolFull as e:
+        await cleanup()
+        raise too_busy(e.retry_after)
+    except ConversionTimeout:
+        await cleanup()
+        raise HTTPException(status_code=504, detail="Conversion timeout")
+    except ConversionError as e:
+        await cleanup()
+        raise HTTPException(status_code=500, detail=f"Conversion error: {e}")
+    except BaseException:
+        await cleanup()
+        raise
+
+@app.post("/convert/to-text")
+async def convert_to_text(file: UploadFile, if_none_match: Optional[str] = Header(None)):
+    """Extract the text of an Office document (headings, lists, tables, slides)"""
+    return await extract_document(file, "text", if_none_match)
+
+@app.post("/convert/to-markdown")
+async def convert_to_markdown(file: UploadFile, if_none_match: Optional[str] = Header(None)):
+    """Extract an Office document as Markdown (headings, lists, tables, slides)"""
+    return await extract_document(file, "markdown", if_none_match)
+
+@app.post("/convert/thumbnails")
+async def convert_thumbnails(file: UploadFile,
+                             pages: Optional[str] = Query(None, description='Page selection, e.g. "1-3,5"'),
+                             first: int = Query(1, ge=1, le=THUMBNAIL_MAX_PAGES),
+                             image_format: str = Query("png", alias="format"),
+                             width: int = Query(256, ge=16, le=2048),
+                             if_none_match: Optional[str] = Header(None)):
+    """Render pages of a document (`pages`, or the `first` N) as PNG/WebP: one image, or a zip of images"""
+    file_ext = check_format(file.filename)
+    if image_format not in thumbnails.IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format: {image_format}. Supported: png, webp")
+    missing_dependency = thumbnails.missing_dependency(image_format)
+    if missing_dependency:
+        raise HTTPException(status_code=501, detail=f"{image_format} previews need {missing_dependency}")
+    try:
+        selection = thumbnails.parse_pages(pages, THUMBNAIL_MAX_PAGES) if pages else list(range(1, first + 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Temp directory removed once the response is sent
+    temp_dir = tempfile.mkdtemp(prefix="thumbnails-")
+    cleanup = BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+    try:
+        input_path = Path(temp_dir) / Path(file.filename).name
+        _, digest = await save_upload(file, input_path)
+        key = cache_key(digest, file_ext)
+        etag = f'"{key}-w{width}-p{",".join(map(str, selection))}-{image_format}"'
+        if etag_matches(if_none_match, etag):
+            thumbnail_caches[image_format].not_modified += 1
+            await cleanup()
+            return Response(status_code=304, headers={"ETag": etag})
+
+        images, cache_status = await thumbnail_images(input_path, key, temp_dir, selection, image_format, width)
+        if not images:
+            raise HTTPException(status_code=400, detail=f"Document has {page_counts[key]} page(s)")
+        headers = {"ETag": etag, "X-Cache": cache_status}
+        if key in page_counts:
+            headers["X-Page-Count"] = str(page_counts[key])
+
+        # One page requested: the image itself, otherwise a zip of the pages
+        if len(selection) == 1:
             return FileResponse(
-                path=str(pdf_path),
-                media_type="application/pdf",
-                filename=pdf_filename
+                path=str(images[selection[0]]),
+                media_type=thumbnails.IMAGE_FORMATS[image_format],
+                filename=f"{input_path.stem}-page-{selection[0]:04d}.{image_format}",
+                headers=headers,
+                background=cleanup
             )
+        archive_path = Path(temp_dir) / "thumbnails.zip"
+        await asyncio.to_thread(write_thumbnail_archive, archive_path, images, input_path.stem, image_format)
+        return FileResponse(
+            path=str(archive_path),
+            media_type="application/zip",
+            filename=f"{input_path.stem}-thumbnails.zip",
+            headers=headers,
+            background=cleanup
+        )
+
+    except PoolFull as e:
+        await cleanup()
+        raise too_busy(e.retry_after)
+    except ConversionTimeout:
+        await cleanup()
+        raise HTTPException(status_code=504, detail="Conversion timeout")
+    except ConversionError as e:
+        await cleanup()
+        raise HTTPException(status_code=500, detail=f"Conversion error: {e}")
+    except BaseException:
+        await cleanup()
+        raise
+
+@app.post("/convert/batch")
+async def convert_batch(files: List[UploadFile]):
+    """Convert several documents (or zips of documents) to PDF, returns a zip with manifest.json"""
+
+    # Temp directory removed once the response is sent
+    temp_dir = tempfile.mkdtemp(prefix="batch-")
+    cleanup = BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+    try:
+        documents = await collect_batch(files, Path(temp_dir) / "inputs")
+        if len(documents) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many documents (max {BATCH_MAX_FILES})")
+        if not documents:
+            raise HTTPException(status_code=400, detail="No documents to convert")
+
+        # One document per pool slot at a time: the batch never overflows the pool queue
+        slots = asyncio.Semaphore(len(pool.slots))
+        results = await asyncio.gather(*(convert_batch_item(document, slots) for document in documents))
+
+        archive_path = Path(temp_dir) / "converted.zip"
+        manifest = await asyncio.to_thread(write_batch_archive, archive_path, results)
+        converted = sum(entry["status"] == "ok" for entry in manifest)
+        return FileResponse(
+            path=str(archive_path),
+            media_type="application/zip",
+            filename="converted.zip",
+            headers={"X-Batch-Converted": str(converted), "X-Batch-Failed": str(len(manifest) - converted)},
+            background=cleanup
+        )
+
+    except BaseException:
+        await cleanup()
+        raise
+
+@app.post("/jobs", status_code=202)
+async def create_job(file: UploadFile, timeout: Optional[float] = Query(None, gt=0)):
+    """Queue a PDF conversion, returns the job id to poll with GET /jobs/{id}"""
+    file_ext = check_format(file.filename)
+    # Admission: the backlog of accepted jobs is bounded
+    backlog = pending_jobs()
+    if backlog >= JOBS_MAX:
+        pool.rejected += 1
+        raise too_busy(pool.retry_after(backlog))
+
+    job = ConversionJob(Path(file.filename).name, tempfile.mkdtemp(prefix="job-"))
+    try:
+        input_path = Path(job.temp_dir) / job.filename
+        _, digest = await save_upload(file, input_path)
+    except BaseException:
+        shutil.rmtree(job.temp_dir, ignore_errors=True)
+        raise
+    job.key = cache_key(digest, file_ext)
+    jobs[job.id] = job
+    job.task = asyncio.create_task(run_job(job, input_path, timeout))
+    return dict(job.as_dict(), status_url=f"/jobs/{job.id}")
 
-        except subprocess.TimeoutExpired:
-            raise HTTPException(status_code=504, detail="Conversion timeout")
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=500, detail=f"Conversion error: {e.stderr}")
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status, or the PDF once the conversion is completed"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job.status != "completed":
+        return job.as_dict()
+    return FileResponse(
+        path=str(job.pdf_path),
+        media_type="application/pdf",
+        filename=f"{Path(job.filename).stem}.pdf",
+        headers={"ETag": f'"{job.key}"', "X-Cache": "HIT" if job.cached else "MISS"}
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,429 @@
+"""
+Structured text extraction from Office documents (stdlib only)
+
+Reads the XML parts of OOXML (docx/pptx/xlsx) and ODF (odt/ods/odp)
+archives directly, without LibreOffice: headings, paragraphs, list items,
+tables and slide text come out as a list of blocks, rendered as plain text
+or Markdown. Legacy binary formats (doc/xls/ppt) are not handled here: the
+converter service turns them into OOXML first.
+
+Blocks:
+    {"type": "heading", "level": 1, "text": "..."}
+    {"type": "paragraph", "text": "..."}
+    {"type": "list_item", "level": 0, "text": "..."}
+    {"type": "table", "rows": [["a", "b"], ...]}
+"""
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree
+
+NATIVE_FORMATS = {'.docx', '.pptx', '.xlsx', '.odt', '.ods', '.odp'}
+
+# Spreadsheets: rows kept per sheet (the rest is summarised in a paragraph)
+MAX_SHEET_ROWS = 5000
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE = "{urn:oasis:names:tc:opendocument:xmlns:office:1.0}"
+TEXT = "{urn:oasis:names:tc:opendocument:xmlns:text:1.0}"
+TABLE = "{urn:oasis:names:tc:opendocument:xmlns:table:1.0}"
+DRAW = "{urn:oasis:names:tc:opendocument:xmlns:drawing:1.0}"
+PRESENTATION = "{urn:oasis:names:tc:opendocument:xmlns:presentation:1.0}"
+
+HEADING_STYLE = re.compile(r"^(?:heading|titre|berschrift|encabezado|titolo)\s*(\d)$", re.IGNORECASE)
+
+
+class ExtractionError(Exception):
+    """The document could not be parsed natively"""
+
+
+def extract_blocks(path, file_ext):
+    """
+    Blocks of a docx/pptx/xlsx/odt/ods/odp file
+    Raises ExtractionError for unsupported or malformed documents
+    """
+    extractors = {
+        ".docx": docx_blocks, ".pptx": pptx_blocks, ".xlsx": xlsx_blocks,
+        ".odt": odf_blocks, ".ods": odf_blocks, ".odp": odf_blocks,
+    }
+    if file_ext not in extractors:
+        raise ExtractionError(f"No native extractor for {file_ext}")
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return extractors[file_ext](archive)
+    except (zipfile.BadZipFile, KeyError, IndexError, ElementTree.ParseError, ValueError) as e:
+        raise ExtractionError(f"{type(e).__name__}: {e}")
+
+
+# ===================================================================
+# OOXML
+# ===================================================================
+def read_xml(archive, name):
+    with archive.open(name) as f:
+        return ElementTree.parse(f).getroot()
+
+
+def relationships(archive, part):
+    """Relationship id -> archive path of the targets of `part`"""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+    if rels_path not in archive.namelist():
+        return {}
+    targets = {}
+    for rel in read_xml(archive, rels_path).iter(f"{PKG_REL}Relationship"):
+        target = rel.get("Target")
+        if rel.get("TargetMode") == "External":
+            continue
+        targets[rel.get("Id")] = (target.lstrip("/") if target.startswith("/")
+                                  else posixpath.normpath(posixpath.join(folder, target)))
+    return targets
+
+
+def docx_styles(archive):
+    """
+    Style id -> heading level (1 for the document title), and
+    style id -> list level for list styles ("List Bullet 2"...)
+    """
+    headings, lists = {}, {}
+    if "word/styles.xml" not in archive.namelist():
+        return headings, lists
+    for style in read_xml(archive, "word/styles.xml").iter(f"{W}style"):
+        style_id = style.get(f"{W}styleId")
+        name = style.find(f"{W}name")
+        name = name.get(f"{W}val", "").strip() if name is not None else ""
+        outline = style.find(f"{W}pPr/{W}outlineLvl")
+        match = HEADING_STYLE.match(name) or HEADING_STYLE.match(style_id or "")
+        if outline is not None and outline.get(f"{W}val", "").isdigit():
+            headings[style_id] = int(outline.get(f"{W}val")) + 1
+        elif match:
+            headings[style_id] = int(match.group(1))
+        elif name.lower() == "title":
+            headings[style_id] = 1
+        elif style.find(f"{W}pPr/{W}numPr") is not None:
+            indent = style.find(f"{W}pPr/{W}numPr/{W}ilvl")
+            trailing = re.search(r"(\d)$", name)
+            if indent is not None:
+                lists[style_id] = int(indent.get(f"{W}val", "0"))
+            else:
+                lists[style_id] = int(trailing.group(1)) - 1 if trailing else 0
+    return headings, lists
+
+
+def docx_text(element):
+    parts = []
+    for node in element.iter():
+        if node.tag == f"{W}t":
+            parts.append(node.text or "")
+        elif node.tag == f"{W}tab":
+            parts.append("\t")
+        elif node.tag in (f"{W}br", f"{W}cr"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def docx_paragraph(paragraph, styles):
+    text = docx_text(paragraph)
+    if not text:
+        return None
+    properties = paragraph.find(f"{W}pPr")
+    if properties is not None:
+        heading_styles, list_styles = styles
+        outline = properties.find(f"{W}outlineLvl")
+        style = properties.find(f"{W}pStyle")
+        style_id = style.get(f"{W}val") if style is not None else None
+        level = None
+        if outline is not None and outline.get(f"{W}val", "").isdigit():
+            level = int(outline.get(f"{W}val")) + 1
+        elif style_id is not None:
+            level = heading_styles.get(style_id)
+        if level:
+            return {"type": "heading", "level": min(level, 6), "text": text}
+        numbering = properties.find(f"{W}numPr")
+        if numbering is not None:
+            indent = numbering.find(f"{W}ilvl")
+            level = int(indent.get(f"{W}val", "0")) if indent is not None else list_styles.get(style_id, 0)
+            return {"type": "list_item", "level": level, "text": text}
+        if style_id in list_styles:
+            return {"type": "list_item", "level": list_styles[style_id], "text": text}
+    return {"type": "paragraph", "text": text}
+
+
+def docx_table(table):
+    rows = []
+    for row in table.iter(f"{W}tr"):
+        cells = [" ".join(filter(None, (docx_text(p) for p in cell.iter(f"{W}p"))))
+                 for cell in row.findall(f"{W}tc")]
+        if any(cells):
+            rows.append(cells)
+    return {"type": "table", "rows": rows} if rows else None
+
+
+def docx_blocks(archive):
+    styles = docx_styles(archive)
+    body = read_xml(archive, "word/document.xml").find(f"{W}body")
+    blocks = []
+
+    def walk(container):
+        for child in container:
+            if child.tag == f"{W}p":
+                blocks.append(docx_paragraph(child, styles))
+            elif child.tag == f"{W}tbl":
+                blocks.append(docx_table(child))
+            elif child.tag == f"{W}sdt":
+                # Content controls (tables of contents, cover pages...)
+                content = child.find(f"{W}sdtContent")
+                if content is not None:
+                    walk(content)
+
+    if body is not None:
+        walk(body)
+    return [block for block in blocks if block]
+
+
+def pptx_blocks(archive):
+    presentation = "ppt/presentation.xml"
+    targets = relationships(archive, presentation)
+    slide_ids = read_xml(archive, presentation).find(f"{P}sldIdLst")
+    slides = [targets[slide.get(f"{R}id")] for slide in (slide_ids if slide_ids is not None else [])]
+
+    blocks = []
+    for number, slide_path in enumerate(slides, 1):
+        title, content = None, []
+        for shape in read_xml(archive, slide_path).iter():
+            if shape.tag == f"{P}sp":
+                placeholder = shape.find(f"{P}nvSpPr/{P}nvPr/{P}ph")
+                is_title = placeholder is not None and placeholder.get("type") in ("title", "ctrTitle")
+                paragraphs = []
+                for paragraph in shape.iter(f"{A}p"):
+                    text = "".join(t.text or "" for t in paragraph.iter(f"{A}t")).strip()
+                    if text:
+                        properties = paragraph.find(f"{A}pPr")
+                        level = int(properties.get("lvl", "0")) if properties is not None else 0
+                        paragraphs.append((level, text))
+                if is_title and title is None:
+                    title = " ".join(text for _, text in paragraphs)
+                else:
+                    content.extend({"type": "list_item", "level": level, "text": text}
+                                   for level, text in paragraphs)
+            elif shape.tag == f"{A}tbl":
+                rows = [[" ".join(t.text or "" for t in cell.iter(f"{A}t")).strip()
+                         for cell in row.findall(f"{A}tc")]
+                        for row in shape.findall(f"{A}tr")]
+                rows = [row for row in rows if any(row)]
+                if rows:
+                    content.append({"type": "table", "rows": rows})
+        heading = f"Slide {number}: {title}" if title else f"Slide {number}"
+        blocks.append({"type": "heading", "level": 2, "text": heading})
+        blocks.extend(content)
+    return blocks
+
+
+def column_index(reference):
+    """'C12' -> 2"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def xlsx_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    return ["".join(t.text or "" for t in item.iter(f"{S}t"))
+            for item in read_xml(archive, "xl/sharedStrings.xml").iter(f"{S}si")]
+
+
+def xlsx_rows(archive, sheet_path, shared_strings):
+    """Rows of a worksheet as lists of strings (streamed with iterparse)"""
+    with archive.open(sheet_path) as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag != f"{S}row":
+                continue
+            cells = {}
+            for cell in element.iter(f"{S}c"):
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter(f"{S}t"))
+                else:
+                    raw = cell.find(f"{S}v")
+                    value = raw.text if raw is not None and raw.text is not None else ""
+                    if kind == "s" and value:
+                        value = shared_strings[int(value)]
+                    elif kind == "b" and value:
+                        value = "TRUE" if value == "1" else "FALSE"
+                if value != "":
+                    cells[column_index(cell.get("r", "A"))
+                          if cell.get("r") else len(cells)] = value.strip()
+            element.clear()
+            if cells:
+                yield [cells.get(index, "") for index in range(max(cells) + 1)]
+
+
+def xlsx_blocks(archive):
+    workbook = "xl/workbook.xml"
+    targets = relationships(archive, workbook)
+    shared_strings = xlsx_shared_strings(archive)
+    blocks = []
+    for sheet in read_xml(archive, workbook).iter(f"{S}sheet"):
+        path = targets.get(sheet.get(f"{R}id"))
+        if path is None or path not in archive.namelist():
+            continue
+        blocks.append({"type": "heading", "level": 2, "text": sheet.get("name", "Sheet")})
+        rows, skipped = [], 0
+        for row in xlsx_rows(archive, path, shared_strings):
+            if len(rows) < MAX_SHEET_ROWS:
+                rows.append(row)
+            else:
+                skipped += 1
+        if rows:
+            blocks.append({"type": "table", "rows": rows})
+        if skipped:
+            blocks.append({"type": "paragraph", "text": f"({skipped} more rows not extracted)"})
+    return blocks
+
+
+# ===================================================================
+# ODF
+# ===================================================================
+def odf_text(element):
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag == f"{TEXT}s":
+            parts.append(" " * int(child.get(f"{TEXT}c", "1")))
+        elif child.tag == f"{TEXT}tab":
+            parts.append("\t")
+        elif child.tag == f"{TEXT}line-break":
+            parts.append("\n")
+        elif child.tag not in (f"{TEXT}note", f"{OFFICE}annotation"):
+            parts.append(odf_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def odf_table(table):
+    rows = []
+    for row in table.iter(f"{TABLE}table-row"):
+        cells = []
+        for cell in row:
+            if cell.tag not in (f"{TABLE}table-cell", f"{TABLE}covered-table-cell"):
+                continue
+            text = " ".join(odf_text(p).strip() for p in cell.iter(f"{TEXT}p")).strip()
+            # Spreadsheets repeat empty cells up to the last column (16384)
+            repeat = int(cell.get(f"{TABLE}number-columns-repeated", "1"))
+            cells.extend([text] * (min(repeat, 256) if text else repeat))
+        while cells and not cells[-1]:
+            cells.pop()
+        if cells:
+            rows.append(cells)
+        if len(rows) >= MAX_SHEET_ROWS:
+            break
+    return {"type": "table", "rows": rows} if rows else None
+
+
+def odf_walk(container, blocks, list_level=-1):
+    for child in container:
+        if child.tag == f"{TEXT}h":
+            text = odf_text(child).strip()
+            if text:
+                level = int(child.get(f"{TEXT}outline-level", "1"))
+                blocks.append({"type": "heading", "level": min(level, 6), "text": text})
+        elif child.tag == f"{TEXT}p":
+            text = odf_text(child).strip()
+            if text:
+                if list_level >= 0:
+                    blocks.append({"type": "list_item", "level": list_level, "text": text})
+                else:
+                    blocks.append({"type": "paragraph", "text": text})
+        elif child.tag == f"{TEXT}list":
+            odf_walk(child, blocks, list_level + 1)
+        elif child.tag == f"{TABLE}table":
+            if child.get(f"{TABLE}name") and container.tag == f"{OFFICE}spreadsheet":
+                blocks.append({"type": "heading", "level": 2, "text": child.get(f"{TABLE}name")})
+            table = odf_table(child)
+            if table:
+                blocks.append(table)
+        elif child.tag in (f"{TEXT}list-item", f"{TEXT}list-header", f"{TEXT}section",
+                           f"{DRAW}frame", f"{DRAW}text-box"):
+            odf_walk(child, blocks, list_level)
+
+
+def odf_blocks(archive):
+    body = read_xml(archive, "content.xml").find(f"{OFFICE}body")
+    blocks = []
+    if body is None:
+        return blocks
+    for document in body:
+        if document.tag == f"{OFFICE}presentation":
+            for number, page in enumerate(document.iter(f"{DRAW}page"), 1):
+                title, content = None, []
+                for frame in page.iter(f"{DRAW}frame"):
+                    if frame.get(f"{PRESENTATION}class") == "title" and title is None:
+                        title = " ".join(odf_text(p).strip() for p in frame.iter(f"{TEXT}p")).strip()
+                    else:
+                        odf_walk(frame, content)
+                heading = f"Slide {number}: {title}" if title else f"Slide {number}"
+                blocks.append({"type": "heading", "level": 2, "text": heading})
+                blocks.extend(content)
+        else:
+            odf_walk(document, blocks)
+    return blocks
+
+
+# ===================================================================
+# RENDERING
+# ===================================================================
+def render_text(blocks):
+    lines = []
+    previous = None
+    for block in blocks:
+        if block["type"] != "list_item" and previous == "list_item":
+            lines.append("")
+        previous = block["type"]
+        if block["type"] == "table":
+            lines.extend("\t".join(row) for row in block["rows"])
+            lines.append("")
+        elif block["type"] == "list_item":
+            lines.append(f"{'  ' * block['level']}- {block['text']}")
+        else:
+            lines.extend((block["text"], ""))
+    return "\n".join(lines).strip() + "\n"
+
+
+def markdown_cell(value):
+    return value.replace("|", "\\|").replace("\n", "<br>")
+
+
+def render_markdown(blocks):
+    lines = []
+    previous = None
+    for block in blocks:
+        if block["type"] != "list_item" and previous == "list_item":
+            lines.append("")
+        if block["type"] == "heading":
+            lines.extend((f"{'#' * block['level']} {block['text']}", ""))
+        elif block["type"] == "list_item":
+            lines.append(f"{'  ' * block['level']}- {block['text']}")
+        elif block["type"] == "table":
+            width = max(len(row) for row in block["rows"])
+            rows = [row + [""] * (width - len(row)) for row in block["rows"]]
+            lines.append("| " + " | ".join(markdown_cell(cell) for cell in rows[0]) + " |")
+            lines.append("|" + " --- |" * width)
+            lines.extend("| " + " | ".join(markdown_cell(cell) for cell in row) + " |" for row in rows[1:])
+            lines.append("")
+        else:
+            lines.extend((block["text"], ""))
+        previous = block["type"]
+    return "\n".join(lines).strip() + "\n"
+
+
+def extract(path, file_ext, output="text"):
+    """Text ("text") or Markdown ("markdown") of a document, see extract_blocks"""
+    blocks = extract_blocks(path, file_ext)
+    return render_markdown(blocks) if output == "markdown" else render_text(blocks)
@@ -0,0 +1,78 @@
+"""
+Page rasterization for document previews (PyMuPDF)
+
+Renders pages of a converted PDF to PNG or WebP images. Runs in the
+converter service's worker processes: rasterization is CPU-bound and
+would otherwise block the event loop.
+
+PyMuPDF is optional (the service runs without previews), WebP also needs
+Pillow.
+"""
+import importlib.util
+from pathlib import Path
+
+try:
+    import pymupdf
+except ImportError:  # previews disabled
+    pymupdf = None
+
+IMAGE_FORMATS = {"png": "image/png", "webp": "image/webp"}
+WEBP_QUALITY = 80
+
+
+class RenderError(Exception):
+    """The PDF could not be rendered"""
+
+
+def missing_dependency(image_format):
+    """Name of the package needed to render `image_format`, None if available"""
+    if pymupdf is None:
+        return "PyMuPDF"
+    if image_format == "webp" and importlib.util.find_spec("PIL") is None:
+        return "Pillow"
+    return None
+
+
+def parse_pages(spec, max_pages):
+    """
+    Page numbers of a selection like "1-3,5" (1-based, sorted, unique)
+    Raises ValueError for a malformed selection or more than max_pages pages
+    """
+    pages = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        if not first.isdigit() or not (last or first).isdigit():
+            raise ValueError(f"Invalid page range: {part.strip()}")
+        first, last = int(first), int(last or first)
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: {part.strip()}")
+        if last - first + 1 + len(pages) > max_pages:
+            raise ValueError(f"Too many pages (max {max_pages})")
+        pages.update(range(first, last + 1))
+    return sorted(pages)
+
+
+def render_pages(pdf_path, out_dir, pages, image_format="png", width=256):
+    """
+    Render `pages` (1-based) of a PDF, `width` pixels wide
+    Pages past the end of the document are skipped
+    Returns: (page count, {page: image path})
+    """
+    try:
+        with pymupdf.open(pdf_path) as document:
+            rendered = {}
+            for number in pages:
+                if number > document.page_count:
+                    continue
+                page = document[number - 1]
+                zoom = width / page.rect.width
+                pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+                path = Path(out_dir) / f"page-{number:04d}.{image_format}"
+                if image_format == "webp":
+                    pixmap.pil_save(path, format="WEBP", quality=WEBP_QUALITY)
+                else:
+                    pixmap.save(path)
+                rendered[number] = str(path)
+            return document.page_count, rendered
+    except Exception as e:  # MuPDF errors do not all pickle back to the service
+        raise RenderError(f"{type(e).__name__}: {e}")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mode batch multi-jobs vs chemin mono-job
+
+Transcrit le même lot de fichiers courts une fois job par job
+(run_transcription) puis en une seule passe (transcribe_batch),
+et compare le débit.
+
+Usage:
+    python bench_batching.py notes/*.ogg --batch-jobs 8 --output batching.json
+"""
+import argparse
+import time
+import uuid
+
+from bench_common import (
+    DEFAULT_WORKER, audio_seconds, cleanup_copies, load_worker, stage_copies, write_results
+)
+
+
+def run_single(worker, audio_files):
+    temp_dir, copies = stage_copies(audio_files)
+    try:
+        started = time.perf_counter()
+        for audio_path in copies:
+            worker.run_transcription(str(uuid.uuid4()), audio_path, worker.DEFAULT_MODEL,
+                                     worker.DEFAULT_LANGUAGE, False)
+        return time.perf_counter() - started
+    finally:
+        cleanup_copies(temp_dir)
+
+
+def run_batched(worker, audio_files, batch_jobs):
+    temp_dir, copies = stage_copies(audio_files)
+    try:
+        started = time.perf_counter()
+        for offset in range(0, len(copies), batch_jobs):
+            entries = [
+                {"job_id": str(uuid.uuid4()), "audio_path": audio_path, "diarize": False}
+                for audio_path in copies[offset:offset + batch_jobs]
+            ]
+            outcomes = worker.transcribe_batch(entries)
+            failures = [o for o in outcomes.values() if isinstance(o, Exception)]
+            if failures:
+                raise failures[0]
+        return time.perf_counter() - started
+    finally:
+        cleanup_copies(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_files", nargs="+", help="Fichiers audio courts (notes vocales)")
+    parser.add_argument("--worker", default=str(DEFAULT_WORKER), help="Fichier worker à évaluer")
+    parser.add_argument("--batch-jobs", type=int, default=8, help="Jobs par batch")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    worker = load_worker(args.worker)
+    worker.BATCH_MAX_JOBS = args.batch_jobs
+
+    # Warm-up: modèles ASR + alignement chargés avant toute mesure
+    worker.get_model(worker.DEFAULT_MODEL)
+    worker.get_align_model(worker.DEFAULT_LANGUAGE)
+
+    total_audio = sum(audio_seconds(worker, f) for f in args.audio_files)
+    single_wall = run_single(worker, args.audio_files)
+    batched_wall = run_batched(worker, args.audio_files, args.batch_jobs)
+
+    results = {
+        "worker": args.worker,
+        "jobs": len(args.audio_files),
+        "audio_seconds": round(total_audio, 2),
+        "batch_jobs": args.batch_jobs,
+        "batch_size": worker.BATCH_SIZE,
+    }
+    for mode, wall in (("single", single_wall), ("batched", batched_wall)):
+        results[mode] = {
+            "wall_seconds": round(wall, 2),
+            "jobs_per_minute": round(len(args.audio_files) / wall * 60, 2),
+            "rtf": round(wall / total_audio, 4) if total_audio else None,
+        }
+    results["speedup"] = round(single_wall / batched_wall, 2) if batched_wall else None
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
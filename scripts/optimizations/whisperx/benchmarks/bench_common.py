@@ -0,0 +1,119 @@
+"""
+Outils partagés par les benchmarks du worker WhisperX
+"""
+import importlib.util
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+WORKER_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_WORKER = WORKER_DIR / "worker.optimized.py"
+
+
+def load_worker(path=DEFAULT_WORKER, fake_redis=True):
+    """
+    Importe un fichier worker (worker.optimized.py, worker.py...) comme module
+
+    Avec fake_redis, la connexion Redis du worker est remplacée par fakeredis
+    s'il est installé; sinon REDIS_URL doit pointer vers un Redis local.
+    """
+    path = Path(path).resolve()
+    spec = importlib.util.spec_from_file_location("whisperx_worker", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["whisperx_worker"] = module
+    spec.loader.exec_module(module)
+
+    if fake_redis:
+        try:
+            import fakeredis
+            module.redis_conn = fakeredis.FakeRedis()
+        except ImportError:
+            print(f"⚠️  fakeredis non installé, utilisation de {module.REDIS_URL}", file=sys.stderr)
+    return module
+
+
+def run_isolated(func, *args):
+    """
+    Exécute func(*args) dans un processus neuf (spawn): deux fichiers worker
+    ne peuvent pas être importés dans un même processus, leurs métriques
+    Prometheus s'enregistreraient deux fois
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def stage_copies(audio_files, prefix="bench-"):
+    """
+    Copie les fichiers audio dans un répertoire temporaire:
+    le worker supprime l'audio à la fin de chaque job
+    """
+    temp_dir = tempfile.mkdtemp(prefix=prefix)
+    copies = []
+    for index, audio_file in enumerate(audio_files):
+        target = Path(temp_dir) / f"{index:04d}-{Path(audio_file).name}"
+        shutil.copyfile(audio_file, target)
+        copies.append(str(target))
+    return temp_dir, copies
+
+
+def cleanup_copies(temp_dir):
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def audio_seconds(worker, audio_file):
+    """
+    Durée d'un fichier audio en secondes (décodage whisperx)
+    """
+    return len(worker.whisperx.load_audio(str(audio_file))) / worker.SAMPLE_RATE
+
+
+def peak_rss_mb():
+    """
+    Pic de RSS du processus courant (VmHWM) en MB
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def reset_peak_rss():
+    """
+    Remet à zéro le pic de RSS (VmHWM) du processus courant, pour mesurer
+    le pic d'un seul job (Linux >= 4.0)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def write_results(results, output):
+    """
+    Écrit les résultats en JSON (stdout si output est None)
+    """
+    payload = json.dumps(results, indent=2, ensure_ascii=False, sort_keys=True)
+    if output:
+        Path(output).write_text(payload + "\n", encoding="utf-8")
+        print(f"✅ Résultats écrits dans {output}")
+    else:
+        print(payload)
+
+
+def available_cores_hint():
+    """
+    Nombre de cœurs utilisables par les workers lancés pour le benchmark
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: allers-retours Redis par job
+
+Exécute un job par le chemin mono-job (run_transcription) avec une
+connexion fakeredis qui compte les commandes et les allers-retours
+(un pipeline exécuté = un aller-retour). Avec --baseline, le même job est
+rejoué sur un autre fichier worker pour comparer (ex: version précédente
+extraite avec `git show <commit>:scripts/optimizations/whisperx/worker.optimized.py`).
+
+Usage:
+    python bench_redis_ops.py note.ogg --baseline /tmp/worker.before.py --output redis_ops.json
+"""
+import argparse
+import uuid
+
+import fakeredis
+
+from bench_common import (
+    DEFAULT_WORKER, cleanup_copies, load_worker, run_isolated, stage_copies, write_results
+)
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """
+    FakeRedis qui compte les allers-retours et les commandes envoyées
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+        self.commands = 0
+
+    def execute_command(self, *args, **options):
+        self.round_trips += 1
+        self.commands += 1
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        def counted_execute(raise_on_error=True):
+            if pipe.command_stack:
+                self.round_trips += 1
+                self.commands += len(pipe.command_stack)
+            return execute(raise_on_error)
+
+        pipe.execute = counted_execute
+        return pipe
+
+
+def count_job_ops(worker_path, audio_file, diarize):
+    worker = load_worker(worker_path, fake_redis=False)
+    # Warm-up hors mesure: chargement des modèles
+    worker.get_model(worker.DEFAULT_MODEL)
+    worker.get_align_model(worker.DEFAULT_LANGUAGE)
+
+    conn = worker.redis_conn = CountingRedis()
+    temp_dir, copies = stage_copies([audio_file])
+    try:
+        worker.run_transcription(str(uuid.uuid4()), copies[0], worker.DEFAULT_MODEL,
+                                 worker.DEFAULT_LANGUAGE, diarize)
+    finally:
+        cleanup_copies(temp_dir)
+    return {"round_trips": conn.round_trips, "commands": conn.commands}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_file", help="Fichier audio d'un job")
+    parser.add_argument("--worker", default=str(DEFAULT_WORKER), help="Fichier worker à évaluer")
+    parser.add_argument("--baseline", help="Fichier worker de référence")
+    parser.add_argument("--diarize", action="store_true", help="Activer la diarization (HF_TOKEN requis)")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    results = {"worker": args.worker, "diarize": args.diarize}
+    results["ops"] = run_isolated(count_job_ops, args.worker, args.audio_file, args.diarize)
+    if args.baseline:
+        results["baseline"] = args.baseline
+        results["baseline_ops"] = run_isolated(count_job_ops, args.baseline, args.audio_file, args.diarize)
+        results["round_trips_saved"] = (
+            results["baseline_ops"]["round_trips"] - results["ops"]["round_trips"]
+        )
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
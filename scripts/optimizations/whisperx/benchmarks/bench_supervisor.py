@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark: superviseur (1 processus, N workers, modèles partagés)
+vs N workers indépendants (équivalent de N conteneurs)
+
+Lance les workers comme en production (python worker.py) contre un Redis
+réel, soumet la même charge aux deux configurations et mesure le débit
+(jobs/heure) et la mémoire (RSS et PSS cumulés des processus workers).
+
+Usage:
+    REDIS_URL=redis://localhost:6379/15 \\
+        python bench_supervisor.py fixtures/*.wav --concurrency 4 --jobs 40
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import redis
+from rq import Queue, Worker
+
+from bench_common import DEFAULT_WORKER, available_cores_hint, cleanup_copies, stage_copies, write_results
+
+
+def read_memory_kb(pid):
+    """
+    Retourne (rss_kb, pss_kb) d'un processus via /proc/<pid>/smaps_rollup
+    """
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def start_workers(worker_dir, redis_url, processes, concurrency, threads):
+    env = dict(os.environ, REDIS_URL=redis_url, WORKER_CONCURRENCY=str(concurrency),
+               ASR_THREADS=str(threads), PYTHONUNBUFFERED="1")
+    return [
+        subprocess.Popen([sys.executable, "worker.py"], cwd=worker_dir, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(processes)
+    ]
+
+
+def wait_for_workers(conn, expected, timeout):
+    deadline = time.monotonic() + timeout
+    while Worker.count(connection=conn) < expected:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Workers not ready after {timeout}s")
+        time.sleep(1)
+
+
+def run_mode(mode, args, worker_dir, conn):
+    cores = available_cores_hint()
+    if mode == "supervisor":
+        processes, concurrency = 1, args.concurrency
+    else:
+        processes, concurrency = args.concurrency, 1
+    threads = max(1, cores // args.concurrency)
+
+    conn.flushdb()
+    workers = start_workers(worker_dir, args.redis_url, processes, concurrency, threads)
+    try:
+        wait_for_workers(conn, args.concurrency, args.ready_timeout)
+
+        audio_files = [args.audio_files[i % len(args.audio_files)] for i in range(args.jobs)]
+        temp_dir, copies = stage_copies(audio_files, prefix=f"bench-{mode}-")
+        queue = Queue("transcription", connection=conn)
+        job_ids = []
+
+        started = time.perf_counter()
+        for audio_path in copies:
+            job_id = str(uuid.uuid4())
+            conn.hset(f"job:{job_id}", mapping={"status": "queued"})
+            # enqueue_call: `job_id` est un argument réservé de Queue.enqueue
+            queue.enqueue_call("worker.process_transcription", args=(job_id, audio_path), timeout=3600)
+            job_ids.append(job_id)
+
+        peak_rss = peak_pss = 0
+        pending = set(job_ids)
+        failed = 0
+        while pending:
+            rss, pss = map(sum, zip(*(read_memory_kb(p.pid) for p in workers)))
+            peak_rss, peak_pss = max(peak_rss, rss), max(peak_pss, pss)
+            for job_id in list(pending):
+                status = conn.hget(f"job:{job_id}", "status")
+                if status in (b"completed", b"failed"):
+                    pending.discard(job_id)
+                    failed += status == b"failed"
+            time.sleep(0.5)
+        wall = time.perf_counter() - started
+        cleanup_copies(temp_dir)
+    finally:
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.wait()
+
+    return {
+        "processes": processes,
+        "workers_per_process": concurrency,
+        "threads_per_worker": threads,
+        "jobs": args.jobs,
+        "failed": failed,
+        "wall_seconds": round(wall, 2),
+        "jobs_per_hour": round(args.jobs / wall * 3600, 1),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "peak_pss_mb": round(peak_pss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_files", nargs="+", help="Fichiers audio de la charge")
+    parser.add_argument("--worker", default=str(DEFAULT_WORKER), help="Fichier worker à évaluer")
+    parser.add_argument("--concurrency", type=int, default=2, help="Nombre de workers (N)")
+    parser.add_argument("--jobs", type=int, default=20, help="Nombre de jobs soumis")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"),
+                        help="Redis dédié au benchmark (la base est vidée)")
+    parser.add_argument("--ready-timeout", type=int, default=900, help="Attente du pré-chargement (s)")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    # Le worker est déployé sous le nom worker.py: les jobs le référencent ainsi
+    worker_dir = tempfile.mkdtemp(prefix="bench-worker-")
+    shutil.copyfile(args.worker, Path(worker_dir) / "worker.py")
+    conn = redis.from_url(args.redis_url)
+
+    try:
+        results = {
+            "worker": args.worker,
+            "concurrency": args.concurrency,
+            "supervisor": run_mode("supervisor", args, worker_dir, conn),
+            "independent": run_mode("independent", args, worker_dir, conn),
+        }
+    finally:
+        shutil.rmtree(worker_dir, ignore_errors=True)
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pré-découpage VAD des silences vs audio complet
+
+Transcrit chaque fichier deux fois par le chemin mono-job
+(run_transcription), VAD_TRIM désactivé puis activé, et compare le RTF
+ainsi que la part de silence retirée.
+
+Usage:
+    python bench_vad.py reunions/*.wav --output vad.json
+"""
+import argparse
+import time
+import uuid
+
+from bench_common import (
+    DEFAULT_WORKER, audio_seconds, cleanup_copies, load_worker, stage_copies, write_results
+)
+
+
+def run_pass(worker, audio_files, vad_trim):
+    worker.VAD_TRIM = vad_trim
+    temp_dir, copies = stage_copies(audio_files)
+    skipped = 0.0
+    try:
+        started = time.perf_counter()
+        for audio_path in copies:
+            metrics = worker.JobMetrics(str(uuid.uuid4()))
+            worker.run_transcription(metrics.job_id, audio_path, worker.DEFAULT_MODEL,
+                                     worker.DEFAULT_LANGUAGE, False, metrics)
+            skipped += metrics.vad_skipped
+        return time.perf_counter() - started, skipped
+    finally:
+        cleanup_copies(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio_files", nargs="+", help="Enregistrements avec des silences")
+    parser.add_argument("--worker", default=str(DEFAULT_WORKER), help="Fichier worker à évaluer")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    worker = load_worker(args.worker)
+
+    # Warm-up: modèles ASR + alignement chargés avant toute mesure
+    worker.get_model(worker.DEFAULT_MODEL)
+    worker.get_align_model(worker.DEFAULT_LANGUAGE)
+
+    total_audio = sum(audio_seconds(worker, f) for f in args.audio_files)
+    results = {
+        "worker": args.worker,
+        "jobs": len(args.audio_files),
+        "audio_seconds": round(total_audio, 2),
+    }
+    for mode, vad_trim in (("full", False), ("vad", True)):
+        wall, skipped = run_pass(worker, args.audio_files, vad_trim)
+        results[mode] = {
+            "wall_seconds": round(wall, 2),
+            "rtf": round(wall / total_audio, 4) if total_audio else None,
+            "skipped_seconds": round(skipped, 2),
+            "skipped_fraction": round(skipped / total_audio, 4) if total_audio else None,
+        }
+    if results["vad"]["wall_seconds"]:
+        results["speedup"] = round(results["full"]["wall_seconds"] / results["vad"]["wall_seconds"], 2)
+
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
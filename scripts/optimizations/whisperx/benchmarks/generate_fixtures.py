@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Génère le corpus du benchmark décrit dans fixtures/manifest.json
+
+Les clips versionnés (fixtures/clips/: phrases en français, WAV 16 kHz mono,
+avec leur texte) sont assemblés en fixtures courtes, moyennes et longues:
+tours de clips mélangés (générateur initialisé par la graine du manifest)
+séparés par des silences, jusqu'à la durée demandée. La transcription de
+référence est le texte des clips dans le même ordre.
+
+Uniquement la bibliothèque standard: les mêmes clips et le même manifest
+donnent les mêmes octets, vérifiés contre les sha256 du manifest.
+Un clip ou une fixture qui ne correspond pas est une erreur (FixtureError).
+
+Usage:
+    python generate_fixtures.py
+    python generate_fixtures.py --force --category short
+"""
+import argparse
+import hashlib
+import json
+import random
+import wave
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_MANIFEST = FIXTURES_DIR / "manifest.json"
+SAMPLE_RATE = 16000
+
+
+class FixtureError(Exception):
+    """Clip ou fixture absent, ou différent de son sha256"""
+
+
+def sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def check_sha256(path, expected):
+    if not Path(path).exists():
+        raise FixtureError(f"Missing fixture file: {path}")
+    digest = sha256(path)
+    if digest != expected:
+        raise FixtureError(f"sha256 mismatch for {path}: {digest} (expected {expected})")
+
+
+def read_clip(base, clip):
+    """
+    Échantillons PCM 16 bits et texte d'un clip (format vérifié)
+    """
+    check_sha256(base / clip["audio"], clip["sha256"])
+    check_sha256(base / clip["text"], clip["text_sha256"])
+    with wave.open(str(base / clip["audio"]), "rb") as audio:
+        if (audio.getnchannels(), audio.getsampwidth(), audio.getframerate()) != (1, 2, SAMPLE_RATE):
+            raise FixtureError(f"{clip['audio']}: expected 16 kHz mono 16-bit PCM")
+        frames = audio.readframes(audio.getnframes())
+    return frames, (base / clip["text"]).read_text(encoding="utf-8").strip()
+
+
+def plan_fixture(fixture, clips, rng):
+    """
+    Ordre des clips d'une fixture: tours mélangés jusqu'à `seconds`
+    (au moins un tour)
+    """
+    gap = fixture["gap_seconds"]
+    order, seconds = [], 0.0
+    while not order or seconds < fixture["seconds"]:
+        tour = list(fixture["clips"])
+        rng.shuffle(tour)
+        for clip_id in tour:
+            order.append(clip_id)
+            seconds += len(clips[clip_id][0]) / (2 * SAMPLE_RATE) + gap
+    return order
+
+
+def build_fixture(base, fixture, clips, rng):
+    """
+    Écrit l'audio (WAV) et la référence (texte) d'une fixture
+    """
+    order = plan_fixture(fixture, clips, rng)
+    silence = b"\x00\x00" * int(fixture["gap_seconds"] * SAMPLE_RATE)
+    audio_path, reference_path = base / fixture["audio"], base / fixture["reference"]
+    audio_path.parent.mkdir(parents=True, exist_ok=True)
+    reference_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with wave.open(str(audio_path), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(SAMPLE_RATE)
+        for index, clip_id in enumerate(order):
+            if index:
+                audio.writeframes(silence)
+            audio.writeframes(clips[clip_id][0])
+    reference_path.write_text("\n".join(clips[clip_id][1] for clip_id in order) + "\n", encoding="utf-8")
+
+
+def ensure_fixtures(manifest_path=DEFAULT_MANIFEST, categories=None, force=False):
+    """
+    Génère les fixtures du manifest absentes (toutes avec force), puis
+    vérifie leurs sha256
+    Returns: list de (fixture, chemin audio, chemin référence)
+    Raises: FixtureError
+    """
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    base = Path(manifest_path).resolve().parent
+    clips = {clip["id"]: read_clip(base, clip) for clip in manifest["clips"]}
+
+    fixtures = []
+    for index, fixture in enumerate(manifest["fixtures"]):
+        if categories and fixture["category"] not in categories:
+            continue
+        audio_path, reference_path = base / fixture["audio"], base / fixture["reference"]
+        if force or not audio_path.exists() or not reference_path.exists():
+            # Un générateur par fixture: en ajouter une ne change pas les autres
+            build_fixture(base, fixture, clips, random.Random(manifest["seed"] + index))
+            print(f"🎙️  Generated {audio_path.name} ({audio_path.stat().st_size / 1024 ** 2:.1f} MB)")
+        check_sha256(audio_path, fixture["sha256"])
+        check_sha256(reference_path, fixture["reference_sha256"])
+        fixtures.append((fixture, audio_path, reference_path))
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Manifest des fixtures")
+    parser.add_argument("--category", action="append", choices=["short", "medium", "long"],
+                        help="Limiter à une catégorie (répétable)")
+    parser.add_argument("--force", action="store_true", help="Régénérer les fixtures existantes")
+    args = parser.parse_args()
+    try:
+        ensure_fixtures(args.manifest, args.category, args.force)
+    except FixtureError as e:
+        parser.exit(2, f"❌ {e}\n")
+
+
+if __name__ == "__main__":
+    main()
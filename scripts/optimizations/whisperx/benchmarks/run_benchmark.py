@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Benchmark de référence: débit et qualité d'une ou plusieurs variantes du worker
+
+Exécute process_transcription sur le corpus de fixtures/manifest.json
+(clips courts, moyens, longs, générés au premier lancement et vérifiés par
+sha256, voir generate_fixtures.py) avec fakeredis (ou un Redis local via
+--redis-url) et mesure par fixture: RTF, temps par étape (job:{id}:metrics,
+si le worker les écrit), pic de RSS et WER contre la transcription de
+référence. Le JSON produit est stable (clés triées) pour être comparé d'un
+run à l'autre; --baseline signale les régressions et sort en code 1.
+
+Chaque worker tourne dans son propre processus.
+
+Usage:
+    python run_benchmark.py --output results.json
+    python run_benchmark.py --worker ../worker.optimized.py --worker /tmp/app-worker.py
+    python run_benchmark.py --category short --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import unicodedata
+import uuid
+from pathlib import Path
+
+from bench_common import (
+    DEFAULT_WORKER, audio_seconds, available_cores_hint, cleanup_copies, load_worker,
+    peak_rss_mb, reset_peak_rss, run_isolated, stage_copies, write_results
+)
+from generate_fixtures import DEFAULT_MANIFEST, FixtureError, ensure_fixtures
+
+# Seuils de régression par défaut pour --baseline
+RTF_TOLERANCE = 0.10  # +10 % de RTF
+WER_TOLERANCE = 0.01  # +1 point de WER
+
+
+# ===================================================================
+# WER
+# ===================================================================
+def normalize_words(text):
+    """
+    Normalisation pour le WER: minuscules, apostrophes et ponctuation
+    retirées (l'homme -> l homme), espaces compactés
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[’'`]", " ", text)
+    text = re.sub(r"[^\w\s-]|(?<!\w)-|-(?!\w)", " ", text)
+    return text.split()
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    WER = (substitutions + suppressions + insertions) / mots de référence
+    Returns: tuple (wer, erreurs, mots de référence)
+    """
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return (0.0 if not hyp else 1.0), len(hyp), 0
+
+    # Distance d'édition sur les mots, deux lignes en mémoire
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            )
+        previous = current
+    errors = previous[-1]
+    return errors / len(ref), errors, len(ref)
+
+
+# ===================================================================
+# FIXTURES
+# ===================================================================
+def load_manifest(path, categories=None):
+    """
+    Fixtures du manifest, filtrées par catégorie, avec chemins absolus
+    Les fixtures absentes sont générées; un sha256 différent est une erreur
+    Raises: FixtureError
+    """
+    return [
+        dict(fixture, audio=str(audio), reference=str(reference))
+        for fixture, audio, reference in ensure_fixtures(path, categories)
+    ]
+
+
+def read_transcript(worker, job_id):
+    """
+    Texte transcrit d'un job, quel que soit le format de stockage du worker
+    """
+    if hasattr(worker, "load_result"):
+        result = worker.load_result(job_id)
+    else:
+        raw = worker.redis_conn.hget(f"job:{job_id}", "result")
+        result = json.loads(raw) if raw else None
+    if result is None:
+        return None
+    return " ".join(segment.get("text", "").strip() for segment in result.get("segments", []))
+
+
+def read_stage_metrics(worker, job_id):
+    """
+    Temps par étape écrits par le worker (job:{id}:metrics), vide sinon
+    """
+    raw = worker.redis_conn.hgetall(f"job:{job_id}:metrics")
+    stages = {}
+    for key, value in raw.items():
+        key = key.decode()
+        if key.endswith("_wall_s") and key != "total_wall_s":
+            stages[key[:-len("_wall_s")]] = float(value)
+    return stages
+
+
+# ===================================================================
+# EXÉCUTION
+# ===================================================================
+def run_fixture(worker, fixture):
+    temp_dir, copies = stage_copies([fixture["audio"]])
+    job_id = str(uuid.uuid4())
+    try:
+        duration = audio_seconds(worker, fixture["audio"])
+        reset_peak_rss()
+        started = time.perf_counter()
+        worker.process_transcription(job_id, copies[0])
+        wall = time.perf_counter() - started
+    finally:
+        cleanup_copies(temp_dir)
+
+    status = worker.redis_conn.hget(f"job:{job_id}", "status")
+    measure = {
+        "category": fixture["category"],
+        "status": status.decode() if status else None,
+        "audio_seconds": round(duration, 2),
+        "wall_seconds": round(wall, 2),
+        "rtf": round(wall / duration, 4) if duration else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": {name: round(value, 3) for name, value in read_stage_metrics(worker, job_id).items()},
+    }
+
+    transcript = read_transcript(worker, job_id)
+    if transcript is not None:
+        reference = Path(fixture["reference"]).read_text(encoding="utf-8")
+        wer, errors, words = word_error_rate(reference, transcript)
+        measure.update(wer=round(wer, 4), word_errors=errors, reference_words=words)
+    return measure
+
+
+def benchmark_worker(worker_path, fixtures, repeat, redis_url):
+    """
+    Exécuté dans un processus dédié (run_isolated): un worker, tout le corpus
+    """
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+    worker = load_worker(worker_path, fake_redis=not redis_url)
+    # Mesurer le calcul, pas le cache de résultats
+    if hasattr(worker, "RESULT_CACHE_TTL"):
+        worker.RESULT_CACHE_TTL = 0
+    # Sans worker RQ, les shards enfants ne seraient jamais exécutés
+    if hasattr(worker, "SHARD_MIN_DURATION"):
+        worker.SHARD_MIN_DURATION = 0
+
+    started = time.perf_counter()
+    worker.get_model(worker.DEFAULT_MODEL)
+    if hasattr(worker, "get_align_model"):
+        worker.get_align_model(worker.DEFAULT_LANGUAGE)
+    warmup = time.perf_counter() - started
+
+    results = {}
+    for fixture in fixtures:
+        runs = [run_fixture(worker, fixture) for _ in range(repeat)]
+        # Run retenu: médiane du temps réel
+        runs.sort(key=lambda run: run["wall_seconds"])
+        results[fixture["id"]] = dict(runs[len(runs) // 2], runs=len(runs))
+    return {"warmup_seconds": round(warmup, 2), "fixtures": results}
+
+
+def summarize(fixture_results):
+    """
+    Moyennes par catégorie (RTF, WER, pic de RSS)
+    """
+    by_category = {}
+    for measure in fixture_results.values():
+        by_category.setdefault(measure["category"], []).append(measure)
+
+    summary = {}
+    for category, measures in by_category.items():
+        wers = [m["wer"] for m in measures if "wer" in m]
+        rtfs = [m["rtf"] for m in measures if m["rtf"] is not None]
+        summary[category] = {
+            "fixtures": len(measures),
+            "rtf_mean": round(sum(rtfs) / len(rtfs), 4) if rtfs else None,
+            "wer_mean": round(sum(wers) / len(wers), 4) if wers else None,
+            "peak_rss_mb_max": max(m["peak_rss_mb"] for m in measures),
+        }
+    return summary
+
+
+def find_regressions(results, baseline, rtf_tolerance, wer_tolerance):
+    """
+    Compare fixture par fixture avec un run précédent (même worker)
+    """
+    regressions = []
+    for worker_path, current in results["workers"].items():
+        previous = baseline.get("workers", {}).get(worker_path)
+        if previous is None:
+            continue
+        for fixture_id, measure in current["fixtures"].items():
+            before = previous["fixtures"].get(fixture_id)
+            if before is None:
+                continue
+            if before.get("rtf") and measure.get("rtf") and \
+                    measure["rtf"] > before["rtf"] * (1 + rtf_tolerance):
+                regressions.append(f"{worker_path} {fixture_id}: RTF {before['rtf']} -> {measure['rtf']}")
+            if "wer" in before and "wer" in measure and measure["wer"] > before["wer"] + wer_tolerance:
+                regressions.append(f"{worker_path} {fixture_id}: WER {before['wer']} -> {measure['wer']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="Manifest des fixtures")
+    parser.add_argument("--worker", action="append", help="Fichier worker à évaluer (répétable)")
+    parser.add_argument("--category", action="append", choices=["short", "medium", "long"],
+                        help="Limiter à une catégorie (répétable)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs par fixture (médiane retenue)")
+    parser.add_argument("--redis-url", help="Redis local au lieu de fakeredis")
+    parser.add_argument("--baseline", help="Résultats précédents: signale les régressions")
+    parser.add_argument("--rtf-tolerance", type=float, default=RTF_TOLERANCE)
+    parser.add_argument("--wer-tolerance", type=float, default=WER_TOLERANCE)
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    try:
+        fixtures = load_manifest(args.manifest, args.category)
+    except FixtureError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+
+    results = {
+        "manifest": args.manifest,
+        "environment": {
+            "python": platform.python_version(),
+            "cores": available_cores_hint(),
+            "redis": "local" if args.redis_url else "fakeredis",
+        },
+        "workers": {},
+    }
+    for worker_path in args.worker or [str(DEFAULT_WORKER)]:
+        measured = run_isolated(benchmark_worker, worker_path, fixtures, args.repeat, args.redis_url)
+        measured["summary"] = summarize(measured["fixtures"])
+        results["workers"][worker_path] = measured
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = find_regressions(results, baseline, args.rtf_tolerance, args.wer_tolerance)
+        results["regressions"] = regressions
+
+    write_results(results, args.output)
+    if regressions:
+        print("⚠️  Régressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Le prompt de vocabulaire doit passer par les options du pipeline whisperx:
+FasterWhisperPipeline.transcribe n'a pas d'argument initial_prompt
+
+Nécessite whisperx (ignoré sinon). Lancer depuis ce répertoire:
+    python -m pytest -q tests
+"""
+import dataclasses
+import inspect
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+asr = pytest.importorskip("whisperx.asr")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from bench_common import load_worker  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def worker():
+    return load_worker()
+
+
+def make_pipeline():
+    """FasterWhisperPipeline sans modèle chargé: seules les options comptent ici"""
+    options_type = asr.TranscriptionOptions
+    if dataclasses.is_dataclass(options_type):
+        options = options_type(**{field.name: None for field in dataclasses.fields(options_type)})
+    else:
+        options = options_type(*[None] * len(options_type._fields))
+    pipeline = object.__new__(asr.FasterWhisperPipeline)
+    pipeline.model = object()
+    pipeline.options = options
+    return pipeline
+
+
+def test_transcribe_options_bind_to_pipeline_signature(worker):
+    signature = inspect.signature(asr.FasterWhisperPipeline.transcribe)
+    signature.bind(make_pipeline(), np.zeros(16000, dtype=np.float32), **worker.build_transcribe_options("fr"))
+
+
+def test_prompt_is_applied_through_pipeline_options(worker, tmp_path, monkeypatch):
+    vocabulary_dir = tmp_path / "vocabularies"
+    vocabulary_dir.mkdir()
+    (vocabulary_dir / "client.txt").write_text("Kubernetes\nPostgreSQL\n", encoding="utf-8")
+    monkeypatch.setattr(worker, "VOCABULARY_DIR", vocabulary_dir)
+
+    pipeline = make_pipeline()
+    prompted = worker.prompted_model(pipeline, "client")
+
+    assert prompted.options.initial_prompt == "Vocabulaire technique: Kubernetes, PostgreSQL"
+    assert pipeline.options.initial_prompt is None  # pipeline partagé inchangé
+    assert prompted.model is pipeline.model  # modèle CTranslate2 partagé
+    assert worker.prompted_model(pipeline, "client") is prompted
+
+    # Rechargement à chaud: nouvelle copie avec le nouveau prompt
+    (vocabulary_dir / "client.txt").write_text("Terraform\n", encoding="utf-8")
+    worker.VOCABULARY_CACHE.clear()
+    assert worker.prompted_model(pipeline, "client").options.initial_prompt == "Vocabulaire technique: Terraform"
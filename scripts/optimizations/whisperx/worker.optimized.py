@@ -4,13 +4,46 @@ WhisperX Background Worker avec RQ - OPTIMISÉ
 Version optimisée: large-v3 français uniquement + custom vocabulary
 """
 import os
+import bisect
+import copy
+import ctypes
+import dataclasses
+import gc
 import json
+import hashlib
+import time
+import inspect
+import queue as stage_queue
+import random
+import re
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
 import whisperx
 import redis
-from rq import Worker, Queue
+from rq import SimpleWorker, Queue, get_current_job
+from rq.defaults import DEFAULT_RESULT_TTL
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+from rq.timeouts import TimerDeathPenalty
+from rq.utils import utcnow
+from rq.worker import WorkerStatus
 from pathlib import Path
 import logging
 
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:  # Monitoring optionnel (voir requirements.txt)
+    Counter = Gauge = Histogram = start_http_server = None
+
 # Configuration logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,69 +52,2426 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ===================================================================
-# CONFIGURATION OPTIMISÉE
+# CONFIGURATION OPTIMISÉE
+# ===================================================================
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
+DEVICE = 'cpu'
+COMPUTE_TYPE = 'int8'
+HF_TOKEN = os.getenv('HF_TOKEN', None)
+
+# MODÈLE OPTIMISÉ: large-v3 français uniquement
+DEFAULT_MODEL = "large-v3"
+DEFAULT_LANGUAGE = "fr"
+
+# whisperx décode tout l'audio en mono 16 kHz float32
+SAMPLE_RATE = 16000
+
+# Nombre de segments VAD envoyés ensemble au modèle CTranslate2
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '8'))
+
+
+def available_cores():
+    """
+    Nombre de cœurs réellement utilisables: affinité CPU, bornée par le
+    quota cgroup v2 (limite `cpus` de docker-compose) s'il existe
+    """
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+# Jobs traités en parallèle par ce processus (voir run_supervisor)
+WORKER_CONCURRENCY = max(1, int(os.getenv('WORKER_CONCURRENCY', '1')))
+# Mode pipeline: ASR et alignement de deux jobs différents en parallèle (run_pipeline)
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'no').lower() in ('1', 'yes', 'true')
+# Threads CTranslate2/torch par job: N jobs × threads = cœurs disponibles.
+# En pipeline, l'ASR garde 2/3 des cœurs et l'alignement le reste.
+ASR_THREADS = int(os.getenv('ASR_THREADS', '0')) or (
+    max(1, available_cores() * 2 // 3) if PIPELINE_MODE
+    else max(1, available_cores() // WORKER_CONCURRENCY)
+)
+
+# Custom vocabulary - Mots techniques/spécifiques
+# Jeu "default": CUSTOM_VOCABULARY_FILE. Jeux nommés (par client, par
+# domaine): VOCABULARY_DIR/{nom}.txt, choisis par job (argument `vocabulary`).
+CUSTOM_VOCABULARY_FILE = Path(os.getenv('CUSTOM_VOCABULARY_FILE', '/app/custom_vocabulary.txt'))
+VOCABULARY_DIR = Path(os.getenv('VOCABULARY_DIR', '/app/vocabularies'))
+DEFAULT_VOCABULARY = "default"
+VOCABULARY_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+def load_custom_vocabulary(path=CUSTOM_VOCABULARY_FILE):
+    """
+    Charge le vocabulaire personnalisé depuis le fichier
+    Returns: str - Prompt avec les mots personnalisés
+    """
+    if not path.exists():
+        logger.warning(f"Custom vocabulary file not found ({path}), using default")
+        return None
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            words = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+        if words:
+            # Créer un prompt pour guider Whisper
+            prompt = f"Vocabulaire technique: {', '.join(words[:50])}"  # Limiter à 50 mots
+            logger.info(f"Loaded {len(words)} custom words for vocabulary guidance ({path.name})")
+            return prompt
+        else:
+            logger.warning(f"Custom vocabulary file is empty ({path})")
+            return None
+    except Exception as e:
+        logger.error(f"Error loading custom vocabulary: {e}")
+        return None
+
+# Prompts compilés par fichier: chemin -> (mtime_ns, prompt)
+# Rechargés à chaud quand le fichier change, sans toucher au MODEL_CACHE
+VOCABULARY_CACHE = {}
+VOCABULARY_LOCK = threading.Lock()
+
+
+def vocabulary_path(name=None):
+    """
+    Fichier d'un jeu de vocabulaire (ValueError si le nom est invalide)
+    """
+    if not name or name == DEFAULT_VOCABULARY:
+        return CUSTOM_VOCABULARY_FILE
+    if not VOCABULARY_NAME.match(name):
+        raise ValueError(f"Invalid vocabulary set name: {name!r}")
+    return VOCABULARY_DIR / f"{name}.txt"
+
+
+def get_vocabulary_prompt(name=None):
+    """
+    Prompt du jeu de vocabulaire `name` (défaut si None)
+
+    Un stat() par appel: le fichier n'est relu que si son mtime a changé.
+    """
+    path = vocabulary_path(name)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with VOCABULARY_LOCK:
+        cached = VOCABULARY_CACHE.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        prompt = load_custom_vocabulary(path)
+        VOCABULARY_CACHE[path] = (mtime, prompt)
+    if cached is not None:
+        logger.info(f"Vocabulary '{name or DEFAULT_VOCABULARY}' reloaded")
+    return prompt
+
+# Charger le vocabulaire par défaut au démarrage
+get_vocabulary_prompt()
+
+
+# Connecter à Redis
+redis_conn = redis.from_url(REDIS_URL)
+
+# ===================================================================
+# CACHE LRU DES MODÈLES (ASR, ALIGNEMENT, DIARIZATION)
+# ===================================================================
+# Les jobs s'exécutent dans le processus du worker (SimpleWorker, voir
+# __main__): les modèles pré-chargés servent tous les jobs.
+#
+# Le VPS est partagé avec d'autres conteneurs: en plus des bornes par cache,
+# MODEL_MAX_RESIDENT_BYTES plafonne l'ensemble des modèles (éviction LRU
+# tous caches confondus) et MODEL_IDLE_UNLOAD_MINUTES décharge les modèles
+# quand le worker n'a plus de job depuis N minutes. Ils sont rechargés au
+# prochain job (voir warm_models).
+ASR_CACHE_MAX_ITEMS = int(os.getenv('ASR_CACHE_MAX_ITEMS', '1'))
+ASR_CACHE_MAX_BYTES = int(os.getenv('ASR_CACHE_MAX_BYTES', str(6 * 1024 ** 3)))
+ALIGN_CACHE_MAX_ITEMS = int(os.getenv('ALIGN_CACHE_MAX_ITEMS', '2'))
+ALIGN_CACHE_MAX_BYTES = int(os.getenv('ALIGN_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+DIARIZE_CACHE_MAX_ITEMS = int(os.getenv('DIARIZE_CACHE_MAX_ITEMS', '1'))
+DIARIZE_CACHE_MAX_BYTES = int(os.getenv('DIARIZE_CACHE_MAX_BYTES', str(1024 ** 3)))
+PRELOAD_DIARIZATION = os.getenv('PRELOAD_DIARIZATION', 'yes').lower() in ('1', 'yes', 'true')
+MODEL_MAX_RESIDENT_BYTES = int(os.getenv('MODEL_MAX_RESIDENT_BYTES', '0'))  # 0 = pas de budget global
+MODEL_IDLE_UNLOAD_MINUTES = float(os.getenv('MODEL_IDLE_UNLOAD_MINUTES', '0'))  # 0 = jamais
+# startup: chargement au démarrage; first_job: au premier job reçu (RAM libre tant que la queue est vide)
+MODEL_PRELOAD = os.getenv('MODEL_PRELOAD', 'startup')
+
+# Compteurs hit/miss agrégés pour tous les workers (plusieurs conteneurs)
+CACHE_STATS_KEY = "worker:model_cache:stats"
+
+
+def current_rss_bytes():
+    """
+    Retourne la mémoire résidente (RSS) du processus courant en octets
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def release_memory():
+    """
+    Rend au système la mémoire libérée par les modèles évincés (gc + malloc_trim)
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def estimate_model_bytes(model):
+    """
+    Estime la taille d'un modèle torch (paramètres + buffers)
+    Accepte un module, un objet exposant `.model`, ou un tuple de ceux-ci
+    """
+    total = 0
+    seen = set()
+    candidates = model if isinstance(model, (tuple, list)) else (model,)
+    for candidate in candidates:
+        module = getattr(candidate, 'model', candidate)
+        for attr in ('parameters', 'buffers'):
+            tensors = getattr(module, attr, None)
+            if not callable(tensors):
+                continue
+            try:
+                for tensor in tensors():
+                    if id(tensor) in seen or not hasattr(tensor, 'numel'):
+                        continue
+                    seen.add(id(tensor))
+                    total += tensor.numel() * tensor.element_size()
+            except TypeError:
+                continue
+    return total
+
+
+# Tous les caches de modèles, pour le budget global et le déchargement à l'inactivité
+MODEL_CACHES = []
+# Un chargement à la fois, tous caches confondus: la hausse de RSS mesurée
+# pendant un chargement ne doit pas inclure celle d'un autre modèle
+MODEL_LOAD_LOCK = threading.Lock()
+
+
+class ModelLRUCache:
+    """
+    Cache LRU de modèles, borné en nombre d'entrées et en mémoire estimée
+
+    La taille d'une entrée est le maximum entre l'estimation des tenseurs
+    et la hausse de RSS observée pendant le chargement.
+    Un modèle évincé pendant qu'un job l'utilise reste valide pour ce job.
+    """
+
+    def __init__(self, name, max_items, max_bytes):
+        self.name = name
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> [model, nbytes, dernier accès]
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.idle_unloads = 0
+        MODEL_CACHES.append(self)
+
+    @property
+    def resident_bytes(self):
+        return sum(entry[1] for entry in self._entries.values())
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, loader):
+        """
+        Retourne le modèle associé à `key`, en le chargeant via `loader()` si absent
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._entries[key][2] = time.monotonic()
+                self.hits += 1
+                self._record('hits')
+                return self._entries[key][0]
+
+            self.misses += 1
+            self._record('misses')
+            logger.info(f"Loading {self.name} model '{key}' into cache...")
+            with MODEL_LOAD_LOCK:
+                rss_before = current_rss_bytes()
+                model = loader()
+                nbytes = max(estimate_model_bytes(model), current_rss_bytes() - rss_before)
+            self._entries[key] = [model, nbytes, time.monotonic()]
+            logger.info(f"✅ {self.name} model '{key}' cached ({nbytes / 1024 ** 2:.0f} MB)")
+            self._evict()
+        # Hors du verrou: le budget global verrouille les caches un par un
+        enforce_model_budget(keep=(self, key))
+        return model
+
+    def _evict(self):
+        # On garde toujours l'entrée la plus récente, même si elle dépasse le budget
+        evicted = False
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_items or self.resident_bytes > self.max_bytes
+        ):
+            key, (_, nbytes, _) = self._entries.popitem(last=False)
+            self.evictions += 1
+            self._record('evictions')
+            evicted = True
+            logger.info(f"Evicted {self.name} model '{key}' ({nbytes / 1024 ** 2:.0f} MB)")
+        if evicted:
+            release_memory()
+        self._update_gauges()
+
+    def oldest(self):
+        """
+        Entrée la moins récemment utilisée: (dernier accès, clé) ou None
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                return entry[2], key
+        return None
+
+    def unload(self, key, reason="evictions"):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return 0
+            if reason == "idle_unloads":
+                self.idle_unloads += 1
+            else:
+                self.evictions += 1
+            self._record(reason)
+            self._update_gauges()
+        logger.info(f"Unloaded {self.name} model '{key}' ({entry[1] / 1024 ** 2:.0f} MB, {reason})")
+        return entry[1]
+
+    def unload_idle(self, max_idle_seconds, since):
+        """
+        Décharge les entrées inutilisées depuis `max_idle_seconds`
+        (`since`: fin du dernier job, horloge monotonic)
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items()
+                    if now - max(entry[2], since) > max_idle_seconds]
+        return sum(self.unload(key, "idle_unloads") for key in idle)
+
+    def _record(self, field):
+        if Histogram is not None:
+            MODEL_CACHE_EVENTS.labels(cache=self.name, event=field).inc()
+        try:
+            redis_conn.hincrby(CACHE_STATS_KEY, f"{self.name}_{field}", 1)
+        except redis.RedisError as e:
+            logger.debug(f"Could not record cache stats: {e}")
+
+    def _update_gauges(self):
+        if Histogram is not None:
+            MODEL_CACHE_RESIDENT_BYTES.labels(cache=self.name).set(self.resident_bytes)
+            MODEL_CACHE_ENTRIES.labels(cache=self.name).set(len(self._entries))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": list(self._entries.keys()),
+                "resident_mb": round(self.resident_bytes / 1024 ** 2, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "idle_unloads": self.idle_unloads,
+            }
+
+
+def model_resident_bytes():
+    return sum(cache.resident_bytes for cache in MODEL_CACHES)
+
+
+def enforce_model_budget(keep=None):
+    """
+    Évince les modèles les moins récemment utilisés, tous caches confondus,
+    tant que MODEL_MAX_RESIDENT_BYTES est dépassé (`keep`: (cache, clé) à conserver)
+    """
+    if MODEL_MAX_RESIDENT_BYTES <= 0:
+        return
+    released = False
+    while model_resident_bytes() > MODEL_MAX_RESIDENT_BYTES:
+        candidates = []
+        for cache in MODEL_CACHES:
+            oldest = cache.oldest()
+            if oldest is not None and (cache, oldest[1]) != keep:
+                candidates.append((oldest[0], oldest[1], cache))
+        if not candidates:
+            break
+        _, key, cache = min(candidates, key=lambda candidate: candidate[0])
+        released = cache.unload(key) > 0 or released
+    if released:
+        release_memory()
+
+
+# Activité des jobs: le déchargement à l'inactivité attend qu'aucun job ne tourne
+ACTIVE_JOBS = 0
+LAST_JOB_ACTIVITY = time.monotonic()
+ACTIVE_JOBS_LOCK = threading.Lock()
+
+
+@contextmanager
+def job_activity():
+    """
+    Marque un job en cours (modèles en usage) pour le déchargement à l'inactivité
+    """
+    global ACTIVE_JOBS, LAST_JOB_ACTIVITY
+    with ACTIVE_JOBS_LOCK:
+        ACTIVE_JOBS += 1
+    try:
+        yield
+    finally:
+        with ACTIVE_JOBS_LOCK:
+            ACTIVE_JOBS -= 1
+            LAST_JOB_ACTIVITY = time.monotonic()
+
+
+def unload_idle_models(max_idle_seconds):
+    """
+    Décharge les modèles inutilisés depuis `max_idle_seconds` si aucun job ne tourne
+    Returns: octets libérés
+    """
+    with ACTIVE_JOBS_LOCK:
+        if ACTIVE_JOBS:
+            return 0
+        since = LAST_JOB_ACTIVITY
+    released = sum(cache.unload_idle(max_idle_seconds, since) for cache in MODEL_CACHES)
+    if released:
+        release_memory()
+        logger.info(f"💤 Idle for {max_idle_seconds / 60:.0f} min: released "
+                    f"{released / 1024 ** 2:.0f} MB of models")
+    return released
+
+
+def start_idle_unloader(minutes=MODEL_IDLE_UNLOAD_MINUTES):
+    """
+    Thread de fond qui décharge les modèles après `minutes` sans job
+    """
+    if minutes <= 0:
+        return
+    interval = max(5.0, min(60.0, minutes * 60 / 4))
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                unload_idle_models(minutes * 60)
+            except Exception as e:
+                logger.warning(f"Idle model unload failed: {e}")
+
+    threading.Thread(target=loop, name="model-idle-unloader", daemon=True).start()
+    logger.info(f"Models unloaded after {minutes:g} idle minutes")
+
+
+ASR_MODEL_CACHE = ModelLRUCache("asr", ASR_CACHE_MAX_ITEMS, ASR_CACHE_MAX_BYTES)
+ALIGN_MODEL_CACHE = ModelLRUCache("align", ALIGN_CACHE_MAX_ITEMS, ALIGN_CACHE_MAX_BYTES)
+DIARIZE_PIPELINE_CACHE = ModelLRUCache("diarize", DIARIZE_CACHE_MAX_ITEMS, DIARIZE_CACHE_MAX_BYTES)
+
+
+def load_asr_model(model_name):
+    """
+    Charge un modèle WhisperX
+
+    Avec WORKER_CONCURRENCY > 1, le modèle CTranslate2 est créé avec autant
+    de replicas (num_workers) que de jobs parallèles: les poids restent en
+    un seul exemplaire, partagés par les replicas.
+
+    La langue est fixée au chargement: sans langue pré-définie, le pipeline
+    (partagé par les threads) remet son tokenizer à None à la fin de chaque
+    transcription, sous les pieds des jobs concurrents.
+    """
+    logger.info(f"Loading model '{model_name}' "
+                f"({WORKER_CONCURRENCY} workers × {ASR_THREADS} threads)...")
+    asr_model = None
+    if WORKER_CONCURRENCY > 1:
+        # Le WhisperModel de whisperx (pas celui de faster_whisper): le
+        # pipeline appelle generate_segment_batched, qu'il est seul à définir
+        from whisperx.asr import WhisperModel
+        asr_model = WhisperModel(
+            model_name,
+            device=DEVICE,
+            compute_type=COMPUTE_TYPE,
+            cpu_threads=ASR_THREADS,
+            num_workers=WORKER_CONCURRENCY
+        )
+    return whisperx.load_model(
+        model_name,
+        DEVICE,
+        compute_type=COMPUTE_TYPE,
+        threads=ASR_THREADS,
+        language=DEFAULT_LANGUAGE,
+        model=asr_model
+    )
+
+
+def get_model(model_name=DEFAULT_MODEL):
+    """
+    Récupère le modèle depuis le cache ou le charge
+    """
+    return ASR_MODEL_CACHE.get(model_name, lambda: load_asr_model(model_name))
+
+
+def get_align_model(language=DEFAULT_LANGUAGE):
+    """
+    Récupère le modèle d'alignement (wav2vec2) d'une langue depuis le cache
+    Returns: tuple (model_a, metadata)
+    """
+    return ALIGN_MODEL_CACHE.get(
+        language,
+        lambda: whisperx.load_align_model(language_code=language, device=DEVICE)
+    )
+
+
+def get_diarize_pipeline():
+    """
+    Récupère le pipeline de diarization depuis le cache
+    """
+    return DIARIZE_PIPELINE_CACHE.get(
+        "pyannote",
+        lambda: whisperx.DiarizationPipeline(use_auth_token=HF_TOKEN, device=DEVICE)
+    )
+
+
+def get_cache_stats():
+    """
+    Statistiques des caches: compteurs locaux + compteurs agrégés dans Redis
+    (modèles), cache de résultats et sorties SRT/VTT/TSV
+    """
+    try:
+        shared = {k.decode(): int(v) for k, v in redis_conn.hgetall(CACHE_STATS_KEY).items()}
+        outputs = {k.decode(): int(v) for k, v in redis_conn.hgetall(OUTPUT_STATS_KEY).items()}
+    except redis.RedisError:
+        shared, outputs = {}, {}
+    return {
+        "asr": ASR_MODEL_CACHE.stats(),
+        "align": ALIGN_MODEL_CACHE.stats(),
+        "diarize": DIARIZE_PIPELINE_CACHE.stats(),
+        "shared": shared,
+        "resident_mb": round(model_resident_bytes() / 1024 ** 2, 1),
+        "budget_mb": round(MODEL_MAX_RESIDENT_BYTES / 1024 ** 2, 1) if MODEL_MAX_RESIDENT_BYTES else None,
+        "results": get_result_cache_stats(),
+        "outputs": outputs,
+    }
+
+
+def warm_models(diarize=False):
+    """
+    Charge les modèles d'un job s'ils ne sont pas résidents: ASR, alignement
+    (et diarization), l'un après l'autre. La taille de chaque entrée vient
+    de la hausse de RSS pendant son chargement: en parallèle, chaque modèle
+    compterait aussi les autres (évictions à tort avec MODEL_MAX_RESIDENT_BYTES).
+    """
+    loaders = [lambda: get_model(DEFAULT_MODEL), lambda: get_align_model(DEFAULT_LANGUAGE)]
+    if diarize and HF_TOKEN:
+        loaders.append(get_diarize_pipeline)
+
+    for loader in loaders:
+        try:
+            loader()
+        except Exception as e:
+            # Le job rechargera le modèle lui-même et remontera l'erreur
+            logger.error(f"❌ Model warm-up failed: {e}")
+
+
+def models_cold():
+    return DEFAULT_MODEL not in ASR_MODEL_CACHE or DEFAULT_LANGUAGE not in ALIGN_MODEL_CACHE
+
+
+# ===================================================================
+# MÉTRIQUES PAR ÉTAPE (Redis + Prometheus)
+# ===================================================================
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9400'))  # 0 = pas d'endpoint /metrics
+METRICS_TTL_SECONDS = int(os.getenv('METRICS_TTL_SECONDS', str(7 * 24 * 3600)))
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram(
+        'whisperx_stage_seconds', 'Wall time per transcription stage', ['stage'],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+    )
+    STAGE_CPU_SECONDS = Counter(
+        'whisperx_stage_cpu_seconds', 'Process CPU time per transcription stage', ['stage']
+    )
+    JOB_RTF = Histogram(
+        'whisperx_job_rtf', 'Real-time factor per job (wall time / audio duration)',
+        buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5)
+    )
+    QUEUE_WAIT_SECONDS = Histogram(
+        'whisperx_queue_wait_seconds', 'Time between enqueue and start of a job', ['queue_class'],
+        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+    )
+    QUEUE_WAIT_P50 = Gauge(
+        'whisperx_queue_wait_p50_seconds', 'Median queue wait over recent jobs', ['queue_class']
+    )
+    QUEUE_WAIT_P95 = Gauge(
+        'whisperx_queue_wait_p95_seconds', '95th percentile queue wait over recent jobs', ['queue_class']
+    )
+    AUDIO_SECONDS = Counter('whisperx_audio_seconds', 'Audio seconds transcribed')
+    VAD_SKIPPED_SECONDS = Counter('whisperx_vad_skipped_seconds', 'Silent audio seconds skipped before ASR')
+    JOBS_TOTAL = Counter('whisperx_jobs', 'Transcription jobs by outcome', ['status'])
+    MODEL_CACHE_RESIDENT_BYTES = Gauge(
+        'whisperx_model_cache_resident_bytes', 'Estimated memory of resident models', ['cache']
+    )
+    MODEL_CACHE_ENTRIES = Gauge('whisperx_model_cache_entries', 'Resident models', ['cache'])
+    MODEL_CACHE_EVENTS = Counter(
+        'whisperx_model_cache_events', 'Model cache hits, misses, evictions and idle unloads',
+        ['cache', 'event']
+    )
+
+
+def peak_rss_bytes():
+    """
+    Pic de RSS du processus (high-water mark) en octets
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def count_job(status):
+    if Histogram is not None:
+        JOBS_TOTAL.labels(status=status).inc()
+
+
+class JobStatusWriter:
+    """
+    Mises à jour de l'état d'un job (job:{id}): les champs sont regroupés et
+    écrits avec leur événement en une seule transaction, HSET job:{id} +
+    PUBLISH job:{id}:events (JSON des champs modifiés)
+
+    set() diffère des champs jusqu'au prochain update()/transaction();
+    les clients s'abonnent au canal au lieu de relire job:{id} en boucle.
+    """
+
+    def __init__(self, job_id, conn=None):
+        self.job_id = job_id
+        self.conn = conn or redis_conn
+        self.key = f"job:{job_id}"
+        self.channel = f"job:{job_id}:events"
+        self.pending = {}
+        self.round_trips = 0
+        self.commands = 0
+
+    def set(self, **fields):
+        self.pending.update(fields)
+
+    def update(self, **fields):
+        self.pending.update(fields)
+        with self.transaction():
+            pass
+
+    def write(self, pipe, **fields):
+        """
+        Ajoute les champs en attente (+ fields) et leur événement à un pipeline
+        """
+        fields = {**self.pending, **fields}
+        self.pending = {}
+        if fields:
+            pipe.hset(self.key, mapping=fields)
+            pipe.publish(self.channel, json.dumps(fields, ensure_ascii=False))
+
+    @contextmanager
+    def transaction(self):
+        """
+        Pipeline MULTI/EXEC: les commandes ajoutées dans le bloc partent dans
+        le même aller-retour que les champs en attente
+        """
+        with self.conn.pipeline() as pipe:
+            yield pipe
+            self.write(pipe)
+            if pipe.command_stack:
+                self.round_trips += 1
+                self.commands += len(pipe.command_stack)
+                pipe.execute()
+
+
+class JobMetrics:
+    """
+    Mesures par étape d'un job: temps réel, temps CPU du processus et hausse
+    du pic de RSS, plus la durée audio pour le RTF
+
+    Les mesures d'une même étape s'additionnent (fenêtres du streaming).
+    Le résultat est écrit dans job:{id}:metrics par flush().
+    Un job préempté puis repris (resumed) cumule les mesures de ses étapes.
+    """
+
+    # Champs additionnés d'une étape à l'autre (en plus des temps par étape)
+    CUMULATIVE_FIELDS = ("queue_wait_s", "audio_seconds", "vad_skipped_s",
+                         "redis_round_trips", "redis_commands")
+
+    def __init__(self, job_id, rq_job=None):
+        self.job_id = job_id
+        self.stages = OrderedDict()  # stage -> [wall, cpu, rss_delta]
+        self.audio_seconds = None
+        self.resumed = False
+        self.vad_skipped = 0.0
+        self.queue_wait = None
+        self.started = time.perf_counter()
+        self.status = JobStatusWriter(job_id)
+
+        enqueued_at = getattr(rq_job, 'enqueued_at', None)
+        if enqueued_at is not None:
+            self.queue_wait = max(0.0, (utcnow() - enqueued_at).total_seconds())
+            record_queue_wait(rq_job.origin, self.queue_wait)
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu, peak = time.perf_counter(), time.process_time(), peak_rss_bytes()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.process_time() - cpu,
+                        peak_rss_bytes() - peak)
+
+    def record(self, name, wall, cpu, rss_delta=0):
+        totals = self.stages.setdefault(name, [0.0, 0.0, 0])
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += rss_delta
+        if Histogram is not None:
+            STAGE_SECONDS.labels(stage=name).observe(wall)
+            STAGE_CPU_SECONDS.labels(stage=name).inc(cpu)
+
+    def add_vad_skipped(self, seconds):
+        self.vad_skipped += seconds
+        if Histogram is not None and seconds:
+            VAD_SKIPPED_SECONDS.inc(seconds)
+
+    def as_fields(self, previous=None):
+        """
+        previous: champs écrits par les étapes précédentes du job, cumulés
+        avec ceux-ci (le RTF porte alors sur l'ensemble des étapes)
+        """
+        fields = {}
+        for name, (wall, cpu, rss_delta) in self.stages.items():
+            fields[f"{name}_wall_s"] = round(wall, 3)
+            fields[f"{name}_cpu_s"] = round(cpu, 3)
+            fields[f"{name}_rss_delta_mb"] = round(rss_delta / 1024 ** 2, 1)
+
+        total_wall = time.perf_counter() - self.started
+        fields["total_wall_s"] = round(total_wall, 3)
+        if self.queue_wait is not None:
+            fields["queue_wait_s"] = round(self.queue_wait, 3)
+        if self.audio_seconds:
+            fields["audio_seconds"] = round(self.audio_seconds, 3)
+            # Part de silence retirée avant l'ASR (voir trim_silence)
+            fields["vad_skipped_s"] = round(self.vad_skipped, 3)
+        # Allers-retours Redis d'état/résultat du job (hors écriture des métriques)
+        fields["redis_round_trips"] = self.status.round_trips
+        fields["redis_commands"] = self.status.commands
+        fields["model_resident_mb"] = round(model_resident_bytes() / 1024 ** 2, 1)
+
+        for name, value in (previous or {}).items():
+            if name.endswith(("_wall_s", "_cpu_s")) or name in self.CUMULATIVE_FIELDS:
+                value = fields.get(name, 0) + float(value)
+                fields[name] = int(value) if name.startswith("redis_") else round(value, 3)
+            elif name.endswith("_rss_delta_mb"):
+                fields[name] = max(fields.get(name, 0.0), float(value))
+
+        if fields.get("audio_seconds"):
+            fields["rtf"] = round(fields["total_wall_s"] / fields["audio_seconds"], 4)
+            fields["vad_skipped_fraction"] = round(fields.get("vad_skipped_s", 0.0) / fields["audio_seconds"], 4)
+        return fields
+
+    def flush(self, final=True):
+        """
+        Écrit les métriques dans job:{id}:metrics et alimente Prometheus
+
+        Un job repris ajoute ses mesures à celles déjà écrites (les étapes
+        d'un job ne tournent jamais en même temps). final=False pour une
+        étape interrompue par une préemption: le RTF du job n'est observé
+        qu'une fois, à la fin, sur l'ensemble de ses étapes.
+        """
+        key = f"job:{self.job_id}:metrics"
+        previous = None
+        if self.resumed:
+            try:
+                previous = {k.decode(): v.decode() for k, v in redis_conn.hgetall(key).items()}
+            except redis.RedisError as e:
+                logger.warning(f"[Job {self.job_id}] Could not read previous metrics: {e}")
+        fields = self.as_fields(previous)
+        if Histogram is not None:
+            if self.audio_seconds:
+                AUDIO_SECONDS.inc(self.audio_seconds)
+            if final and "rtf" in fields:
+                JOB_RTF.observe(fields["rtf"])
+        try:
+            with redis_conn.pipeline() as pipe:
+                pipe.hset(key, mapping=fields)
+                pipe.expire(key, METRICS_TTL_SECONDS)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"[Job {self.job_id}] Could not write metrics: {e}")
+        logger.info(f"[Job {self.job_id}] Metrics: {fields}")
+        return fields
+
+
+def start_metrics_server(port=METRICS_PORT):
+    """
+    Expose /metrics pour Prometheus (si prometheus-client est installé)
+    """
+    if start_http_server is None or port <= 0:
+        logger.info("Prometheus metrics endpoint disabled")
+        return
+    start_http_server(port)
+    logger.info(f"📊 Prometheus metrics on :{port}/metrics")
+
+
+# ===================================================================
+# HANDOFF AUDIO EN MÉMOIRE PARTAGÉE (PCM .npy MAPPÉ)
+# ===================================================================
+# Quand l'API et le worker partagent l'hôte, l'API décode l'upload une seule
+# fois (share_decoded_audio) en PCM float32 16 kHz dans un .npy sous
+# SHARED_AUDIO_DIR (tmpfs). Le job porte le chemin du .npy comme audio_path
+# et le worker le mappe avec np.load(mmap_mode='r'): ni second décodage
+# ffmpeg, ni copie. Le nettoyage reste celui des fichiers audio (os.remove).
+SHARED_AUDIO = os.getenv('SHARED_AUDIO', 'no').lower() in ('1', 'yes', 'true')
+SHARED_AUDIO_DIR = Path(os.getenv('SHARED_AUDIO_DIR', '/dev/shm/whisperx'))
+SHARED_AUDIO_TTL_SECONDS = int(os.getenv('SHARED_AUDIO_TTL_SECONDS', str(24 * 3600)))
+
+
+def is_shared_audio(audio_path):
+    return str(audio_path).endswith(".npy")
+
+
+def share_decoded_audio(job_id, audio_path, remove_source=True):
+    """
+    Décode un upload (whisperx.load_audio) dans SHARED_AUDIO_DIR/{job_id}.npy
+    Côté API, avant enqueue_transcription().
+
+    Returns: chemin du .npy, à passer comme audio_path du job
+    """
+    audio = whisperx.load_audio(audio_path)
+    SHARED_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+    target = SHARED_AUDIO_DIR / f"{job_id}.npy"
+    partial = SHARED_AUDIO_DIR / f".{job_id}.npy.partial"
+    with open(partial, "wb") as f:
+        np.save(f, audio)
+    # Renommage atomique: le worker ne voit jamais un fichier à moitié écrit
+    os.replace(partial, target)
+    if remove_source:
+        os.remove(audio_path)
+    return str(target)
+
+
+def load_job_audio(audio_path):
+    """
+    Audio d'un job en float32 16 kHz: PCM partagé mappé sans copie,
+    sinon décodage ffmpeg (whisperx.load_audio)
+    """
+    if is_shared_audio(audio_path):
+        return np.load(audio_path, mmap_mode='r')
+    return whisperx.load_audio(audio_path)
+
+
+def purge_shared_audio(max_age=SHARED_AUDIO_TTL_SECONDS):
+    """
+    Supprime les PCM partagés orphelins (jobs jamais traités): ils occupent de la RAM
+    """
+    if not SHARED_AUDIO_DIR.exists():
+        return
+    limit = time.time() - max_age
+    for path in SHARED_AUDIO_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < limit:
+                path.unlink()
+        except OSError:
+            continue
+
+
+# ===================================================================
+# ROUTAGE PAR DURÉE ET PRIORITÉ DES QUEUES
+# ===================================================================
+# L'API place les jobs via enqueue_transcription(): notes vocales dans
+# transcription:short, longs enregistrements dans transcription:long.
+# La queue historique "transcription" reste servie (jobs non routés).
+SHORT_QUEUE = "transcription:short"
+LONG_QUEUE = "transcription:long"
+LEGACY_QUEUE = "transcription"
+WORKER_QUEUES = [SHORT_QUEUE, LONG_QUEUE, LEGACY_QUEUE]
+
+SHORT_AUDIO_MAX_SECONDS = float(os.getenv('SHORT_AUDIO_MAX_SECONDS', '120'))
+# Quand les deux queues ont des jobs, la courte passe en premier avec une
+# probabilité SHORT_QUEUE_WEIGHT / (SHORT_QUEUE_WEIGHT + LONG_QUEUE_WEIGHT)
+SHORT_QUEUE_WEIGHT = float(os.getenv('SHORT_QUEUE_WEIGHT', '4'))
+LONG_QUEUE_WEIGHT = float(os.getenv('LONG_QUEUE_WEIGHT', '1'))
+# Un job long en streaming cède la place entre deux fenêtres si des jobs courts attendent
+PREEMPT_LONG_JOBS = os.getenv('PREEMPT_LONG_JOBS', 'yes').lower() in ('1', 'yes', 'true')
+SHORT_JOB_TIMEOUT = int(os.getenv('SHORT_JOB_TIMEOUT', '1800'))
+LONG_JOB_TIMEOUT = int(os.getenv('LONG_JOB_TIMEOUT', str(4 * 3600)))
+
+QUEUE_WAIT_SAMPLES = 1000
+QUEUE_STATS_KEY = "transcription:queue_stats"
+
+# Le worker est déployé sous le nom worker.py: c'est ce chemin que RQ importe
+TRANSCRIPTION_FUNC = f"{Path(__file__).stem}.process_transcription"
+
+
+def queue_class(queue_name):
+    """
+    Classe d'une queue pour les statistiques: short, long ou default
+    """
+    return {SHORT_QUEUE: "short", LONG_QUEUE: "long"}.get(queue_name, "default")
+
+
+def enqueue_transcription(job_id, audio_path, diarize=False, stream=None, resume_from=None,
+                          conn=None, at_front=False, share_audio=SHARED_AUDIO, vocabulary=None):
+    """
+    Place un job dans la queue courte ou longue selon la durée de l'audio
+    (sondée avec ffprobe, sans décodage). Point d'entrée prévu pour l'API.
+
+    Avec share_audio, l'upload est d'abord décodé en PCM partagé
+    (share_decoded_audio) et le job porte le chemin du .npy.
+
+    Returns: nom de la queue utilisée
+    """
+    conn = conn or redis_conn
+    vocabulary_path(vocabulary)  # nom de jeu invalide: ValueError côté API
+    if share_audio and not is_shared_audio(audio_path):
+        audio_path = share_decoded_audio(job_id, audio_path)
+    duration = probe_duration(audio_path)
+    # Durée inconnue: traité comme un long enregistrement
+    is_short = duration is not None and duration <= SHORT_AUDIO_MAX_SECONDS
+    queue_name = SHORT_QUEUE if is_short else LONG_QUEUE
+
+    JobStatusWriter(job_id, conn).update(
+        status="queued",
+        queue_class=queue_class(queue_name),
+        audio_duration=f"{duration:.1f}" if duration is not None else ""
+    )
+    Queue(queue_name, connection=conn).enqueue_call(
+        TRANSCRIPTION_FUNC,
+        args=(job_id, audio_path),
+        kwargs={"diarize": diarize, "stream": stream, "resume_from": resume_from,
+                "vocabulary": vocabulary},
+        timeout=SHORT_JOB_TIMEOUT if is_short else LONG_JOB_TIMEOUT,
+        at_front=at_front
+    )
+    return queue_name
+
+
+def weighted_queue_order(queues):
+    """
+    Ordre d'écoute des queues pour le prochain job: courte ou longue en
+    premier selon les poids, les autres queues ensuite
+    """
+    by_name = {queue.name: queue for queue in queues}
+    short, long_ = by_name.get(SHORT_QUEUE), by_name.get(LONG_QUEUE)
+    others = [queue for queue in queues if queue.name not in (SHORT_QUEUE, LONG_QUEUE)]
+    if short is None or long_ is None:
+        return list(queues)
+    short_first = random.random() < SHORT_QUEUE_WEIGHT / (SHORT_QUEUE_WEIGHT + LONG_QUEUE_WEIGHT)
+    return ([short, long_] if short_first else [long_, short]) + others
+
+
+def short_jobs_waiting():
+    try:
+        return redis_conn.llen(Queue(SHORT_QUEUE, connection=redis_conn).key) > 0
+    except redis.RedisError:
+        return False
+
+
+def percentile(sorted_values, fraction):
+    """
+    Percentile (rang le plus proche) d'une liste triée
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def record_queue_wait(queue_name, wait):
+    """
+    Ajoute une attente en queue aux derniers échantillons de sa classe et
+    publie p50/p95 dans transcription:queue_stats (et dans Prometheus)
+    """
+    cls = queue_class(queue_name)
+    samples_key = f"transcription:wait:{cls}"
+    try:
+        with redis_conn.pipeline() as pipe:
+            pipe.lpush(samples_key, round(wait, 3))
+            pipe.ltrim(samples_key, 0, QUEUE_WAIT_SAMPLES - 1)
+            pipe.lrange(samples_key, 0, -1)
+            samples = sorted(float(v) for v in pipe.execute()[-1])
+
+        p50, p95 = percentile(samples, 0.50), percentile(samples, 0.95)
+        redis_conn.hset(QUEUE_STATS_KEY, mapping={
+            f"{cls}_p50_s": round(p50, 3),
+            f"{cls}_p95_s": round(p95, 3),
+            f"{cls}_samples": len(samples),
+        })
+    except redis.RedisError as e:
+        logger.debug(f"Could not record queue wait: {e}")
+        return
+
+    if Histogram is not None:
+        QUEUE_WAIT_SECONDS.labels(queue_class=cls).observe(wait)
+        QUEUE_WAIT_P50.labels(queue_class=cls).set(p50)
+        QUEUE_WAIT_P95.labels(queue_class=cls).set(p95)
+
+
+def queue_wait_stats():
+    """
+    p50/p95 d'attente en queue par classe (derniers QUEUE_WAIT_SAMPLES jobs)
+    """
+    return {k.decode(): float(v) for k, v in redis_conn.hgetall(QUEUE_STATS_KEY).items()}
+
+
+class TranscriptionWorker(SimpleWorker):
+    """
+    SimpleWorker qui écoute les queues courte/longue avec une priorité pondérée
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ordered_queues = weighted_queue_order(self.queues)
+
+    def reorder_queues(self, reference_queue):
+        self._ordered_queues = weighted_queue_order(self.queues)
+
+    def execute_job(self, job, queue):
+        # Modèles déchargés (MODEL_PRELOAD=first_job ou inactivité): rechargés
+        # dès l'arrivée du job, avant son exécution
+        if models_cold():
+            warm_models(diarize=bool(job.kwargs.get("diarize")))
+        with job_activity():
+            return super().execute_job(job, queue)
+
+
+# ===================================================================
+# STOCKAGE COMPACT DES RÉSULTATS
+# ===================================================================
+# Un long résultat aligné (mots + timestamps) ne tient plus dans un seul JSON
+# du hash job:{id}: les segments sont découpés en pages compressées, avec les
+# mots en colonnes (word/start/end/score...), stockées dans Redis
+# (job:{id}:result:{n}) ou dans des fichiers (RESULT_DIR/{id}/{n}.bin).
+# Les petits résultats restent en JSON dans le champ `result` (compatibilité API).
+#
+# RESULT_STORE=inline par défaut: tout résultat reste dans `result`. Les
+# pages (redis | file) sont à activer une fois les lecteurs de l'API passés à
+# load_result / read_result_page: un hget(job, "result") ne voit rien pour
+# un long enregistrement paginé.
+try:
+    import msgpack
+except ImportError:  # Repli sur JSON
+    msgpack = None
+try:
+    import zstandard
+except ImportError:  # Repli sur zlib
+    zstandard = None
+
+RESULT_STORE = os.getenv('RESULT_STORE', 'inline')  # inline | redis | file
+RESULT_DIR = Path(os.getenv('RESULT_DIR', '/tmp/uploads/results'))
+RESULT_PAGE_SIZE = int(os.getenv('RESULT_PAGE_SIZE', '200'))  # segments par page
+RESULT_INLINE_MAX_SEGMENTS = int(os.getenv('RESULT_INLINE_MAX_SEGMENTS', '200'))
+RESULT_TTL_SECONDS = int(os.getenv('RESULT_TTL_SECONDS', str(7 * 24 * 3600)))
+
+RESULT_CODEC = "+".join((
+    "msgpack" if msgpack is not None else "json",
+    "zstd" if zstandard is not None else "zlib",
+))
+
+
+def encode_payload(obj, codec=RESULT_CODEC):
+    """
+    Sérialise et compresse un objet selon le codec ("msgpack+zstd", "json+zlib"...)
+    """
+    serializer, compressor = codec.split("+")
+    if serializer == "msgpack":
+        data = msgpack.packb(obj, use_bin_type=True)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if compressor == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def decode_payload(data, codec):
+    """
+    Opération inverse de encode_payload
+    """
+    serializer, compressor = codec.split("+")
+    if compressor == "zstd":
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    if serializer == "msgpack":
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def columnar_words(words):
+    """
+    [{"word": .., "start": ..}, ...] -> {"word": [..], "start": [..]}
+    """
+    keys = []
+    for word in words:
+        keys.extend(key for key in word if key not in keys)
+    return {key: [word.get(key) for word in words] for key in keys}
+
+
+def row_words(columns):
+    """
+    Opération inverse de columnar_words (les valeurs absentes sont omises)
+    """
+    count = max((len(values) for values in columns.values()), default=0)
+    return [
+        {key: values[index] for key, values in columns.items() if values[index] is not None}
+        for index in range(count)
+    ]
+
+
+def pack_segments(segments):
+    packed = []
+    for segment in segments:
+        segment = dict(segment)
+        if "words" in segment:
+            segment["words"] = columnar_words(segment["words"])
+        packed.append(segment)
+    return packed
+
+
+def unpack_segments(segments):
+    for segment in segments:
+        if isinstance(segment.get("words"), dict):
+            segment["words"] = row_words(segment["words"])
+    return segments
+
+
+def encode_result(result):
+    """
+    Prépare le stockage d'un résultat
+    Returns: (champs du hash job, list de pages encodées)
+    """
+    segments = result.get("segments", [])
+    if RESULT_STORE == "inline" or len(segments) <= RESULT_INLINE_MAX_SEGMENTS:
+        return {"result": json.dumps(result, ensure_ascii=False), "result_store": "inline"}, []
+
+    # word_segments duplique les mots des segments: reconstruit à la lecture
+    meta = {k: v for k, v in result.items() if k not in ("segments", "word_segments")}
+    pages = [
+        encode_payload(pack_segments(segments[start:start + RESULT_PAGE_SIZE]))
+        for start in range(0, len(segments), RESULT_PAGE_SIZE)
+    ]
+    fields = {
+        "result_store": RESULT_STORE,
+        "result_codec": RESULT_CODEC,
+        "result_pages": len(pages),
+        "result_page_size": RESULT_PAGE_SIZE,
+        "result_segments": len(segments),
+        "result_meta": json.dumps(meta, ensure_ascii=False),
+    }
+    return fields, pages
+
+
+def write_result_pages(job_id, pages, pipe):
+    """
+    Écrit les pages dans le store configuré (Redis via `pipe`, ou fichiers)
+    """
+    if RESULT_STORE == "file":
+        job_dir = RESULT_DIR / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        for index, page in enumerate(pages):
+            tmp_path = job_dir / f"{index:05d}.bin.tmp"
+            tmp_path.write_bytes(page)
+            os.replace(tmp_path, job_dir / f"{index:05d}.bin")
+        return {"result_path": str(job_dir)}
+
+    for index, page in enumerate(pages):
+        pipe.set(f"job:{job_id}:result:{index}", page, ex=RESULT_TTL_SECONDS)
+    return {}
+
+
+class ResultExpired(LookupError):
+    """
+    Une page listée dans result_pages n'existe plus (TTL Redis écoulé ou
+    fichiers purgés): le résultat est incomplet, pas vide
+    """
+
+
+def read_result_fields(job_id, conn=None):
+    """
+    Hash du job (métadonnées du résultat), décodé
+    """
+    conn = conn or redis_conn
+    return {k.decode(): v.decode('utf-8') for k, v in conn.hgetall(f"job:{job_id}").items()}
+
+
+def read_result_page(job_id, page, conn=None, fields=None):
+    """
+    Lit une page de segments d'un résultat (pour les consommateurs de l'API)
+    fields: hash du job déjà lu (read_result_fields), relu sinon
+
+    Returns: list de segments, ou None si la page est hors du résultat
+    Raises: ResultExpired si une page du résultat a expiré
+    """
+    conn = conn or redis_conn
+    if fields is None:
+        fields = read_result_fields(job_id, conn)
+    store = fields.get("result_store", "inline")
+
+    if store == "inline":
+        if "result" not in fields:
+            return None
+        segments = json.loads(fields["result"]).get("segments", [])
+        start = page * RESULT_PAGE_SIZE
+        if page < 0 or (page > 0 and start >= len(segments)):
+            return None
+        return segments[start:start + RESULT_PAGE_SIZE]
+
+    if page < 0 or page >= int(fields["result_pages"]):
+        return None
+    if store == "file":
+        try:
+            data = (Path(fields["result_path"]) / f"{page:05d}.bin").read_bytes()
+        except FileNotFoundError:
+            data = None
+    else:
+        data = conn.get(f"job:{job_id}:result:{page}")
+    if data is None:
+        raise ResultExpired(f"Result page {page} of job {job_id} has expired")
+    return unpack_segments(decode_payload(data, fields["result_codec"]))
+
+
+def iter_result_segments(job_id, conn=None, fields=None):
+    """
+    Itère sur tous les segments d'un résultat, page par page
+    Le hash du job est lu une seule fois; un résultat inline est décodé une
+    seule fois au lieu d'une fois par page
+    """
+    conn = conn or redis_conn
+    if fields is None:
+        fields = read_result_fields(job_id, conn)
+    if fields.get("result_store", "inline") == "inline":
+        if "result" in fields:
+            yield from json.loads(fields["result"]).get("segments", [])
+        return
+
+    for page in range(int(fields["result_pages"])):
+        yield from read_result_page(job_id, page, conn, fields)
+
+
+def word_segments(segments):
+    """
+    Champ word_segments du format whisperx: les mots de tous les segments
+    """
+    return [word for segment in segments for word in segment.get("words", [])]
+
+
+def load_result(job_id, conn=None):
+    """
+    Reconstruit le résultat complet (format whisperx) d'un job terminé
+    Raises: ResultExpired si des pages du résultat ont expiré
+    """
+    conn = conn or redis_conn
+    fields = read_result_fields(job_id, conn)
+    if fields.get("result_store", "inline") == "inline":
+        return json.loads(fields["result"]) if "result" in fields else None
+
+    result = json.loads(fields.get("result_meta", "{}"))
+    result["segments"] = list(iter_result_segments(job_id, conn, fields))
+    result["word_segments"] = word_segments(result["segments"])
+    return result
+
+
+def purge_result_files(max_age=RESULT_TTL_SECONDS):
+    """
+    Supprime les résultats fichiers plus vieux que `max_age` secondes
+    """
+    if not RESULT_DIR.exists():
+        return
+    limit = time.time() - max_age
+    for job_dir in RESULT_DIR.iterdir():
+        try:
+            if job_dir.is_dir() and job_dir.stat().st_mtime < limit:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except OSError:
+            continue
+
+
+# ===================================================================
+# FORMATS DE SORTIE: SRT, VTT, TSV DES MOTS
+# ===================================================================
+# Générés côté serveur à la première demande puis gardés à côté du résultat
+# (job:{id}:output:{fmt}, ou RESULT_DIR/{id}/output.{fmt} avec le store
+# fichier): un téléchargement devient une simple lecture par clé au lieu du
+# parse complet du JSON et d'une conversion côté client.
+OUTPUT_FORMATS = ("srt", "vtt", "tsv")
+OUTPUT_STATS_KEY = "stats:outputs"
+
+
+def output_key(job_id, fmt):
+    return f"job:{job_id}:output:{fmt}"
+
+
+def format_timestamp(seconds, decimal_marker="."):
+    """
+    Secondes -> HH:MM:SS.mmm (SRT: decimal_marker=",")
+    """
+    milliseconds = max(0, round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def iter_srt(segments):
+    for index, segment in enumerate(segments, 1):
+        text = segment.get("text", "").strip()
+        if segment.get("speaker"):
+            text = f"[{segment['speaker']}] {text}"
+        yield (f"{index}\n{format_timestamp(segment['start'], ',')} --> "
+               f"{format_timestamp(segment['end'], ',')}\n{text}\n\n")
+
+
+def iter_vtt(segments):
+    yield "WEBVTT\n\n"
+    for segment in segments:
+        text = segment.get("text", "").strip()
+        if segment.get("speaker"):
+            text = f"<v {segment['speaker']}>{text}"
+        yield f"{format_timestamp(segment['start'])} --> {format_timestamp(segment['end'])}\n{text}\n\n"
+
+
+def iter_tsv(segments):
+    """
+    Un mot par ligne, temps en millisecondes (vides si le mot n'a pas été aligné)
+    """
+    yield "start\tend\tspeaker\tscore\tword\n"
+    for segment in segments:
+        for word in segment.get("words", []):
+            start, end, score = word.get("start"), word.get("end"), word.get("score")
+            yield "\t".join((
+                str(round(start * 1000)) if start is not None else "",
+                str(round(end * 1000)) if end is not None else "",
+                word.get("speaker", segment.get("speaker", "")),
+                f"{score:.3f}" if score is not None else "",
+                word.get("word", "").strip().replace("\t", " "),
+            )) + "\n"
+
+
+OUTPUT_WRITERS = {"srt": iter_srt, "vtt": iter_vtt, "tsv": iter_tsv}
+
+
+def render_output(job_id, fmt, conn=None):
+    """
+    Convertit le résultat d'un job, page par page, sans reconstruire le JSON complet
+    """
+    return "".join(OUTPUT_WRITERS[fmt](iter_result_segments(job_id, conn)))
+
+
+def get_output(job_id, fmt, conn=None):
+    """
+    Sortie SRT/VTT/TSV d'un job terminé (pour les consommateurs de l'API),
+    générée au premier appel puis servie depuis le cache
+
+    Returns: str, ou None si le job n'a pas (ou plus) de résultat
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt} (expected one of {', '.join(OUTPUT_FORMATS)})")
+    conn = conn or redis_conn
+    status, store, result_path = (
+        value.decode('utf-8') if value is not None else None
+        for value in conn.hmget(f"job:{job_id}", "status", "result_store", "result_path")
+    )
+    if status != "completed":
+        return None
+
+    if store == "file":
+        path = Path(result_path) / f"output.{fmt}"
+        if path.exists():
+            record_output_lookup("hits", conn)
+            return path.read_text(encoding="utf-8")
+    else:
+        cached = conn.get(output_key(job_id, fmt))
+        if cached is not None:
+            record_output_lookup("hits", conn)
+            return cached.decode("utf-8")
+
+    record_output_lookup("misses", conn)
+    try:
+        output = render_output(job_id, fmt, conn)
+    except ResultExpired:
+        return None
+    if store == "file":
+        tmp_path = Path(result_path) / f"output.{fmt}.tmp"
+        tmp_path.write_text(output, encoding="utf-8")
+        os.replace(tmp_path, Path(result_path) / f"output.{fmt}")
+    else:
+        conn.set(output_key(job_id, fmt), output.encode("utf-8"), ex=RESULT_TTL_SECONDS)
+    return output
+
+
+def invalidate_outputs(job_id, pipe):
+    """
+    Supprime les sorties générées d'un ancien résultat (nouveau résultat écrit)
+    """
+    pipe.delete(*(output_key(job_id, fmt) for fmt in OUTPUT_FORMATS))
+    for fmt in OUTPUT_FORMATS:
+        (RESULT_DIR / job_id / f"output.{fmt}").unlink(missing_ok=True)
+
+
+def record_output_lookup(field, conn=None):
+    try:
+        (conn or redis_conn).hincrby(OUTPUT_STATS_KEY, field, 1)
+    except redis.RedisError as e:
+        logger.debug(f"Could not record output stats: {e}")
+
+
+# ===================================================================
+# PRÉ-DÉCOUPAGE VAD: SUPPRESSION DES SILENCES AVANT L'ASR
+# ===================================================================
+# VAD énergétique (numpy) sur l'audio décodé: les silences plus longs que
+# VAD_MIN_SILENCE_SECONDS sont réduits à VAD_KEEP_SILENCE_SECONDS avant la
+# transcription. La table de correspondance (speech map) ramène ensuite les
+# timestamps de l'alignement sur la timeline d'origine.
+VAD_TRIM = os.getenv('VAD_TRIM', 'yes').lower() in ('1', 'yes', 'true')
+VAD_FRAME_SECONDS = 0.03
+# Trame "parole" si son énergie dépasse (p95 - VAD_DYNAMIC_RANGE_DB), et au moins VAD_FLOOR_DB
+VAD_DYNAMIC_RANGE_DB = float(os.getenv('VAD_DYNAMIC_RANGE_DB', '35'))
+VAD_FLOOR_DB = float(os.getenv('VAD_FLOOR_DB', '-55'))
+VAD_MIN_SILENCE_SECONDS = float(os.getenv('VAD_MIN_SILENCE_SECONDS', '1.0'))
+VAD_KEEP_SILENCE_SECONDS = float(os.getenv('VAD_KEEP_SILENCE_SECONDS', '0.3'))
+# En dessous de cette fraction de silence, l'audio est transcrit tel quel
+VAD_MIN_SKIP_FRACTION = float(os.getenv('VAD_MIN_SKIP_FRACTION', '0.05'))
+
+
+def speech_frames(audio, frame_seconds=VAD_FRAME_SECONDS):
+    """
+    Masque booléen parole / silence par trame de `frame_seconds`
+    """
+    frame = int(frame_seconds * SAMPLE_RATE)
+    frames = len(audio) // frame
+    if frames == 0:
+        return np.ones(0, dtype=bool)
+    energy = np.square(audio[:frames * frame].reshape(frames, frame)).mean(axis=1)
+    energy_db = 10 * np.log10(energy + 1e-10)
+    threshold = max(VAD_FLOOR_DB, float(np.percentile(energy_db, 95)) - VAD_DYNAMIC_RANGE_DB)
+    return energy_db > threshold
+
+
+def trim_silence(audio):
+    """
+    Réduit les longs silences de l'audio
+
+    Returns: tuple (audio_réduit, speech_map, secondes_supprimées)
+        speech_map: liste de (début_réduit, début_original) en secondes par
+        portion conservée, ou None si l'audio est laissé intact
+    """
+    if not VAD_TRIM or len(audio) == 0:
+        return audio, None, 0.0
+
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    speech = speech_frames(audio)
+    if not speech.any():
+        return audio, None, 0.0
+
+    # Runs de silence: transitions du masque parole
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    silence_starts = np.flatnonzero(edges == -1)
+    silence_ends = np.flatnonzero(edges == 1)
+
+    min_silence = int(VAD_MIN_SILENCE_SECONDS / VAD_FRAME_SECONDS)
+    keep = int(VAD_KEEP_SILENCE_SECONDS * SAMPLE_RATE) // 2
+    spans = []  # portions conservées (début, fin) en samples
+    cursor = 0
+    for start, end in zip(silence_starts.tolist(), silence_ends.tolist()):
+        if end - start < min_silence:
+            continue
+        # Garder un peu de silence de chaque côté pour ne pas rogner les mots
+        cut_start = start * frame + keep
+        cut_end = min(len(audio), end * frame) - keep
+        if cut_start >= cut_end:
+            continue
+        if cut_start > cursor:
+            spans.append((cursor, cut_start))
+        cursor = cut_end
+    if cursor < len(audio):
+        spans.append((cursor, len(audio)))
+
+    kept = sum(end - start for start, end in spans)
+    skipped = (len(audio) - kept) / SAMPLE_RATE
+    if not spans or skipped < VAD_MIN_SKIP_FRACTION * len(audio) / SAMPLE_RATE:
+        return audio, None, 0.0
+
+    speech_map = []
+    position = 0
+    for start, end in spans:
+        speech_map.append((position / SAMPLE_RATE, start / SAMPLE_RATE))
+        position += end - start
+    trimmed = np.concatenate([audio[start:end] for start, end in spans])
+    return trimmed, speech_map, skipped
+
+
+def restore_timestamp(t, speech_map, starts, end=False):
+    """
+    Ramène un timestamp de l'audio réduit sur la timeline d'origine
+
+    Une fin tombant pile sur une coupure reste dans la portion qui précède.
+    """
+    index = max(0, (bisect.bisect_left if end else bisect.bisect_right)(starts, t) - 1)
+    trimmed_start, original_start = speech_map[index]
+    return round(t - trimmed_start + original_start, 3)
+
+
+def restore_timeline(result, speech_map):
+    """
+    Applique restore_timestamp aux segments, mots et word_segments d'un résultat
+    """
+    if not speech_map:
+        return result
+    starts = [trimmed_start for trimmed_start, _ in speech_map]
+
+    def restore(item):
+        item = dict(item)
+        for key in ("start", "end"):
+            if item.get(key) is not None:
+                item[key] = restore_timestamp(item[key], speech_map, starts, key == "end")
+        return item
+
+    restored = dict(result)
+    restored["segments"] = []
+    for segment in result.get("segments", []):
+        segment = restore(segment)
+        if "words" in segment:
+            segment["words"] = [restore(word) for word in segment["words"]]
+        restored["segments"].append(segment)
+    if "word_segments" in result:
+        restored["word_segments"] = [restore(word) for word in result["word_segments"]]
+    return restored
+
+
+# ===================================================================
+# ÉTAPES DU PIPELINE DE TRANSCRIPTION
+# ===================================================================
+def build_transcribe_options(language):
+    """
+    Options de transcription communes (le vocabulaire passe par prompted_model)
+    """
+    return {
+        "language": language,
+        "task": "transcribe",
+        "batch_size": BATCH_SIZE
+    }
+
+
+# Pipelines avec prompt: pipeline du MODEL_CACHE -> {jeu: (prompt, copie)}
+# Disparaissent avec le pipeline quand il est évincé du cache
+PROMPTED_PIPELINES = weakref.WeakKeyDictionary()
+
+
+def prompted_model(model_whisper, vocabulary=None):
+    """
+    Pipeline whisperx qui applique le prompt du jeu de vocabulaire
+
+    FasterWhisperPipeline.transcribe n'accepte pas d'initial_prompt: le prompt
+    fait partie des options du pipeline (TranscriptionOptions). Chaque jeu a
+    sa copie superficielle du pipeline, qui partage le modèle CTranslate2, le
+    VAD et le tokenizer: les jobs concurrents ne modifient jamais les options
+    d'un pipeline partagé. La copie est refaite quand le prompt change.
+    """
+    prompt = get_vocabulary_prompt(vocabulary)
+    name = vocabulary or DEFAULT_VOCABULARY
+    with VOCABULARY_LOCK:
+        per_set = PROMPTED_PIPELINES.setdefault(model_whisper, {})
+        cached = per_set.get(name)
+        if cached is not None and cached[0] == prompt:
+            return cached[1]
+        prompted = copy.copy(model_whisper)
+        options = model_whisper.options
+        # dataclass depuis faster-whisper 1.0, NamedTuple avant
+        if dataclasses.is_dataclass(options):
+            prompted.options = dataclasses.replace(options, initial_prompt=prompt)
+        else:
+            prompted.options = options._replace(initial_prompt=prompt)
+        per_set[name] = (prompt, prompted)
+    return prompted
+
+
+def cleanup_audio(job_id, audio_path):
+    """
+    Supprime le fichier audio temporaire d'un job
+    """
+    try:
+        os.remove(audio_path)
+        logger.info(f"[Job {job_id}] Cleaned up temporary file: {audio_path}")
+    except Exception as e:
+        logger.warning(f"[Job {job_id}] Could not delete temp file: {e}")
+
+
+def mark_failed(job_id, audio_path, error):
+    """
+    Enregistre l'échec d'un job dans Redis et nettoie son fichier audio
+    """
+    logger.error(f"[Job {job_id}] ❌ Error: {str(error)}", exc_info=error)
+
+    # Sauvegarder l'erreur
+    JobStatusWriter(job_id).update(status="failed", error=str(error), step="Error")
+    count_job("failed")
+
+    # Nettoyer le fichier même en cas d'erreur
+    try:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+    except:
+        pass
+
+
+def save_result(job_id, result, model_name, language, metrics=None, cached=False, vocabulary=None):
+    """
+    Écrit le résultat final (voir encode_result) et le statut "completed"
+    dans le hash du job
+    """
+    metrics = metrics or JobMetrics(job_id)
+    logger.info(f"[Job {job_id}] Saving result")
+    with metrics.stage("serialize"):
+        result_fields, pages = encode_result(result)
+
+    # Résultat + statut final (+ champs d'état en attente) en une transaction;
+    # l'événement publié ne porte que l'état, pas le résultat
+    with metrics.stage("redis_write"):
+        with metrics.status.transaction() as pipe:
+            if pages:
+                result_fields.update(write_result_pages(job_id, pages, pipe))
+                pipe.hdel(f"job:{job_id}", "result")
+            pipe.hset(f"job:{job_id}", mapping=result_fields)
+            invalidate_outputs(job_id, pipe)
+            metrics.status.write(
+                pipe,
+                status="completed",
+                progress="100",
+                step="Done (cached)" if cached else "Done",
+                model_used=model_name,
+                language_used=language,
+                custom_vocab="yes" if get_vocabulary_prompt(vocabulary) else "no",
+                vocabulary=vocabulary or DEFAULT_VOCABULARY,
+                cache_hit="yes" if cached else "no"
+            )
+
+    metrics.flush()
+    count_job("cached" if cached else "completed")
+
+
+def complete_transcription(job_id, audio_path, result, audio, model_name, language, diarize,
+                           metrics=None, speech_map=None, vocabulary=None):
+    """
+    Termine un job à partir du résultat ASR: alignement, diarization,
+    sauvegarde dans Redis et nettoyage du fichier audio
+
+    Avec une speech map (voir trim_silence), alignement et diarization
+    travaillent sur l'audio réduit; les timestamps sont ensuite ramenés sur
+    la timeline d'origine.
+    """
+    metrics = metrics or JobMetrics(job_id)
+    status = metrics.status
+    status.update(progress="60", step="Aligning timestamps (French)")
+
+    # 4. Aligner les timestamps POUR LE FRANÇAIS (modèle depuis le cache)
+    logger.info(f"[Job {job_id}] Aligning timestamps for French")
+    with metrics.stage("align_model"):
+        model_a, metadata = get_align_model(language)
+    with metrics.stage("align"):
+        result = whisperx.align(
+            result['segments'],
+            model_a,
+            metadata,
+            audio,
+            DEVICE,
+            return_char_alignments=False
+        )
+
+    # Écrit avec l'étape suivante (diarization ou sauvegarde)
+    status.set(progress="80")
+
+    # 5. Diarization (optionnel)
+    if diarize and HF_TOKEN:
+        status.update(step="Speaker diarization")
+        logger.info(f"[Job {job_id}] Speaker diarization")
+
+        with metrics.stage("diarize_model"):
+            diarize_model = get_diarize_pipeline()
+        with metrics.stage("diarize"):
+            diarize_segments = diarize_model(audio)
+            result = whisperx.assign_word_speakers(diarize_segments, result)
+
+        status.set(progress="95")
+
+    result = restore_timeline(result, speech_map)
+
+    # 6. Sauvegarder le résultat
+    save_result(job_id, result, model_name, language, metrics, vocabulary=vocabulary)
+
+    # Nettoyer le fichier audio temporaire
+    cleanup_audio(job_id, audio_path)
+
+    logger.info(f"[Job {job_id}] ✅ Transcription completed successfully (large-v3 French)")
+    logger.info(f"[Job {job_id}] Cache stats: {get_cache_stats()}")
+    return result
+
+
+def transcribe_stage(job_id, audio_path, model_name, language, metrics=None, vocabulary=None):
+    """
+    Étapes 1 à 3 d'un job: modèle, audio (silences réduits), ASR
+    Returns: tuple (result, audio, speech_map)
+    """
+    metrics = metrics or JobMetrics(job_id)
+    status = metrics.status
+    # Vérifier que le fichier existe
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    # Mettre à jour le statut: processing
+    status.update(status="processing", progress="0", step="Loading model (large-v3)")
+
+    # 1. Charger le modèle DEPUIS LE CACHE
+    logger.info(f"[Job {job_id}] Loading cached model: {model_name}")
+    with metrics.stage("model_fetch"):
+        model_whisper = get_model(model_name)
+
+    status.update(progress="20", step="Loading audio")
+
+    # 2. Charger l'audio
+    logger.info(f"[Job {job_id}] Loading audio")
+    with metrics.stage("decode"):
+        audio = load_job_audio(audio_path)
+    metrics.audio_seconds = len(audio) / SAMPLE_RATE
+
+    # 2b. Réduire les longs silences (timestamps restaurés après l'alignement)
+    with metrics.stage("vad"):
+        audio, speech_map, skipped = trim_silence(audio)
+    metrics.add_vad_skipped(skipped)
+    if speech_map:
+        logger.info(f"[Job {job_id}] VAD skipped {skipped:.1f}s of silence "
+                    f"({skipped / metrics.audio_seconds:.0%})")
+
+    status.update(progress="30", step="Transcribing with custom vocabulary")
+
+    # 3. Transcrire AVEC CUSTOM VOCABULARY
+    logger.info(f"[Job {job_id}] Transcribing with large-v3 + custom vocab")
+    model_whisper = prompted_model(model_whisper, vocabulary)
+    if model_whisper.options.initial_prompt:
+        logger.info(f"[Job {job_id}] Using custom vocabulary prompt ({vocabulary or DEFAULT_VOCABULARY})")
+
+    with metrics.stage("asr"):
+        result = model_whisper.transcribe(audio, **build_transcribe_options(language))
+    return result, audio, speech_map
+
+
+def run_transcription(job_id, audio_path, model_name, language, diarize, metrics=None, vocabulary=None):
+    """
+    Chemin mono-job: un fichier, une passe ASR
+    """
+    metrics = metrics or JobMetrics(job_id)
+    try:
+        result, audio, speech_map = transcribe_stage(job_id, audio_path, model_name, language, metrics,
+                                                     vocabulary)
+        return complete_transcription(job_id, audio_path, result, audio, model_name, language,
+                                      diarize, metrics, speech_map, vocabulary)
+
+    except Exception as e:
+        mark_failed(job_id, audio_path, e)
+        raise
+
+
+# ===================================================================
+# MODE STREAMING: DÉCODAGE ET TRANSCRIPTION PAR FENÊTRES
+# ===================================================================
+# Pour les longs enregistrements: l'audio est décodé par fenêtres via un pipe
+# ffmpeg (RSS bornée quelle que soit la durée) et chaque fenêtre alignée est
+# publiée immédiatement dans le stream Redis job:{id}:segments.
+STREAM_WINDOW_SECONDS = float(os.getenv('STREAM_WINDOW_SECONDS', '60'))
+# Durée à partir de laquelle le streaming est activé automatiquement (0 = jamais)
+STREAM_MIN_DURATION = float(os.getenv('STREAM_MIN_DURATION', '900'))
+STREAM_TTL_SECONDS = int(os.getenv('STREAM_TTL_SECONDS', str(24 * 3600)))
+
+# La coupure d'une fenêtre se fait au point le plus silencieux de ses dernières secondes
+STREAM_SPLIT_SEARCH_SECONDS = 5.0
+STREAM_SPLIT_FRAME_SECONDS = 0.02
+
+
+def probe_duration(audio_path):
+    """
+    Durée d'un fichier audio via ffprobe, sans le décoder
+    (en-tête .npy pour un PCM partagé)
+    Returns: float (secondes) ou None si inconnue
+    """
+    if is_shared_audio(audio_path):
+        try:
+            return len(np.load(audio_path, mmap_mode='r')) / SAMPLE_RATE
+        except (OSError, ValueError):
+            return None
+    try:
+        output = subprocess.run([
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            audio_path
+        ], check=True, capture_output=True, text=True, timeout=30).stdout
+        return float(output.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def quietest_split(samples, search_seconds=STREAM_SPLIT_SEARCH_SECONDS):
+    """
+    Index de coupure au point de plus faible énergie dans les dernières
+    `search_seconds` de la fenêtre, pour ne pas couper un mot
+    """
+    frame = int(STREAM_SPLIT_FRAME_SECONDS * SAMPLE_RATE)
+    search = min(len(samples), int(search_seconds * SAMPLE_RATE))
+    start = len(samples) - search
+    frames = search // frame
+    if frames < 2:
+        return len(samples)
+    tail = samples[start:start + frames * frame].reshape(frames, frame)
+    energy = np.square(tail).mean(axis=1)
+    return start + int(np.argmin(energy)) * frame + frame // 2
+
+
+def iter_audio_windows(audio_path, window_seconds=STREAM_WINDOW_SECONDS, start_seconds=0.0):
+    """
+    Décode l'audio via un pipe ffmpeg (même format que whisperx.load_audio)
+    et produit des fenêtres (offset_secondes, samples float32)
+
+    La fin de chaque fenêtre après le point de coupure est reportée sur la suivante.
+    `start_seconds` reprend le décodage en cours de fichier (job préempté).
+    """
+    if is_shared_audio(audio_path):
+        yield from iter_shared_windows(audio_path, window_seconds, start_seconds)
+        return
+
+    seek = ["-ss", f"{start_seconds:.3f}"] if start_seconds else []
+    process = subprocess.Popen([
+        "ffmpeg", "-nostdin",
+        "-threads", "0",
+        *seek,
+        "-i", audio_path,
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(SAMPLE_RATE),
+        "-"
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    window_samples = int(window_seconds * SAMPLE_RATE)
+    carry = np.zeros(0, dtype=np.float32)
+    offset = 0
+    try:
+        while True:
+            wanted = (window_samples - len(carry)) * 2
+            raw = process.stdout.read(wanted)
+            raw = raw[:len(raw) - len(raw) % 2]
+            chunk = np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+            samples = np.concatenate((carry, chunk))
+
+            if len(raw) < wanted:
+                if len(samples):
+                    yield start_seconds + offset / SAMPLE_RATE, samples
+                break
+
+            split = quietest_split(samples)
+            yield start_seconds + offset / SAMPLE_RATE, samples[:split]
+            carry = samples[split:].copy()
+            offset += split
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+    if process.returncode not in (0, -9):
+        raise RuntimeError(f"ffmpeg failed to decode {audio_path} (code {process.returncode})")
+
+
+def iter_shared_windows(audio_path, window_seconds=STREAM_WINDOW_SECONDS, start_seconds=0.0):
+    """
+    Fenêtres d'un PCM partagé (.npy mappé): mêmes coupures que
+    iter_audio_windows, sans décodage ni copie
+    """
+    samples = np.load(audio_path, mmap_mode='r')
+    window_samples = int(window_seconds * SAMPLE_RATE)
+    position = int(start_seconds * SAMPLE_RATE)
+    while position < len(samples):
+        window = samples[position:position + window_samples]
+        split = len(window) if len(window) < window_samples else quietest_split(window)
+        yield position / SAMPLE_RATE, window[:split]
+        position += split
+
+
+def shift_segments(segments, offset):
+    """
+    Décale les timestamps des segments (et de leurs mots) de `offset` secondes
+    """
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        for key in ("start", "end"):
+            if key in segment:
+                segment[key] = round(segment[key] + offset, 3)
+        if "words" in segment:
+            segment["words"] = [
+                {k: (round(v + offset, 3) if k in ("start", "end") else v) for k, v in word.items()}
+                for word in segment["words"]
+            ]
+        shifted.append(segment)
+    return shifted
+
+
+def publish_segments(job_id, segments, pipe):
+    """
+    Ajoute des segments partiels au stream Redis job:{id}:segments
+    (dans le pipeline `pipe`, exécuté par l'appelant)
+    """
+    stream_key = f"job:{job_id}:segments"
+    for segment in segments:
+        pipe.xadd(stream_key, {
+            "start": segment.get("start", ""),
+            "end": segment.get("end", ""),
+            "text": segment.get("text", ""),
+            "words": json.dumps(segment.get("words", []), ensure_ascii=False)
+        })
+    pipe.expire(stream_key, STREAM_TTL_SECONDS)
+
+
+def should_stream(audio_path, diarize, stream=None):
+    """
+    Décide si un job passe en streaming: demandé explicitement, ou audio
+    plus long que STREAM_MIN_DURATION. La diarization a besoin de
+    l'enregistrement complet et désactive le streaming.
+    """
+    if diarize and HF_TOKEN:
+        return False
+    if stream is not None:
+        return bool(stream)
+    if STREAM_MIN_DURATION <= 0:
+        return False
+    duration = probe_duration(audio_path)
+    return duration is not None and duration >= STREAM_MIN_DURATION
+
+
+def read_published_segments(job_id):
+    """
+    Relit les segments déjà publiés dans job:{id}:segments (reprise d'un job préempté)
+    """
+    segments = []
+    for _, fields in redis_conn.xrange(f"job:{job_id}:segments"):
+        fields = {k.decode(): v.decode('utf-8') for k, v in fields.items()}
+        segment = {"text": fields.get("text", ""), "words": json.loads(fields.get("words") or "[]")}
+        for key in ("start", "end"):
+            if fields.get(key):
+                segment[key] = float(fields[key])
+        segments.append(segment)
+    return segments
+
+
+def run_streaming_transcription(job_id, audio_path, model_name, language, metrics=None,
+                                origin=None, resume_from=None, vocabulary=None):
+    """
+    Chemin streaming: transcription + alignement fenêtre par fenêtre,
+    segments publiés au fil de l'eau dans job:{id}:segments
+
+    Un job de la queue longue cède la place aux jobs courts entre deux
+    fenêtres (PREEMPT_LONG_JOBS): il est remis en tête de sa queue avec
+    `resume_from` et reprend à partir des segments déjà publiés.
+
+    Returns: le résultat, ou None si le job a été préempté
+    """
+    metrics = metrics or JobMetrics(job_id)
+    # Les mesures des étapes précédentes sont déjà dans job:{id}:metrics
+    metrics.resumed = bool(resume_from)
+    status = metrics.status
+    try:
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        with status.transaction() as pipe:
+            status.set(status="processing", progress="0", step="Loading model (large-v3)",
+                       segments_stream=f"job:{job_id}:segments")
+            if not resume_from:
+                pipe.delete(f"job:{job_id}:segments")
+        if resume_from:
+            all_segments = read_published_segments(job_id)
+            logger.info(f"[Job {job_id}] Resuming at {resume_from:.0f}s ({len(all_segments)} segments)")
+        else:
+            all_segments = []
+
+        with metrics.stage("model_fetch"):
+            model_whisper = get_model(model_name)
+        with metrics.stage("align_model"):
+            model_a, metadata = get_align_model(language)
+        duration = probe_duration(audio_path)
+        model_whisper = prompted_model(model_whisper, vocabulary)
+        transcribe_options = build_transcribe_options(language)
+
+        logger.info(f"[Job {job_id}] Streaming transcription in {STREAM_WINDOW_SECONDS:.0f}s windows")
+        processed = resume_from or 0.0
+        windows = iter_audio_windows(audio_path, start_seconds=resume_from or 0.0)
+        status.update(step=f"Streaming transcription ({processed:.0f}s)")
+        while True:
+            with metrics.stage("decode"):
+                item = next(windows, None)
+            if item is None:
+                break
+            offset, window = item
+
+            segments = []
+            with metrics.stage("vad"):
+                speech, speech_map, skipped = trim_silence(window)
+            metrics.add_vad_skipped(skipped)
+            with metrics.stage("asr"):
+                result = model_whisper.transcribe(speech, **transcribe_options)
+            if result["segments"]:
+                with metrics.stage("align"):
+                    aligned = whisperx.align(
+                        result["segments"],
+                        model_a,
+                        metadata,
+                        speech,
+                        DEVICE,
+                        return_char_alignments=False
+                    )
+                segments = shift_segments(restore_timeline(aligned, speech_map)["segments"], offset)
+                all_segments.extend(segments)
+
+            # Segments de la fenêtre + avancement: un seul aller-retour par fenêtre
+            processed = offset + len(window) / SAMPLE_RATE
+            with metrics.stage("redis_write"):
+                with status.transaction() as pipe:
+                    if segments:
+                        publish_segments(job_id, segments, pipe)
+                    status.set(step=f"Streaming transcription ({processed:.0f}s)")
+                    if duration:
+                        status.set(progress=str(min(95, int(processed / duration * 95))))
+
+            # Préemption: des jobs courts attendent et il reste de l'audio
+            if origin == LONG_QUEUE and PREEMPT_LONG_JOBS and short_jobs_waiting() and (
+                    duration is None or processed < duration - 1):
+                windows.close()
+                status.update(status="queued", step=f"Paused for short jobs (resume at {processed:.0f}s)")
+                Queue(LONG_QUEUE, connection=redis_conn).enqueue_call(
+                    TRANSCRIPTION_FUNC,
+                    args=(job_id, audio_path),
+                    kwargs={"stream": True, "resume_from": processed, "vocabulary": vocabulary},
+                    timeout=LONG_JOB_TIMEOUT,
+                    at_front=True
+                )
+                logger.info(f"[Job {job_id}] ⏸️  Preempted at {processed:.0f}s for short jobs")
+                metrics.audio_seconds = processed - (resume_from or 0.0)
+                metrics.flush(final=False)
+                return None
+
+        # Audio de cette étape seulement: les précédentes sont déjà comptées
+        metrics.audio_seconds = processed - (resume_from or 0.0)
+        # Même forme que le résultat de whisperx.align (chemin mono-job)
+        result = {"segments": all_segments, "word_segments": word_segments(all_segments), "language": language}
+        save_result(job_id, result, model_name, language, metrics, vocabulary=vocabulary)
+        cleanup_audio(job_id, audio_path)
+
+        logger.info(f"[Job {job_id}] ✅ Streaming transcription completed ({len(all_segments)} segments)")
+        return result
+
+    except Exception as e:
+        mark_failed(job_id, audio_path, e)
+        raise
+
+
+def transcribe_single(job_id, audio_path, model_name, language, diarize, stream=None, metrics=None,
+                      origin=None, resume_from=None, vocabulary=None):
+    """
+    Traite un job seul, en streaming ou en décodage complet
+    """
+    if resume_from or should_stream(audio_path, diarize, stream):
+        return run_streaming_transcription(job_id, audio_path, model_name, language, metrics,
+                                           origin, resume_from, vocabulary)
+    return run_transcription(job_id, audio_path, model_name, language, diarize, metrics, vocabulary)
+
+
+# ===================================================================
+# CACHE DES RÉSULTATS (adressé par contenu)
 # ===================================================================
-REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
-DEVICE = 'cpu'
-COMPUTE_TYPE = 'int8'
-HF_TOKEN = os.getenv('HF_TOKEN', None)
+# Clé = SHA-256 des octets du fichier + modèle + langue + prompt + diarization:
+# un même audio ré-uploadé (retry, flux n8n dupliqué) est servi sans ASR.
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600)))  # 0 = désactivé
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1000'))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', str(16 * 1024 ** 2)))
 
-# MODÈLE OPTIMISÉ: large-v3 français uniquement
-DEFAULT_MODEL = "large-v3"
-DEFAULT_LANGUAGE = "fr"
+RESULT_CACHE_PREFIX = "transcription_cache"
+RESULT_CACHE_LRU_KEY = f"{RESULT_CACHE_PREFIX}:lru"
+RESULT_CACHE_STATS_KEY = f"{RESULT_CACHE_PREFIX}:stats"
 
-# Custom vocabulary - Mots techniques/spécifiques
-CUSTOM_VOCABULARY_FILE = Path("/app/custom_vocabulary.txt")
 
-def load_custom_vocabulary():
+def result_cache_key(audio_path, model_name, language, diarize, vocabulary=None):
     """
-    Charge le vocabulaire personnalisé depuis le fichier
-    Returns: str - Prompt avec les mots personnalisés
+    Calcule la clé de cache d'un job (None si le cache est désactivé
+    ou si le fichier est introuvable)
+
+    La clé porte le texte du prompt, pas le nom du jeu: un vocabulaire
+    modifié ne sert jamais un résultat obtenu avec l'ancien.
     """
-    if not CUSTOM_VOCABULARY_FILE.exists():
-        logger.warning("Custom vocabulary file not found, using default")
+    if RESULT_CACHE_TTL <= 0 or not os.path.exists(audio_path):
         return None
 
+    digest = hashlib.sha256()
+    with open(audio_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+
+    params = [model_name, language, get_vocabulary_prompt(vocabulary) or "", bool(diarize and HF_TOKEN)]
+    digest.update(b"\0" + json.dumps(params, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def lookup_cached_result(cache_key):
+    """
+    Retourne le résultat en cache (dict) ou None, et met à jour les compteurs
+    """
+    if cache_key is None:
+        return None
     try:
-        with open(CUSTOM_VOCABULARY_FILE, 'r', encoding='utf-8') as f:
-            words = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        cached = redis_conn.get(f"{RESULT_CACHE_PREFIX}:{cache_key}")
+        with redis_conn.pipeline() as pipe:
+            pipe.hincrby(RESULT_CACHE_STATS_KEY, "hits" if cached else "misses", 1)
+            if cached:
+                pipe.zadd(RESULT_CACHE_LRU_KEY, {cache_key: time.time()})
+                pipe.expire(f"{RESULT_CACHE_PREFIX}:{cache_key}", RESULT_CACHE_TTL)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        return None
 
-        if words:
-            # Créer un prompt pour guider Whisper
-            prompt = f"Vocabulaire technique: {', '.join(words[:50])}"  # Limiter à 50 mots
-            logger.info(f"Loaded {len(words)} custom words for vocabulary guidance")
-            return prompt
-        else:
-            logger.warning("Custom vocabulary file is empty")
-            return None
+    if not cached:
+        return None
+    # Valeur stockée: "<codec>\n<payload compressé>"
+    try:
+        codec, payload = cached.split(b"\n", 1)
+        return decode_payload(payload, codec.decode())
     except Exception as e:
-        logger.error(f"Error loading custom vocabulary: {e}")
+        logger.warning(f"Unreadable result cache entry {cache_key[:12]}: {e}")
         return None
 
-# Charger le vocabulaire au démarrage
-CUSTOM_PROMPT = load_custom_vocabulary()
 
-# Connecter à Redis
-redis_conn = redis.from_url(REDIS_URL)
+def store_cached_result(cache_key, result):
+    """
+    Enregistre un résultat dans le cache et évince les entrées les moins récentes
+    """
+    if cache_key is None or result is None:
+        return
+    payload = RESULT_CODEC.encode() + b"\n" + encode_payload(result)
+    if len(payload) > RESULT_CACHE_MAX_ENTRY_BYTES:
+        logger.info(f"Result too large for cache ({len(payload) / 1024 ** 2:.1f} MB), skipping")
+        return
+
+    try:
+        with redis_conn.pipeline() as pipe:
+            pipe.set(f"{RESULT_CACHE_PREFIX}:{cache_key}", payload, ex=RESULT_CACHE_TTL)
+            pipe.zadd(RESULT_CACHE_LRU_KEY, {cache_key: time.time()})
+            pipe.hincrby(RESULT_CACHE_STATS_KEY, "stores", 1)
+            pipe.execute()
+
+        # Éviction LRU au-delà de RESULT_CACHE_MAX_ENTRIES (les entrées expirées
+        # par TTL sont aussi retirées de l'index au passage)
+        overflow = redis_conn.zcard(RESULT_CACHE_LRU_KEY) - RESULT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            stale = redis_conn.zrange(RESULT_CACHE_LRU_KEY, 0, overflow - 1)
+            with redis_conn.pipeline() as pipe:
+                for key in stale:
+                    pipe.delete(f"{RESULT_CACHE_PREFIX}:{key.decode()}")
+                pipe.zrem(RESULT_CACHE_LRU_KEY, *stale)
+                pipe.hincrby(RESULT_CACHE_STATS_KEY, "evictions", len(stale))
+                pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Result cache store failed: {e}")
+
+
+def serve_cached_result(job_id, audio_path, cache_key, model_name, language, metrics=None,
+                        vocabulary=None):
+    """
+    Sur un hit, remplit directement le hash du job et nettoie l'audio
+    Returns: le résultat (dict) ou None si absent du cache
+    """
+    cached = lookup_cached_result(cache_key)
+    if cached is None:
+        return None
+
+    logger.info(f"[Job {job_id}] ⚡ Result served from cache ({cache_key[:12]})")
+    save_result(job_id, cached, model_name, language, metrics, cached=True, vocabulary=vocabulary)
+    cleanup_audio(job_id, audio_path)
+    return cached
+
+
+def get_result_cache_stats():
+    """
+    Compteurs du cache de résultats + taux de hit
+    """
+    try:
+        stats = {k.decode(): int(v) for k, v in redis_conn.hgetall(RESULT_CACHE_STATS_KEY).items()}
+        stats["entries"] = redis_conn.zcard(RESULT_CACHE_LRU_KEY)
+    except redis.RedisError:
+        return {}
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 3) if lookups else 0.0
+    return stats
+
 
 # ===================================================================
-# CACHE DU MODÈLE (Chargé une seule fois au démarrage)
+# MODE BATCH: PLUSIEURS JOBS COURTS DANS UNE SEULE PASSE ASR
 # ===================================================================
-MODEL_CACHE = {}
+# BATCH_MAX_JOBS=1 désactive le mode batch (comportement historique)
+BATCH_MAX_JOBS = int(os.getenv('BATCH_MAX_JOBS', '1'))
+BATCH_MAX_WAIT_MS = int(os.getenv('BATCH_MAX_WAIT_MS', '500'))
+BATCH_MAX_AUDIO_SECONDS = float(os.getenv('BATCH_MAX_AUDIO_SECONDS', '120'))
 
-def get_model(model_name=DEFAULT_MODEL):
+# Silence inséré entre deux fichiers: plus long que les chunks VAD de whisperx
+# (30 s), aucun segment ne peut donc chevaucher deux jobs
+BATCH_GAP_SECONDS = 31.0
+
+
+def pop_transcription_job(queue):
     """
-    Récupère le modèle depuis le cache ou le charge
+    Retire le prochain job de la queue RQ (sans le démarrer, voir start_rq_job)
+
+    Returns: (rq_job, kwargs de process_transcription), (rq_job, None) si le
+    job n'est pas une transcription, ou None si la queue est vide
     """
-    if model_name not in MODEL_CACHE:
-        logger.info(f"Loading model '{model_name}' into cache...")
-        MODEL_CACHE[model_name] = whisperx.load_model(
-            model_name,
-            DEVICE,
-            compute_type=COMPUTE_TYPE
-        )
-        logger.info(f"✅ Model '{model_name}' loaded and cached")
-    return MODEL_CACHE[model_name]
+    while True:
+        rq_job_id = queue.pop_job_id()
+        if rq_job_id is None:
+            return None
+        try:
+            rq_job = Job.fetch(rq_job_id, connection=redis_conn)
+            break
+        except NoSuchJobError:
+            continue
+
+    kwargs = None
+    if rq_job.func_name.endswith('process_transcription'):
+        try:
+            bound = inspect.signature(process_transcription).bind(*rq_job.args, **rq_job.kwargs)
+            kwargs = dict(bound.arguments)
+        except TypeError:
+            pass
+    return rq_job, kwargs
+
+
+def start_rq_job(queue, rq_job, ttl=None):
+    """
+    Marque un job dépilé hors du worker RQ comme démarré et l'inscrit dans le
+    StartedJobRegistry, comme le fait le worker: si le processus meurt avant
+    finish_rq_job, le nettoyage du registre le passe en échec au lieu de le perdre
+
+    ttl: durée de l'inscription, par défaut le timeout du job + 60 s
+    """
+    if ttl is None:
+        timeout = rq_job.timeout or Queue.DEFAULT_TIMEOUT
+        ttl = -1 if timeout == -1 else timeout + 60
+    with redis_conn.pipeline() as pipe:
+        rq_job.started_at = utcnow()
+        rq_job.set_status(JobStatus.STARTED, pipeline=pipe)
+        rq_job.save(pipeline=pipe, include_meta=False)
+        queue.started_job_registry.add(rq_job, ttl, pipeline=pipe)
+        pipe.execute()
+
+
+def batchable(kwargs, vocabulary=None):
+    """
+    Un job peut-il rejoindre une passe batch: ni streaming ni reprise, même
+    vocabulaire, audio court. Les autres seraient transcrits un par un dans le
+    job courant et dépasseraient son timeout: ils restent dans la queue.
+    """
+    if kwargs.get("stream") or kwargs.get("resume_from") or kwargs.get("vocabulary") != vocabulary:
+        return False
+    if not os.path.exists(kwargs["audio_path"]):
+        return True  # échec immédiat, sans transcription
+    duration = probe_duration(kwargs["audio_path"])
+    return duration is not None and duration <= BATCH_MAX_AUDIO_SECONDS
+
+
+def drain_pending_jobs(queue, limit, max_wait_ms, vocabulary=None, ttl=None):
+    """
+    Retire jusqu'à `limit` jobs de transcription batchables en attente dans la
+    queue RQ, en attendant au plus `max_wait_ms` que d'autres jobs arrivent
+    Les jobs retirés sont démarrés (start_rq_job) avec le TTL `ttl`
+
+    Returns: list de (rq_job, kwargs de process_transcription)
+    """
+    drained = []
+    deadline = time.monotonic() + max_wait_ms / 1000
+
+    while len(drained) < limit:
+        popped = pop_transcription_job(queue)
+        if popped is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.05, remaining))
+            continue
+
+        # Un job d'un autre type ou non batchable: le remettre en tête et
+        # arrêter le drain (il sera traité par un worker, dans l'ordre)
+        rq_job, kwargs = popped
+        if kwargs is None or not batchable(kwargs, vocabulary):
+            queue.push_job_id(rq_job.id, at_front=True)
+            break
+        start_rq_job(queue, rq_job, ttl)
+        drained.append((rq_job, kwargs))
+
+    return drained
+
+
+def finish_rq_job(queue, rq_job, error=None):
+    """
+    Marque un job RQ drainé comme terminé (ou en échec) dans les registres RQ
+    """
+    with redis_conn.pipeline() as pipe:
+        rq_job.ended_at = utcnow()
+        queue.started_job_registry.remove(rq_job, pipeline=pipe)
+        if error is None:
+            rq_job.set_status(JobStatus.FINISHED, pipeline=pipe)
+            ttl = rq_job.result_ttl if rq_job.result_ttl is not None else DEFAULT_RESULT_TTL
+            queue.finished_job_registry.add(rq_job, ttl, pipeline=pipe)
+        else:
+            rq_job.set_status(JobStatus.FAILED, pipeline=pipe)
+            queue.failed_job_registry.add(rq_job, ttl=rq_job.failure_ttl,
+                                          exc_string=repr(error), pipeline=pipe)
+        rq_job.save(pipeline=pipe, include_meta=False)
+        pipe.execute()
+
+
+def transcribe_batch(entries, model_name=DEFAULT_MODEL, language=DEFAULT_LANGUAGE, vocabulary=None):
+    """
+    Transcrit plusieurs jobs en une seule passe ASR
+
+    Les audios courts sont concaténés avec des silences de BATCH_GAP_SECONDS:
+    la VAD de whisperx découpe les segments et le pipeline batché les traite
+    ensemble, puis les segments sont redistribués à chaque job.
+    Les audios trop longs repassent par le chemin mono-job.
+
+    Le temps de la passe ASR commune est compté entièrement dans les
+    métriques de chaque job: c'est la latence qu'il a subie.
+
+    Un job d'un autre jeu de vocabulaire que `vocabulary` (le prompt est
+    commun à toute la passe) est traité seul.
+
+    Args:
+        entries: list de dict {job_id, audio_path, diarize, stream, vocabulary, rq_job, metrics}
+            (metrics: JobMetrics déjà créé pour le job, sinon créé ici)
+    Returns:
+        dict job_id -> résultat (ou exception en cas d'échec)
+    """
+    outcomes = {}
+    batch = []
+    model_whisper = get_model(model_name)
+
+    for entry in entries:
+        job_id, audio_path = entry["job_id"], entry["audio_path"]
+        # Un seul JobMetrics par job: le créer compte son attente en queue
+        metrics = entry.get("metrics") or JobMetrics(job_id, entry.get("rq_job"))
+        entry["metrics"] = metrics
+
+        # Les audios longs (sondés sans décodage) repassent par le chemin mono-job
+        duration = probe_duration(audio_path) if os.path.exists(audio_path) else None
+        if entry.get("stream") or entry.get("vocabulary") != vocabulary or (
+                duration is not None and duration > BATCH_MAX_AUDIO_SECONDS):
+            rq_job = entry.get("rq_job")
+            try:
+                outcomes[job_id] = transcribe_single(job_id, audio_path, model_name, language,
+                                                     entry["diarize"], entry.get("stream"), metrics,
+                                                     getattr(rq_job, "origin", None),
+                                                     entry.get("resume_from"), entry.get("vocabulary"))
+            except Exception as e:
+                outcomes[job_id] = e
+            continue
+
+        try:
+            if not os.path.exists(audio_path):
+                raise FileNotFoundError(f"Audio file not found: {audio_path}")
+            metrics.status.update(status="processing", progress="20", step="Loading audio (batch)")
+            with metrics.stage("decode"):
+                audio = load_job_audio(audio_path)
+            metrics.audio_seconds = len(audio) / SAMPLE_RATE
+            with metrics.stage("vad"):
+                audio, entry["speech_map"], skipped = trim_silence(audio)
+            metrics.add_vad_skipped(skipped)
+        except Exception as e:
+            mark_failed(job_id, audio_path, e)
+            outcomes[job_id] = e
+            continue
+
+        batch.append((entry, audio))
+
+    if not batch:
+        return outcomes
+
+    logger.info(f"Transcribing batch of {len(batch)} jobs in one pass")
+    gap = np.zeros(int(BATCH_GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+    pieces, spans, offset = [], [], 0
+    for _, audio in batch:
+        spans.append((offset / SAMPLE_RATE, len(audio) / SAMPLE_RATE))
+        pieces.extend((audio, gap))
+        offset += len(audio) + len(gap)
+
+    # Un seul aller-retour pour l'avancement de tous les jobs du batch
+    with redis_conn.pipeline() as pipe:
+        for entry, _ in batch:
+            status = entry["metrics"].status
+            status.write(pipe, progress="30",
+                         step=f"Transcribing with custom vocabulary (batch of {len(batch)})")
+            status.round_trips += 1
+            status.commands += 2
+        pipe.execute()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        combined = prompted_model(model_whisper, vocabulary).transcribe(np.concatenate(pieces),
+                                                                        **build_transcribe_options(language))
+    except Exception as e:
+        # Repli: chaque job repasse par le chemin mono-job
+        logger.error(f"Batch transcription failed, falling back to single jobs: {e}")
+        for entry, _ in batch:
+            try:
+                outcomes[entry["job_id"]] = run_transcription(
+                    entry["job_id"], entry["audio_path"], model_name, language, entry["diarize"],
+                    entry["metrics"], vocabulary)
+            except Exception as job_error:
+                outcomes[entry["job_id"]] = job_error
+        return outcomes
+
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    for entry, _ in batch:
+        entry["metrics"].record("asr", wall, cpu)
+
+    # Redistribuer les segments selon leur position dans l'audio concaténé
+    per_job = [[] for _ in batch]
+    for segment in combined["segments"]:
+        middle = (segment["start"] + segment["end"]) / 2
+        for index, (start, duration) in enumerate(spans):
+            if start <= middle < start + duration + BATCH_GAP_SECONDS:
+                per_job[index].append(dict(
+                    segment,
+                    start=round(max(0.0, segment["start"] - start), 3),
+                    end=round(min(duration, segment["end"] - start), 3)
+                ))
+                break
+
+    for (entry, audio), segments in zip(batch, per_job):
+        job_id, audio_path = entry["job_id"], entry["audio_path"]
+        result = {"segments": segments, "language": combined.get("language", language)}
+        try:
+            outcomes[job_id] = complete_transcription(
+                job_id, audio_path, result, audio, model_name, language, entry["diarize"],
+                entry["metrics"], entry.get("speech_map"), vocabulary)
+        except Exception as e:
+            mark_failed(job_id, audio_path, e)
+            outcomes[job_id] = e
+
+    return outcomes
 
 
 def process_transcription(
@@ -89,18 +2479,30 @@ def process_transcription(
     audio_path: str,
     model_name: str = DEFAULT_MODEL,  # Forcer large-v3
     language: str = DEFAULT_LANGUAGE,  # Forcer français
-    diarize: bool = False
+    diarize: bool = False,
+    stream: bool = None,
+    resume_from: float = None,
+    vocabulary: str = None
 ):
     """
     Fonction qui traite la transcription en arrière-plan
     VERSION OPTIMISÉE: large-v3 + français + custom vocabulary
 
+    Si BATCH_MAX_JOBS > 1, les jobs en attente dans la même queue sont
+    drainés et transcrits avec celui-ci en une seule passe.
+    Les longs enregistrements passent en streaming (segments partiels
+    publiés dans job:{id}:segments).
+    Un audio déjà transcrit avec les mêmes paramètres est servi depuis le cache.
+
     Args:
         job_id: ID unique du job
         audio_path: Chemin vers le fichier audio
         model_name: Modèle Whisper (forcé à large-v3)
         language: Langue de transcription (forcé à fr)
         diarize: Activer la diarization
+        stream: Forcer (True) ou désactiver (False) le streaming, auto si None
+        resume_from: Reprise d'un job long préempté (secondes déjà transcrites)
+        vocabulary: Jeu de vocabulaire nommé (VOCABULARY_DIR/{nom}.txt), défaut si None
     """
     # FORCER LE MODÈLE ET LA LANGUE
     model_name = DEFAULT_MODEL
@@ -109,126 +2511,547 @@ def process_transcription(
     logger.info(f"[Job {job_id}] Démarrage transcription optimisée")
     logger.info(f"[Job {job_id}] Modèle: {model_name}, Langue: {language}")
 
+    current_job = get_current_job()
+    metrics = JobMetrics(job_id, current_job)
+
+    # Tout ce qui précède la transcription (vocabulaire, cache, sonde de
+    # durée, drain) échoue proprement: statut "failed", audio supprimé
     try:
-        # Vérifier que le fichier existe
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        vocabulary_path(vocabulary)  # nom de jeu invalide: ValueError
+        with metrics.stage("cache_lookup"):
+            cache_key = result_cache_key(audio_path, model_name, language, diarize, vocabulary)
+        cached = serve_cached_result(job_id, audio_path, cache_key, model_name, language, metrics,
+                                     vocabulary)
+        if cached is not None:
+            return cached
 
-        # Mettre à jour le statut: processing
-        redis_conn.hset(f"job:{job_id}", mapping={
-            "status": "processing",
-            "progress": "0",
-            "step": "Loading model (large-v3)"
-        })
+        shard = should_shard(audio_path, diarize, stream, resume_from)
+        stream = not shard and (bool(resume_from) or should_stream(audio_path, diarize, stream))
+        drained = None
+        if not shard and BATCH_MAX_JOBS > 1 and current_job is not None and not stream:
+            queue = Queue(current_job.origin, connection=redis_conn)
+            # Les jobs drainés s'exécutent dans le temps de celui-ci
+            timeout = current_job.timeout or Queue.DEFAULT_TIMEOUT
+            drained = drain_pending_jobs(queue, BATCH_MAX_JOBS - 1, BATCH_MAX_WAIT_MS, vocabulary,
+                                         ttl=-1 if timeout == -1 else timeout + 60)
+    except Exception as e:
+        mark_failed(job_id, audio_path, e)
+        raise
 
-        # 1. Charger le modèle DEPUIS LE CACHE
-        logger.info(f"[Job {job_id}] Loading cached model: {model_name}")
-        model_whisper = get_model(model_name)
+    if shard:
+        return run_sharded_transcription(job_id, audio_path, model_name, language, metrics, cache_key,
+                                          getattr(current_job, "origin", None), vocabulary)
 
-        redis_conn.hset(f"job:{job_id}", "progress", "20")
-        redis_conn.hset(f"job:{job_id}", "step", "Loading audio")
+    if drained is None:
+        result = transcribe_single(job_id, audio_path, model_name, language, diarize, stream, metrics,
+                                   getattr(current_job, "origin", None), resume_from, vocabulary)
+        store_cached_result(cache_key, result)
+        return result
 
-        # 2. Charger l'audio
-        logger.info(f"[Job {job_id}] Loading audio")
-        audio = whisperx.load_audio(audio_path)
+    if not drained:
+        result = run_transcription(job_id, audio_path, model_name, language, diarize, metrics,
+                                   vocabulary)
+        store_cached_result(cache_key, result)
+        return result
 
-        redis_conn.hset(f"job:{job_id}", "progress", "30")
-        redis_conn.hset(f"job:{job_id}", "step", "Transcribing with custom vocabulary")
+    entries = [{"job_id": job_id, "audio_path": audio_path, "diarize": diarize,
+                "vocabulary": vocabulary, "cache_key": cache_key, "rq_job": current_job,
+                "metrics": metrics}]
+    pending = []
+    for rq_job, kwargs in drained:
+        sibling_diarize = kwargs.get("diarize", False)
+        sibling_vocabulary = kwargs.get("vocabulary")
+        sibling_metrics = JobMetrics(kwargs["job_id"], rq_job)
+        try:
+            vocabulary_path(sibling_vocabulary)
+            with sibling_metrics.stage("cache_lookup"):
+                sibling_key = result_cache_key(kwargs["audio_path"], model_name, language,
+                                               sibling_diarize, sibling_vocabulary)
+            served = serve_cached_result(kwargs["job_id"], kwargs["audio_path"], sibling_key, model_name,
+                                         language, sibling_metrics, sibling_vocabulary)
+        except Exception as e:
+            mark_failed(kwargs["job_id"], kwargs["audio_path"], e)
+            finish_rq_job(queue, rq_job, e)
+            continue
+        if served is not None:
+            finish_rq_job(queue, rq_job)
+            continue
+        pending.append((rq_job, kwargs))
+        entries.append({"job_id": kwargs["job_id"], "audio_path": kwargs["audio_path"],
+                        "diarize": sibling_diarize, "stream": kwargs.get("stream"),
+                        "resume_from": kwargs.get("resume_from"), "vocabulary": sibling_vocabulary,
+                        "cache_key": sibling_key, "rq_job": rq_job, "metrics": sibling_metrics})
 
-        # 3. Transcrire AVEC CUSTOM VOCABULARY
-        logger.info(f"[Job {job_id}] Transcribing with large-v3 + custom vocab")
+    outcomes = transcribe_batch(entries, model_name, language, vocabulary)
+    for entry in entries:
+        outcome = outcomes.get(entry["job_id"])
+        if not isinstance(outcome, Exception):
+            store_cached_result(entry["cache_key"], outcome)
 
-        transcribe_options = {
-            "language": language,
-            "task": "transcribe"
-        }
+    for rq_job, kwargs in pending:
+        outcome = outcomes.get(kwargs["job_id"])
+        finish_rq_job(queue, rq_job, outcome if isinstance(outcome, Exception) else None)
 
-        # Ajouter le custom prompt si disponible
-        if CUSTOM_PROMPT:
-            transcribe_options["initial_prompt"] = CUSTOM_PROMPT
-            logger.info(f"[Job {job_id}] Using custom vocabulary prompt")
+    outcome = outcomes.get(job_id)
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
 
-        result = model_whisper.transcribe(audio, **transcribe_options)
 
-        redis_conn.hset(f"job:{job_id}", "progress", "60")
-        redis_conn.hset(f"job:{job_id}", "step", "Aligning timestamps (French)")
+# ===================================================================
+# MODE SHARD: UN LONG ENREGISTREMENT RÉPARTI SUR PLUSIEURS WORKERS
+# ===================================================================
+# Le job parent (coordinateur) décode l'audio une fois en PCM partagé
+# (share_decoded_audio), le coupe sur des silences en N shards et les place
+# comme jobs enfants dans sa queue. Chaque worker libre transcrit et aligne un
+# shard; le dernier à terminer (SADD/SCARD sur job:{id}:shards:done) fusionne les
+# segments, déjà décalés de l'offset de leur shard, dans le résultat du parent.
+# SHARED_AUDIO_DIR doit être visible de tous les workers (même hôte ou volume partagé).
+SHARD_MIN_DURATION = float(os.getenv('SHARD_MIN_DURATION', '0'))  # 0 = désactivé
+SHARD_SECONDS = float(os.getenv('SHARD_SECONDS', '600'))
+SHARD_MAX = int(os.getenv('SHARD_MAX', '16'))
+SHARD_TTL_SECONDS = int(os.getenv('SHARD_TTL_SECONDS', str(24 * 3600)))
 
-        # 4. Aligner les timestamps POUR LE FRANÇAIS
-        logger.info(f"[Job {job_id}] Aligning timestamps for French")
-        model_a, metadata = whisperx.load_align_model(
-            language_code=language,  # Forcé à 'fr'
-            device=DEVICE
-        )
-        result = whisperx.align(
-            result['segments'],
-            model_a,
-            metadata,
-            audio,
-            DEVICE,
-            return_char_alignments=False
-        )
+# Chaque coupure se fait dans le plus long silence à ± N secondes de la frontière cible
+SHARD_SPLIT_SEARCH_SECONDS = 30.0
+
+SHARD_FUNC = f"{Path(__file__).stem}.process_shard"
+
+
+def should_shard(audio_path, diarize, stream=None, resume_from=None):
+    """
+    Shard si l'audio dépasse SHARD_MIN_DURATION. La diarization (locuteurs
+    cohérents sur tout l'enregistrement) et le streaming demandé l'excluent.
+    """
+    if SHARD_MIN_DURATION <= 0 or resume_from or stream or (diarize and HF_TOKEN):
+        return False
+    duration = probe_duration(audio_path)
+    return duration is not None and duration >= SHARD_MIN_DURATION
 
-        redis_conn.hset(f"job:{job_id}", "progress", "80")
 
-        # 5. Diarization (optionnel)
-        if diarize and HF_TOKEN:
-            redis_conn.hset(f"job:{job_id}", "step", "Speaker diarization")
-            logger.info(f"[Job {job_id}] Speaker diarization")
+def shard_boundaries(samples, shard_count):
+    """
+    Frontières des shards en samples: au milieu du plus long silence (VAD)
+    autour de chaque frontière cible (à égalité, le plus proche de la cible),
+    sinon au point de plus faible énergie
+    """
+    frame = int(VAD_FRAME_SECONDS * SAMPLE_RATE)
+    search = int(SHARD_SPLIT_SEARCH_SECONDS * SAMPLE_RATE)
+    bounds = [0]
+    for k in range(1, shard_count):
+        target = len(samples) * k // shard_count
+        low = max(bounds[-1] + frame, target - search)
+        region = np.asarray(samples[low:min(len(samples), target + search)])
+        speech = speech_frames(region)
+        if len(speech) == 0:
+            continue
+
+        edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+        silence_starts = np.flatnonzero(edges == -1)
+        silence_ends = np.flatnonzero(edges == 1)
+        if len(silence_starts):
+            # Plus long silence; à égalité, le plus proche de la cible (shards équilibrés)
+            lengths = silence_ends - silence_starts
+            middles = (silence_starts + silence_ends) // 2 * frame
+            longest = np.flatnonzero(lengths == lengths.max())
+            cut = int(middles[longest[np.argmin(np.abs(low + middles[longest] - target))]])
+        else:
+            cut = quietest_split(region, len(region) / SAMPLE_RATE)
+        bounds.append(low + cut)
+    bounds.append(len(samples))
+    return bounds
+
+
+def run_sharded_transcription(job_id, audio_path, model_name, language, metrics=None,
+                              cache_key=None, origin=None, vocabulary=None):
+    """
+    Coordinateur: découpe l'audio et place un job enfant par shard
+    Returns: None (le résultat est écrit par le dernier shard)
+    """
+    metrics = metrics or JobMetrics(job_id)
+    status = metrics.status
+    try:
+        status.update(status="processing", progress="0", step="Splitting audio into shards")
+        with metrics.stage("decode"):
+            if not is_shared_audio(audio_path):
+                audio_path = share_decoded_audio(job_id, audio_path)
+            samples = np.load(audio_path, mmap_mode='r')
+        duration = len(samples) / SAMPLE_RATE
+        shard_count = max(2, min(SHARD_MAX, int(np.ceil(duration / SHARD_SECONDS))))
+        with metrics.stage("shard_split"):
+            bounds = shard_boundaries(samples, shard_count)
+        shard_count = len(bounds) - 1
+
+        shards_key = f"job:{job_id}:shards"
+        with status.transaction() as pipe:
+            pipe.delete(shards_key, f"{shards_key}:done")
+            pipe.hset(shards_key, mapping={
+                "total": shard_count,
+                "audio_path": audio_path,
+                "duration": duration,
+                "model": model_name,
+                "language": language,
+                "vocabulary": vocabulary or "",
+                "cache_key": cache_key or "",
+                "codec": RESULT_CODEC,
+                "started_at": time.time() - (time.perf_counter() - metrics.started)
+            })
+            pipe.expire(shards_key, SHARD_TTL_SECONDS)
+            status.set(progress="5", step=f"Transcribing {shard_count} shards in parallel",
+                       shards=str(shard_count))
 
-            diarize_model = whisperx.DiarizationPipeline(
-                use_auth_token=HF_TOKEN,
-                device=DEVICE
+        queue = Queue(origin or LEGACY_QUEUE, connection=redis_conn)
+        queue.enqueue_many([
+            Queue.prepare_data(
+                SHARD_FUNC,
+                args=(job_id, index, bounds[index] / SAMPLE_RATE, bounds[index + 1] / SAMPLE_RATE),
+                timeout=LONG_JOB_TIMEOUT
             )
-            diarize_segments = diarize_model(audio)
-            result = whisperx.assign_word_speakers(diarize_segments, result)
+            for index in range(shard_count)
+        ])
+        logger.info(f"[Job {job_id}] Split {duration:.0f}s of audio into {shard_count} shards")
+        metrics.flush()
+        return None
 
-            redis_conn.hset(f"job:{job_id}", "progress", "95")
+    except Exception as e:
+        mark_failed(job_id, audio_path, e)
+        raise
 
-        # 6. Sauvegarder le résultat
-        logger.info(f"[Job {job_id}] Saving result")
-        result_json = json.dumps(result, ensure_ascii=False)
 
-        redis_conn.hset(f"job:{job_id}", mapping={
-            "status": "completed",
-            "progress": "100",
-            "step": "Done",
-            "result": result_json,
-            "model_used": model_name,
-            "language_used": language,
-            "custom_vocab": "yes" if CUSTOM_PROMPT else "no"
-        })
+def process_shard(parent_id: str, index: int, start: float, end: float):
+    """
+    Job enfant: transcrit et aligne les samples [start, end[ du PCM partagé
+    du job parent; le dernier shard terminé fusionne le résultat
+    """
+    shards_key, done_key = f"job:{parent_id}:shards", f"job:{parent_id}:shards:done"
+    info = {k.decode(): v.decode('utf-8') for k, v in redis_conn.hgetall(shards_key).items()
+            if not k.startswith((b"segments:", b"vad_skipped:"))}
+    if not info or redis_conn.hget(f"job:{parent_id}", "status") == b"failed":
+        logger.info(f"[Job {parent_id}] Shard {index} skipped (parent failed or expired)")
+        return None
 
-        # Nettoyer le fichier audio temporaire
-        try:
-            os.remove(audio_path)
-            logger.info(f"[Job {job_id}] Cleaned up temporary file: {audio_path}")
-        except Exception as e:
-            logger.warning(f"[Job {job_id}] Could not delete temp file: {e}")
+    audio_path, language = info["audio_path"], info["language"]
+    vocabulary = info["vocabulary"] or None
+    metrics = JobMetrics(f"{parent_id}:shard:{index}", get_current_job())
+    try:
+        with metrics.stage("model_fetch"):
+            model_whisper = get_model(info["model"])
+        with metrics.stage("decode"):
+            samples = np.load(audio_path, mmap_mode='r')
+            samples = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        with metrics.stage("vad"):
+            speech, speech_map, skipped = trim_silence(samples)
+        metrics.add_vad_skipped(skipped)
 
-        logger.info(f"[Job {job_id}] ✅ Transcription completed successfully (large-v3 French)")
-        return result
+        with metrics.stage("asr"):
+            result = prompted_model(model_whisper, vocabulary).transcribe(speech,
+                                                                          **build_transcribe_options(language))
+        segments = []
+        if result["segments"]:
+            with metrics.stage("align_model"):
+                model_a, metadata = get_align_model(language)
+            with metrics.stage("align"):
+                aligned = whisperx.align(
+                    result["segments"],
+                    model_a,
+                    metadata,
+                    speech,
+                    DEVICE,
+                    return_char_alignments=False
+                )
+            segments = shift_segments(restore_timeline(aligned, speech_map)["segments"], start)
 
+        # Idempotent: un shard ré-exécuté par RQ (job abandonné remis en
+        # queue) réécrit ses champs et n'est compté qu'une fois dans le set
+        with metrics.stage("redis_write"):
+            with redis_conn.pipeline() as pipe:
+                pipe.hset(shards_key, mapping={
+                    f"segments:{index}": encode_payload(segments, info["codec"]),
+                    f"vad_skipped:{index}": skipped,
+                })
+                pipe.expire(shards_key, SHARD_TTL_SECONDS)
+                pipe.sadd(done_key, index)
+                pipe.expire(done_key, SHARD_TTL_SECONDS)
+                pipe.scard(done_key)
+                done = pipe.execute()[-1]
     except Exception as e:
-        logger.error(f"[Job {job_id}] ❌ Error: {str(e)}", exc_info=True)
+        mark_failed(parent_id, audio_path, e)
+        raise
+    finally:
+        metrics.flush()
 
-        # Sauvegarder l'erreur
-        redis_conn.hset(f"job:{job_id}", mapping={
-            "status": "failed",
-            "error": str(e),
-            "step": "Error"
-        })
+    total = int(info["total"])
+    logger.info(f"[Job {parent_id}] Shard {index + 1}/{total} done ({done}/{total} complete)")
+    if done < total:
+        JobStatusWriter(parent_id).update(progress=str(5 + 90 * done // total),
+                                          step=f"Transcribed {done}/{total} shards")
+        return None
+    # Un seul shard fusionne, même si un doublon termine en même temps
+    if not redis_conn.hsetnx(shards_key, "merging", 1):
+        return None
+    return merge_shards(parent_id, info)
 
-        # Nettoyer le fichier même en cas d'erreur
-        try:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-        except:
-            pass
 
+def merge_shards(parent_id, info):
+    """
+    Assemble les segments des shards dans l'ordre et termine le job parent
+    """
+    shards_key = f"job:{parent_id}:shards"
+    total = int(info["total"])
+    metrics = JobMetrics(parent_id)
+    # Durée totale mesurée depuis le démarrage du coordinateur
+    metrics.started -= time.time() - float(info["started_at"])
+    metrics.audio_seconds = float(info["duration"])
+    try:
+        with metrics.stage("shard_merge"):
+            fields = redis_conn.hmget(shards_key, [f"segments:{index}" for index in range(total)] +
+                                      [f"vad_skipped:{index}" for index in range(total)])
+            payloads, skipped = fields[:total], fields[total:]
+            missing = [index for index, payload in enumerate(payloads) if payload is None]
+            if missing:
+                raise RuntimeError(f"Missing results for shards {missing}")
+            segments = []
+            for payload in payloads:
+                segments.extend(decode_payload(payload, info["codec"]))
+        metrics.vad_skipped = sum(float(value or 0) for value in skipped)
+
+        result = {"segments": segments, "word_segments": word_segments(segments), "language": info["language"]}
+        save_result(parent_id, result, info["model"], info["language"], metrics,
+                    vocabulary=info["vocabulary"] or None)
+        store_cached_result(info["cache_key"] or None, result)
+    except Exception as e:
+        mark_failed(parent_id, info["audio_path"], e)
         raise
+    finally:
+        redis_conn.delete(shards_key, f"{shards_key}:done")
+
+    cleanup_audio(parent_id, info["audio_path"])
+    logger.info(f"[Job {parent_id}] ✅ Sharded transcription merged ({total} shards, {len(segments)} segments)")
+    return result
+
+
+# ===================================================================
+# MODE PIPELINE: ASR DU JOB k+1 PENDANT L'ALIGNEMENT DU JOB k
+# ===================================================================
+# Deux étages (threads) reliés par une file bornée: l'étage ASR dépile les
+# jobs RQ et transcrit, l'étage post-traitement aligne, diarise et sauvegarde.
+# Les fonctions exécutées sont celles du chemin mono-job: résultats identiques.
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+
+_PIPELINE_END = object()
+
+
+def run_pipeline(queue_names, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Exécute les jobs des queues RQ en pipeline ASR → alignement/diarization,
+    jusqu'à SIGTERM/SIGINT (les jobs déjà dépilés sont terminés)
+    """
+    import torch
+    # L'étage ASR utilise ASR_THREADS cœurs, l'étage alignement le reste
+    torch.set_num_threads(max(1, available_cores() - ASR_THREADS))
+
+    queues = [Queue(name, connection=redis_conn) for name in queue_names]
+    handoff = stage_queue.Queue(maxsize=queue_size)
+    stopping = threading.Event()
+    failure = []  # exception qui a arrêté l'étage ASR
+    model_name, language = DEFAULT_MODEL, DEFAULT_LANGUAGE
+
+    def next_job():
+        for queue in weighted_queue_order(queues):
+            popped = pop_transcription_job(queue)
+            if popped is not None:
+                start_rq_job(queue, popped[0])
+                return (queue,) + popped
+        return None
+
+    def asr_loop():
+        while not stopping.is_set():
+            picked = next_job()
+            if picked is None:
+                stopping.wait(0.2)
+                continue
+
+            queue, rq_job, kwargs = picked
+            if kwargs is None:
+                # Job d'un autre type: exécuté tel quel
+                try:
+                    rq_job.perform()
+                    finish_rq_job(queue, rq_job)
+                except Exception as e:
+                    finish_rq_job(queue, rq_job, e)
+                continue
+
+            job_id, audio_path = kwargs["job_id"], kwargs["audio_path"]
+            diarize = kwargs.get("diarize", False)
+            vocabulary = kwargs.get("vocabulary")
+            cache_key = None
+            delegated = False
+            metrics = JobMetrics(job_id, rq_job)
+            if models_cold():
+                warm_models(diarize)
+            with job_activity():
+                try:
+                    with metrics.stage("cache_lookup"):
+                        cache_key = result_cache_key(audio_path, model_name, language, diarize, vocabulary)
+                    if serve_cached_result(job_id, audio_path, cache_key, model_name, language,
+                                           metrics, vocabulary) is not None:
+                        finish_rq_job(queue, rq_job)
+                        continue
+
+                    # Très longs enregistrements: répartis en shards sur les workers
+                    resume_from = kwargs.get("resume_from")
+                    if should_shard(audio_path, diarize, kwargs.get("stream"), resume_from):
+                        delegated = True
+                        run_sharded_transcription(job_id, audio_path, model_name, language, metrics,
+                                                  cache_key, queue.name, vocabulary)
+                        finish_rq_job(queue, rq_job)
+                        continue
+
+                    # Les longs enregistrements font ASR + alignement fenêtre par fenêtre
+                    if resume_from or should_stream(audio_path, diarize, kwargs.get("stream")):
+                        delegated = True
+                        result = run_streaming_transcription(job_id, audio_path, model_name, language, metrics,
+                                                             queue.name, resume_from, vocabulary)
+                        store_cached_result(cache_key, result)
+                        finish_rq_job(queue, rq_job)
+                        continue
+
+                    result, audio, speech_map = transcribe_stage(job_id, audio_path, model_name, language,
+                                                                 metrics, vocabulary)
+                    metrics.status.update(step="Waiting for alignment")
+                except Exception as e:
+                    if not delegated:  # déjà marqué en échec par le chemin délégué
+                        mark_failed(job_id, audio_path, e)
+                    finish_rq_job(queue, rq_job, e)
+                    continue
+
+            # Bloque si l'étage suivant est saturé (file bornée)
+            handoff.put((queue, rq_job, kwargs, cache_key, metrics, result, audio, speech_map,
+                         time.perf_counter()))
+
+    def asr_stage():
+        # Une erreur hors des try par job (Redis indisponible, chargement des
+        # modèles...) arrête le pipeline: l'étage suivant termine sa file, puis
+        # le processus sort en erreur pour être relancé. Les jobs dépilés mais
+        # non terminés restent dans le StartedJobRegistry.
+        try:
+            asr_loop()
+        except BaseException as e:
+            failure.append(e)
+            stopping.set()
+        finally:
+            handoff.put(_PIPELINE_END)
+
+    def post_stage():
+        while True:
+            item = handoff.get()
+            if item is _PIPELINE_END:
+                break
+            queue, rq_job, kwargs, cache_key, metrics, result, audio, speech_map, queued_at = item
+            job_id, audio_path = kwargs["job_id"], kwargs["audio_path"]
+            metrics.record("pipeline_wait", time.perf_counter() - queued_at, 0.0)
+            with job_activity():
+                try:
+                    result = complete_transcription(job_id, audio_path, result, audio, model_name,
+                                                    language, kwargs.get("diarize", False), metrics,
+                                                    speech_map, kwargs.get("vocabulary"))
+                    store_cached_result(cache_key, result)
+                    finish_rq_job(queue, rq_job)
+                except Exception as e:
+                    mark_failed(job_id, audio_path, e)
+                    finish_rq_job(queue, rq_job, e)
+
+    def request_stop(signum, frame):
+        logger.info("Stop requested, draining pipeline...")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    stages = [
+        threading.Thread(target=asr_stage, name="pipeline-asr", daemon=True),
+        threading.Thread(target=post_stage, name="pipeline-align", daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+    logger.info(f"✅ Pipeline ready (ASR → align/diarize, queue size {queue_size})")
+
+    # join() avec timeout: le thread principal reste réactif aux signaux
+    for stage in stages:
+        while stage.is_alive():
+            stage.join(1)
+    if failure:
+        logger.error(f"❌ Pipeline stopped on error: {failure[0]}")
+        raise failure[0]
+    logger.info("Pipeline stopped")
+
+
+# ===================================================================
+# SUPERVISEUR: N WORKERS RQ, UN SEUL EXEMPLAIRE DES MODÈLES
+# ===================================================================
+# CTranslate2 ne garantit pas la fork-safety: son pool de threads interne
+# n'est pas recréé dans un processus forké, donc N processus forkés ne peuvent
+# pas se partager de façon fiable un même modèle en copy-on-write. Le
+# superviseur garde les modèles dans un seul processus et exécute N workers
+# RQ dans des threads; CTranslate2 et torch relâchent le GIL pendant l'inférence.
+class ThreadWorker(TranscriptionWorker):
+    """
+    Worker RQ exécuté dans un thread du superviseur: les jobs tournent dans
+    le processus (pas de work horse) et les timeouts utilisent un timer
+    """
+    death_penalty_class = TimerDeathPenalty
+
+    def _install_signal_handlers(self):
+        # Les signaux ne peuvent être installés que par le thread principal:
+        # c'est le superviseur qui les gère
+        pass
+
+
+def run_supervisor(queues, concurrency=WORKER_CONCURRENCY):
+    """
+    Lance `concurrency` workers RQ dans des threads partageant les modèles
+    déjà chargés, puis attend SIGTERM/SIGINT pour un arrêt à chaud
+    """
+    import torch
+    # Les jobs parallèles se partagent les cœurs (alignement/diarization)
+    torch.set_num_threads(ASR_THREADS)
+
+    stopping = threading.Event()
+    workers = [ThreadWorker(queues, connection=redis_conn) for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=worker.work, name=f"rq-worker-{index}", daemon=True)
+        for index, worker in enumerate(workers)
+    ]
+
+    def request_stop(signum, frame):
+        logger.info("Stop requested, finishing current jobs...")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    for thread in threads:
+        thread.start()
+    logger.info(f"✅ Supervisor ready: {concurrency} workers × {ASR_THREADS} threads")
+
+    while not stopping.is_set() and any(thread.is_alive() for thread in threads):
+        stopping.wait(1)
+
+    # Arrêt à chaud: plus de nouveaux jobs, attendre ceux en cours
+    for worker in workers:
+        worker._stop_requested = True
+    while any(worker.get_state() == WorkerStatus.BUSY for worker in workers):
+        time.sleep(1)
+    for worker in workers:
+        worker.register_death()
+    logger.info("Supervisor stopped")
 
 
 if __name__ == '__main__':
+    # Les jobs RQ référencent "worker.process_transcription": sans cet alias,
+    # RQ importerait une seconde copie du module, avec des caches vides
+    sys.modules.setdefault(Path(__file__).stem, sys.modules[__name__])
+
     logger.info("=" * 60)
     logger.info("🚀 Starting WhisperX RQ Worker - OPTIMIZED VERSION")
     logger.info("=" * 60)
@@ -236,22 +3059,62 @@ if __name__ == '__main__':
     logger.info(f"Device: {DEVICE}")
     logger.info(f"Model: {DEFAULT_MODEL} (French optimized)")
     logger.info(f"Language: {DEFAULT_LANGUAGE} (forced)")
-    logger.info(f"Custom Vocabulary: {'Yes' if CUSTOM_PROMPT else 'No'}")
+    logger.info(f"Custom Vocabulary: {'Yes' if get_vocabulary_prompt() else 'No'} "
+                f"(named sets in {VOCABULARY_DIR})")
     logger.info(f"HF Token configured: {'Yes' if HF_TOKEN else 'No'}")
+    logger.info(f"Concurrency: {WORKER_CONCURRENCY} workers × {ASR_THREADS} threads")
+    logger.info(f"Pipeline mode: {'Yes' if PIPELINE_MODE else 'No'}")
+    if BATCH_MAX_JOBS > 1:
+        logger.info(f"Batch mode: up to {BATCH_MAX_JOBS} jobs, wait {BATCH_MAX_WAIT_MS} ms, "
+                    f"audio <= {BATCH_MAX_AUDIO_SECONDS:.0f}s")
     logger.info("=" * 60)
 
-    # PRÉ-CHARGER LE MODÈLE large-v3 AU DÉMARRAGE
-    logger.info("⏳ Pre-loading model large-v3 into cache...")
-    try:
-        get_model(DEFAULT_MODEL)
-        logger.info("✅ Model pre-loaded successfully!")
-    except Exception as e:
-        logger.error(f"❌ Failed to pre-load model: {e}")
-        logger.error("Worker will continue but first transcription will be slower")
+    if MODEL_PRELOAD == "first_job":
+        logger.info("⏳ Models will be loaded when the first job arrives")
+    else:
+        # PRÉ-CHARGER LE MODÈLE large-v3 AU DÉMARRAGE
+        logger.info("⏳ Pre-loading model large-v3 into cache...")
+        try:
+            get_model(DEFAULT_MODEL)
+            logger.info("✅ Model pre-loaded successfully!")
+        except Exception as e:
+            logger.error(f"❌ Failed to pre-load model: {e}")
+            logger.error("Worker will continue but first transcription will be slower")
+
+        # PRÉ-CHARGER L'ALIGNEMENT ET LA DIARIZATION
+        logger.info(f"⏳ Pre-loading alignment model ({DEFAULT_LANGUAGE}) into cache...")
+        try:
+            get_align_model(DEFAULT_LANGUAGE)
+            logger.info("✅ Alignment model pre-loaded successfully!")
+        except Exception as e:
+            logger.error(f"❌ Failed to pre-load alignment model: {e}")
+
+        if HF_TOKEN and PRELOAD_DIARIZATION:
+            logger.info("⏳ Pre-loading diarization pipeline into cache...")
+            try:
+                get_diarize_pipeline()
+                logger.info("✅ Diarization pipeline pre-loaded successfully!")
+            except Exception as e:
+                logger.error(f"❌ Failed to pre-load diarization pipeline: {e}")
 
+    if MODEL_MAX_RESIDENT_BYTES:
+        logger.info(f"Model memory budget: {MODEL_MAX_RESIDENT_BYTES / 1024 ** 3:.1f} GB")
+    start_idle_unloader()
+    start_metrics_server()
+    if RESULT_STORE == "file":
+        purge_result_files()
+    purge_shared_audio()
+    logger.info(f"Result store: {RESULT_STORE} ({RESULT_CODEC})")
     logger.info("=" * 60)
 
-    # Créer le worker
-    worker = Worker(['transcription'], connection=redis_conn)
-    logger.info("✅ Worker ready, waiting for jobs...")
-    worker.work()
+    # Créer le worker (ou N workers partageant les modèles)
+    # TranscriptionWorker (SimpleWorker): les jobs tournent dans ce processus, avec les modèles
+    # pré-chargés (un work horse forké les rechargerait à chaque job)
+    if PIPELINE_MODE:
+        run_pipeline(WORKER_QUEUES)
+    elif WORKER_CONCURRENCY > 1:
+        run_supervisor(WORKER_QUEUES, WORKER_CONCURRENCY)
+    else:
+        worker = TranscriptionWorker(WORKER_QUEUES, connection=redis_conn)
+        logger.info("✅ Worker ready, waiting for jobs...")
+        worker.work()